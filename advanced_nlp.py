@@ -2,41 +2,117 @@
 Advanced NLP Module
 
 This module leverages spaCy to perform more advanced extraction of interest keywords.
-It uses the spaCy pipeline (with the 'en_core_web_sm' model) to extract noun chunks 
-and named entities from the aggregated text, then matches them against candidate keywords.
+It uses the spaCy pipeline (with the 'en_core_web_sm' model) to extract noun chunks
+and named entities from each document, then matches them against candidate keywords.
+
+Documents are streamed through nlp.pipe in batches instead of being joined into a single
+text, so the corpus size is not limited by spaCy's max_length. The model is loaded on
+first use, with the components the extraction does not need left out.
 """
 
-import spacy
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "en_core_web_sm"
+
+# Noun chunks need the tagger, attribute ruler and parser; entities need the NER.
+# Nothing reads lemmas, so the lemmatizer is not loaded.
+EXCLUDED_COMPONENTS = ["lemmatizer"]
+
+# Documents longer than this are split on paragraph breaks before being parsed
+MAX_SEGMENT_CHARS = 100000
+
+
+@lru_cache(maxsize=1)
+def get_nlp():
+    """Load the spaCy model the first time it is needed."""
+    # Imported here so importing this module does not pay for loading spaCy
+    import spacy
+
+    # Load the spaCy English model (ensure you've run: python -m spacy download en_core_web_sm)
+    return spacy.load(MODEL_NAME, exclude=EXCLUDED_COMPONENTS)
+
+
+def _iter_segments(texts, max_chars=MAX_SEGMENT_CHARS):
+    """
+    Yield the documents in texts, splitting any that are longer than max_chars on
+    paragraph breaks (or hard-wrapping a single oversized paragraph).
+    """
+    for text in texts:
+        if len(text) <= max_chars:
+            yield text
+            continue
+        segment = []
+        size = 0
+        for paragraph in text.split("\n\n"):
+            if size + len(paragraph) > max_chars and segment:
+                yield "\n\n".join(segment)
+                segment = []
+                size = 0
+            while len(paragraph) > max_chars:
+                yield paragraph[:max_chars]
+                paragraph = paragraph[max_chars:]
+            segment.append(paragraph)
+            size += len(paragraph) + 2
+        if segment:
+            yield "\n\n".join(segment)
+
 
-# Load the spaCy English model (ensure you've run: python -m spacy download en_core_web_sm)
-nlp = spacy.load("en_core_web_sm")
+def _build_matcher(nlp, candidate_keywords):
+    """Build a case-insensitive PhraseMatcher with one pattern per keyword."""
+    from spacy.matcher import PhraseMatcher
 
+    matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+    for keyword in candidate_keywords:
+        matcher.add(keyword, [nlp.make_doc(keyword)])
+    return matcher
 
-def extract_keywords_advanced(text, candidate_keywords):
+
+def extract_keywords_advanced(texts, candidate_keywords, batch_size=64, n_process=1):
     """
-    Use spaCy to process the text and extract noun chunks and named entities that
+    Use spaCy to process the documents and extract noun chunks and named entities that
     match candidate keywords.
-    
+
     Parameters:
-      - text (str): The aggregated text to analyze.
+      - texts (str or iterable): A single text or an iterable of documents to analyze.
       - candidate_keywords (list): A list of candidate keywords to search for.
-    
+      - batch_size (int): Number of documents spaCy processes per batch.
+      - n_process (int): Number of processes spaCy uses for the pipeline.
+
     Returns a list of matched keywords.
     """
-    doc = nlp(text)
+    if isinstance(texts, str):
+        texts = [texts]
+    nlp = get_nlp()
+    matcher = _build_matcher(nlp, candidate_keywords)
     extracted = set()
 
-    # Extract noun chunks
-    for chunk in doc.noun_chunks:
-        chunk_text = chunk.text.lower().strip()
-        for keyword in candidate_keywords:
-            if keyword in chunk_text:
-                extracted.add(keyword)
-
-    # Extract named entities
-    for ent in doc.ents:
-        ent_text = ent.text.lower().strip()
-        for keyword in candidate_keywords:
-            if keyword in ent_text:
-                extracted.add(keyword)
+    for doc in nlp.pipe(_iter_segments(texts), batch_size=batch_size, n_process=n_process):
+        matches = matcher(doc)
+        if not matches:
+            continue
+        # Label each token with the noun chunk and the entity it belongs to, then keep the
+        # keyword matches that fall entirely inside a single chunk or entity.
+        chunk_of = _span_labels(doc, doc.noun_chunks)
+        entity_of = _span_labels(doc, doc.ents)
+        for match_id, start, end in matches:
+            if _within_one_span(chunk_of, start, end) or _within_one_span(entity_of, start, end):
+                extracted.add(nlp.vocab.strings[match_id])
     return list(extracted)
+
+
+def _span_labels(doc, spans):
+    """Return a per-token list holding the index of the span each token is in, or -1."""
+    labels = [-1] * len(doc)
+    for n, span in enumerate(spans):
+        for i in range(span.start, span.end):
+            labels[i] = n
+    return labels
+
+
+def _within_one_span(labels, start, end):
+    """Return True if tokens start..end-1 all belong to the same span."""
+    label = labels[start]
+    return label >= 0 and all(labels[i] == label for i in range(start + 1, end))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Synthetic corpus generator for the benchmarks.
+
+Writes a tree of .txt and .md files made of filler words with candidate keywords mixed
+in at a given density. The output only depends on the parameters and the seed, so two
+runs with the same arguments produce the same corpus (including modification times,
+which are spread over the last 'days' days for the time analysis).
+
+Example:
+    python benchmarks/corpus_gen.py -o /tmp/corpus --files 5000 --size_kb 8 --density 0.02
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlp_analyzer import CANDIDATE_KEYWORDS
+
+FILES_PER_DIR = 200
+WORDS_PER_LINE = 12
+FILLER_VOCABULARY = 2000
+# Fixed reference time so generated mtimes are reproducible
+REFERENCE_TIME = 1_700_000_000
+
+
+def _filler_words(rng, count):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(count)]
+
+
+def generate_corpus(output_dir, files=1000, size_kb=4, density=0.01, md_ratio=0.3, days=365, seed=0,
+                    keywords=None):
+    """
+    Generate a synthetic corpus.
+
+    Parameters:
+      - output_dir (str): Folder the files are written to (created if needed).
+      - files (int): Number of files.
+      - size_kb (int): Approximate size of each file in kilobytes.
+      - density (float): Fraction of words that are candidate keywords.
+      - md_ratio (float): Fraction of files written as .md instead of .txt.
+      - days (int): Modification times are spread over this many days.
+      - seed (int): Random seed.
+      - keywords (list): (Optional) Keywords to mix in instead of CANDIDATE_KEYWORDS.
+
+    Returns a dict describing the corpus (parameters, file count and total bytes).
+    """
+    rng = random.Random(seed)
+    keywords = list(keywords or CANDIDATE_KEYWORDS)
+    filler = _filler_words(rng, FILLER_VOCABULARY)
+    target = size_kb * 1024
+    total_bytes = 0
+
+    for i in range(files):
+        directory = os.path.join(output_dir, f"dir{i // FILES_PER_DIR:04d}")
+        os.makedirs(directory, exist_ok=True)
+        suffix = ".md" if rng.random() < md_ratio else ".txt"
+        path = os.path.join(directory, f"doc{i:06d}{suffix}")
+
+        lines = []
+        size = 0
+        while size < target:
+            words = [rng.choice(keywords) if rng.random() < density else rng.choice(filler)
+                     for _ in range(WORDS_PER_LINE)]
+            line = " ".join(words).capitalize() + ".\n"
+            lines.append(line)
+            size += len(line)
+        data = "".join(lines).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(data)
+        total_bytes += len(data)
+
+        mtime = REFERENCE_TIME - rng.uniform(0, days * 86400)
+        os.utime(path, (mtime, mtime))
+
+    return {
+        "files": files,
+        "bytes": total_bytes,
+        "size_kb": size_kb,
+        "density": density,
+        "md_ratio": md_ratio,
+        "days": days,
+        "seed": seed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic text corpus for benchmarks")
+    parser.add_argument("-o", "--output", required=True, help="Folder to write the corpus to")
+    parser.add_argument("--files", type=int, default=1000, help="Number of files")
+    parser.add_argument("--size_kb", type=int, default=4, help="Approximate size of each file in KB")
+    parser.add_argument("--density", type=float, default=0.01, help="Fraction of words that are keywords")
+    parser.add_argument("--md_ratio", type=float, default=0.3, help="Fraction of .md files")
+    parser.add_argument("--days", type=int, default=365, help="Spread modification times over this many days")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args(argv)
+
+    info = generate_corpus(args.output, files=args.files, size_kb=args.size_kb, density=args.density,
+                           md_ratio=args.md_ratio, days=args.days, seed=args.seed)
+    print(json.dumps(info, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the analysis and fetch stages.
+
+Generates a synthetic corpus (see corpus_gen.py), or uses an existing folder, and runs
+each stage in its own Python process so that its peak memory can be measured on its
+own. The fetch stages run against the local stub servers in stub_servers.py with an
+injected latency. Results are printed (or written with -o) as JSON with sorted keys,
+so runs on two commits can be compared with a plain diff.
+
+Per stage the report has:
+  - items, seconds and throughput (items per second; extract also reports MB/s)
+  - latency_ms p50/p95/p99: per document for extract, per HTTP request for the fetch
+    stages, and per repetition (--repeat) for the whole-corpus stages. The first
+    repetition includes importing the libraries the stage loads lazily.
+  - peak_rss_mb: peak resident memory of the stage's process
+
+Examples:
+    python benchmarks/run_benchmarks.py --files 2000 --size_kb 8 -o bench.json
+    python benchmarks/run_benchmarks.py --corpus ~/Documents --stages analyze graph
+    python benchmarks/run_benchmarks.py --stages github arxiv --latency 0.1 --interests 20
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from web_load_test import percentile
+
+STAGES = ["extract", "analyze", "graph", "timeline", "topics", "github", "arxiv", "download"]
+
+
+def peak_rss_mb():
+    import resource
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def timed_session(latencies):
+    """requests session that appends the duration of every request to latencies."""
+    import requests
+
+    class TimedSession(requests.Session):
+        def request(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().request(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    return TimedSession()
+
+
+def _repeat(args, func):
+    """Run func() args.repeat times; return (last result, per-run durations)."""
+    durations = []
+    result = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return result, durations
+
+
+def _interests(args):
+    from nlp_analyzer import CANDIDATE_KEYWORDS
+
+    return CANDIDATE_KEYWORDS[:args.interests]
+
+
+# Each stage returns (items, latencies in seconds, extra fields). The stage's wall time
+# is measured around the call.
+
+def stage_extract(args):
+    from nlp_analyzer import extract_interests_from_text
+    from utils import iter_text_files
+
+    texts = []
+    for path, _ in iter_text_files([args.corpus]):
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            texts.append(f.read())
+    latencies = []
+    for _ in range(args.repeat):
+        for text in texts:
+            start = time.perf_counter()
+            extract_interests_from_text(text)
+            latencies.append(time.perf_counter() - start)
+    size_mb = sum(len(text) for text in texts) * args.repeat / (1024 * 1024)
+    return len(texts) * args.repeat, latencies, {"mb_per_s": size_mb / max(sum(latencies), 1e-9)}
+
+
+def stage_analyze(args):
+    from nlp_analyzer import analyze_folders
+
+    interests, durations = _repeat(args, lambda: analyze_folders([args.corpus], workers=args.workers))
+    return args.files_in_corpus * args.repeat, durations, {"interests": len(interests)}
+
+
+def stage_graph(args):
+    from knowledge_graph import build_cooccurrence_graph
+
+    (edges, topics), durations = _repeat(args, lambda: build_cooccurrence_graph([args.corpus], workers=args.workers))
+    return args.files_in_corpus * args.repeat, durations, {"edges": len(edges), "topics": len(topics)}
+
+
+def stage_timeline(args):
+    from time_analysis import aggregate_topics, analyze_time_and_topics
+
+    def run():
+        records = analyze_time_and_topics([args.corpus], workers=args.workers)
+        return records, aggregate_topics(records, freq="week")
+
+    (records, counts), durations = _repeat(args, run)
+    return args.files_in_corpus * args.repeat, durations, {"records": len(records), "buckets": len(counts)}
+
+
+def stage_topics(args):
+    from topic_modeling import build_corpus, train_topic_model
+
+    def run():
+        model_dir = tempfile.mkdtemp(prefix="bench_topics_")
+        try:
+            dictionary, corpus = build_corpus([args.corpus], model_dir=model_dir, workers=args.workers)
+            train_topic_model(corpus, dictionary, num_topics=5, passes=1, workers=args.workers)
+            return len(dictionary)
+        finally:
+            shutil.rmtree(model_dir, ignore_errors=True)
+
+    terms, durations = _repeat(args, run)
+    return args.files_in_corpus * args.repeat, durations, {"terms": terms}
+
+
+def stage_github(args):
+    from github_fetcher import fetch_github_repos
+    from http_cache import HTTPCache
+    from stub_servers import StubGitHub
+
+    latencies = []
+    with StubGitHub(latency=args.latency, jitter=args.jitter) as stub:
+        repos = fetch_github_repos(_interests(args), max_results_per_interest=args.per_interest,
+                                   max_workers=args.fetch_workers, session=timed_session(latencies),
+                                   api_url=stub.api_url, cache=HTTPCache(None))
+    return len(repos), latencies, {"requests": len(latencies)}
+
+
+def stage_arxiv(args):
+    import papers_fetcher
+    from http_cache import HTTPCache
+    from stub_servers import StubArxiv
+
+    papers_fetcher._spacer.interval = args.arxiv_spacing
+    latencies = []
+    with StubArxiv(latency=args.latency, jitter=args.jitter) as stub:
+        papers = list(papers_fetcher.iter_papers(_interests(args), max_results_per_interest=args.per_interest,
+                                                 session=timed_session(latencies), api_url=stub.api_url,
+                                                 cache=HTTPCache(None)))
+    return len(papers), latencies, {"requests": len(latencies)}
+
+
+def stage_download(args):
+    from pdf_downloader import PDFDownloader
+    from stub_servers import StubArxiv
+
+    latencies = []
+    output_dir = tempfile.mkdtemp(prefix="bench_pdfs_")
+    try:
+        with StubArxiv(latency=args.latency, jitter=args.jitter) as stub:
+            downloader = PDFDownloader(output_dir, max_workers=args.fetch_workers, session=timed_session(latencies))
+            for i in range(args.interests * args.per_interest):
+                downloader.submit(f"{stub.base_url}/pdf/2401.{i:05d}v1.pdf")
+            paths = downloader.close()
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return len([path for path in paths.values() if path]), latencies, {"requests": len(latencies)}
+
+
+def run_stage(args):
+    """Run one stage in this process and return its result dict."""
+    func = globals()[f"stage_{args.run_stage}"]
+    start = time.perf_counter()
+    try:
+        items, latencies, extra = func(args)
+    except (ImportError, LookupError) as e:
+        return {"skipped": str(e)}
+    seconds = time.perf_counter() - start
+    latencies = sorted(latencies)
+    result = {
+        "items": items,
+        "seconds": round(seconds, 4),
+        "throughput": round(items / seconds, 2) if seconds else None,
+        "latency_ms": {name: round(percentile(latencies, fraction) * 1000, 3)
+                       for name, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))},
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    result.update({key: round(value, 2) if isinstance(value, float) else value for key, value in extra.items()})
+    return result
+
+
+def corpus_info(folder):
+    from utils import iter_text_files
+
+    files = 0
+    size = 0
+    for _, stat in iter_text_files([folder]):
+        files += 1
+        size += stat.st_size
+    return {"files": files, "bytes": size}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and report JSON results")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to run")
+    parser.add_argument("--corpus", type=str, default=None, help="Existing folder to use instead of a generated corpus")
+    parser.add_argument("--files", type=int, default=1000, help="Files in the generated corpus")
+    parser.add_argument("--size_kb", type=int, default=4, help="Approximate size of each generated file in KB")
+    parser.add_argument("--density", type=float, default=0.01, help="Fraction of generated words that are keywords")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions of the corpus stages")
+    parser.add_argument("--workers", type=int, default=1, help="Processes used by the corpus stages")
+    parser.add_argument("--interests", type=int, default=10, help="Interests fetched by the fetch stages")
+    parser.add_argument("--per_interest", type=int, default=5, help="Results per interest")
+    parser.add_argument("--fetch_workers", type=int, default=4, help="Concurrent requests of the fetch stages")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stub servers wait per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random stub latency, up to this many seconds")
+    parser.add_argument("--arxiv_spacing", type=float, default=0.0,
+                        help="Seconds between arXiv calls (the real API asks for 3)")
+    parser.add_argument("-o", "--output", type=str, default=None, help="Write the JSON report to this file")
+    parser.add_argument("--run-stage", dest="run_stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--files-in-corpus", dest="files_in_corpus", type=int, default=0, help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = build_parser().parse_args(argv)
+    if args.run_stage:
+        print(json.dumps(run_stage(args)))
+        return
+
+    from corpus_gen import generate_corpus
+
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        if args.corpus:
+            corpus = os.path.abspath(args.corpus)
+            info = dict(corpus_info(corpus), path=corpus)
+        else:
+            corpus = os.path.join(workdir, "corpus")
+            info = generate_corpus(corpus, files=args.files, size_kb=args.size_kb, density=args.density,
+                                   seed=args.seed)
+
+        stages = {}
+        for stage in args.stages:
+            command = [sys.executable, os.path.abspath(__file__), *argv, "--run-stage", stage,
+                       "--corpus", corpus, "--files-in-corpus", str(info["files"])]
+            # Stages run in a scratch folder so anything they write stays out of the repo
+            process = subprocess.run(command, cwd=workdir, capture_output=True, text=True)
+            if process.returncode != 0:
+                stages[stage] = {"error": process.stderr.strip().splitlines()[-1:]}
+            else:
+                stages[stage] = json.loads(process.stdout.strip().splitlines()[-1])
+            print(f"{stage}: {json.dumps(stages[stage])}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "params": {key: value for key, value in vars(args).items()
+                   if key not in ("run_stage", "files_in_corpus", "output", "stages")},
+        "corpus": info,
+        "stages": stages,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Local stub servers for the GitHub search API and the arXiv API, used by the benchmarks.
+
+Responses are generated deterministically from the request, and every request waits
+for an injected latency (a fixed delay plus optional jitter) before answering, so
+fetchers can be measured without the network and without the real APIs' quotas.
+
+  - StubGitHub answers /search/repositories with pages of fake repositories and
+    supports ETag revalidation (304).
+  - StubArxiv answers /api/query with an Atom feed whose entries mention the searched
+    terms, and serves small fake PDFs under /pdf/<id>.pdf.
+
+Both are context managers:
+
+    with StubGitHub(latency=0.05) as github, StubArxiv(latency=0.2) as arxiv:
+        fetch_github_repos(interests, api_url=github.api_url)
+"""
+
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+# Total results a query reports, so pagination ends
+GITHUB_TOTAL_RESULTS = 300
+ARXIV_TOTAL_RESULTS = 200
+PDF_SIZE = 256 * 1024
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.stub.delay()
+        self.server.stub.count_request()
+        status, headers, body = self.server.stub.respond(self)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer:
+    """
+    Base class running a threaded HTTP server on a free local port.
+
+    Parameters:
+      - latency (float): Seconds every request waits before it is answered.
+      - jitter (float): Up to this many extra seconds, drawn uniformly per request.
+      - seed (int): Seed for the jitter.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def delay(self):
+        with self._lock:
+            extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+        if self.latency + extra > 0:
+            time.sleep(self.latency + extra)
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def respond(self, handler):
+        raise NotImplementedError
+
+
+def _etag(body):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+class StubGitHub(StubServer):
+    """Stub of the GitHub repository search API."""
+
+    @property
+    def api_url(self):
+        return self.base_url + "/search/repositories"
+
+    def respond(self, handler):
+        params = parse_qs(urlparse(handler.path).query)
+        query = params.get("q", [""])[0]
+        interest = query.split(" pushed:", 1)[0]
+        page = int(params.get("page", ["1"])[0])
+        per_page = int(params.get("per_page", ["30"])[0])
+        start = (page - 1) * per_page
+        count = max(0, min(per_page, GITHUB_TOTAL_RESULTS - start))
+        slug = re.sub(r"[^a-z0-9]+", "-", interest.lower()).strip("-") or "repo"
+        items = [{
+            "full_name": f"{slug}/project-{start + i}",
+            "html_url": f"https://github.com/{slug}/project-{start + i}",
+            "description": f"A {interest} project",
+            "language": "Python",
+            "pushed_at": "2024-01-01T00:00:00Z",
+        } for i in range(count)]
+        body = json.dumps({"total_count": GITHUB_TOTAL_RESULTS, "items": items}).encode("utf-8")
+        etag = _etag(body)
+        if handler.headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"Content-Type": "application/json", "ETag": etag,
+                     "X-RateLimit-Remaining": "1000", "X-RateLimit-Reset": str(int(time.time()) + 3600)}, body
+
+
+class StubArxiv(StubServer):
+    """Stub of the arXiv query API, with fake PDFs."""
+
+    @property
+    def api_url(self):
+        return self.base_url + "/api/query"
+
+    def respond(self, handler):
+        parsed = urlparse(handler.path)
+        if parsed.path.startswith("/pdf/"):
+            seed = parsed.path.encode("utf-8")
+            block = hashlib.sha256(seed).digest()
+            body = (block * (PDF_SIZE // len(block) + 1))[:PDF_SIZE]
+            return 200, {"Content-Type": "application/pdf"}, body
+
+        params = parse_qs(parsed.query)
+        query = params.get("search_query", [""])[0]
+        terms = re.findall(r'all:"([^"]+)"', query) or ["topic"]
+        start = int(params.get("start", ["0"])[0])
+        max_results = int(params.get("max_results", ["10"])[0])
+        count = max(0, min(max_results, ARXIV_TOTAL_RESULTS - start))
+        entries = []
+        for i in range(start, start + count):
+            term = terms[i % len(terms)]
+            paper_id = f"2401.{i:05d}v1"
+            entries.append(
+                f"<entry><id>http://arxiv.org/abs/{paper_id}</id>"
+                f"<published>2024-01-01T00:00:00Z</published>"
+                f"<title>Advances in {escape(term)} number {i}</title>"
+                f"<summary>We study {escape(term)} at scale and report results.</summary>"
+                f'<link href="{self.base_url}/pdf/{paper_id}.pdf" rel="related" type="application/pdf"/>'
+                f"</entry>"
+            )
+        body = ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<feed xmlns="http://www.w3.org/2005/Atom">' + "".join(entries) + "</feed>").encode("utf-8")
+        return 200, {"Content-Type": "application/atom+xml"}, body
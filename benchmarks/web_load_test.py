@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Load test for the web app.
+
+Sends concurrent GET requests to the Flask app and reports throughput and latency
+percentiles. Without --url the app from web_app.py is started in-process on a free
+local port, serving whatever results are in the output folder.
+
+Example:
+    python benchmarks/web_load_test.py -n 2000 -c 16 --path "/api/repos?page=3" --path "/?sort=name"
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def start_local_app():
+    """Serve web_app.app from a background thread and return its base URL."""
+    from werkzeug.serving import make_server
+    from web_app import app
+
+    # Per-request access logs would dominate the output and the timings
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(base_url, paths, total_requests, concurrency, conditional=False):
+    """
+    Send total_requests GETs spread over the paths using concurrency threads.
+    With conditional=True each thread revalidates with the ETag it last received.
+
+    Returns a dict of throughput, latency percentiles (ms) and status counts.
+    """
+    local = threading.local()
+    statuses = {}
+    latencies = []
+    lock = threading.Lock()
+
+    def one(i):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+            local.etags = {}
+        path = paths[i % len(paths)]
+        headers = {"Accept-Encoding": "gzip"}
+        if conditional and path in local.etags:
+            headers["If-None-Match"] = local.etags[path]
+        start = time.perf_counter()
+        response = session.get(base_url + path, headers=headers)
+        elapsed = time.perf_counter() - start
+        if "ETag" in response.headers:
+            local.etags[path] = response.headers["ETag"]
+        with lock:
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total_requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "conditional": conditional,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(total_requests / wall, 1) if wall else None,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 2),
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+        },
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the WorkAnalyzerLLM web app")
+    parser.add_argument("--url", type=str, default=None, help="Base URL of a running app (default: start one locally)")
+    parser.add_argument("--path", action="append", default=None, help="Path to request; may be repeated")
+    parser.add_argument("-n", "--requests", type=int, default=1000, help="Total number of requests")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument("--conditional", action="store_true", help="Revalidate with If-None-Match after the first response")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        base_url, server = start_local_app()
+    paths = args.path or ["/", "/?page=2&sort=name", "/api/repos", "/api/repos?page=2&sort=last_pushed&order=desc"]
+    try:
+        result = run_load(base_url.rstrip("/"), paths, args.requests, args.concurrency, args.conditional)
+    finally:
+        if server is not None:
+            server.shutdown()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
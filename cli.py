@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Command Line Interface Module
+
+Single entry point for the tools of this project. Each subcommand runs the main()
+of one module with the remaining arguments, e.g.:
+
+  python cli.py analyze -f ~/Documents      extract interests from your files
+  python cli.py fetch -f ~/Documents        extract interests, then fetch repos and papers
+  python cli.py graph -f ~/Documents --headless
+  python cli.py graph --help                options of a subcommand
+  python cli.py watch -f ~/Documents        keep the results updated as files change
+
+Only the module behind the chosen subcommand is imported, and the modules import their
+heavy libraries (pandas, matplotlib, gensim, nltk, torch, spaCy) in the functions that
+use them, so --help and light subcommands start quickly. With --import-profile the
+command's module is imported with a plain import statement under
+"python -X importtime -c" and its main() run, and the import cost per module is
+reported when it finishes.
+"""
+import os
+import sys
+import argparse
+import importlib
+import subprocess
+
+# Subcommand -> (module, keyword arguments for its main(), description)
+COMMANDS = {
+    "analyze": ("main", {"fetch": False}, "Extract interests from your files and print them"),
+    "fetch": ("main", {}, "Extract interests, then fetch and store matching repos and papers"),
+    "summarize": ("paper_summarizer", {}, "Summarize the fetched arXiv papers"),
+    "graph": ("knowledge_graph", {}, "Build the topic co-occurrence graph"),
+    "timeline": ("time_analysis", {}, "Track topics over time"),
+    "topics": ("topic_modeling", {}, "Train an LDA topic model on your files"),
+    "serve": ("web_app", {}, "Serve the fetched repositories in a web app"),
+    "watch": ("watcher", {}, "Keep interests, co-occurrences and timelines updated as files change"),
+}
+
+IMPORT_PROFILE_TOP = 25
+
+
+def build_parser():
+    commands = "\n".join(f"  {name:<10} {description}" for name, (_, _, description) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        description="Analyze your documents and fetch related GitHub repositories and research papers.",
+        epilog=f"commands:\n{commands}\n\nRun 'cli.py <command> --help' for the options of a command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--import-profile", action="store_true",
+                        help="Report how long importing each module took while running the command")
+    parser.add_argument("command", choices=list(COMMANDS), metavar="command", help="Command to run (see below)")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments passed on to the command")
+    return parser
+
+
+def parse_importtime(lines):
+    """
+    Parse "python -X importtime" output into a list of (module, cumulative microseconds)
+    for the imports that were not triggered by another import, i.e. the cost each
+    import statement of the program paid.
+    """
+    timings = []
+    for line in lines:
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip("\n")
+        if name.startswith(" ") and name[1:2] != " ":
+            # One leading space separates the column; deeper levels add two more
+            timings.append((name.strip(), int(parts[1])))
+    return timings
+
+
+def print_import_profile(timings, top=IMPORT_PROFILE_TOP, stream=None):
+    stream = stream or sys.stderr
+    total = sum(cumulative for _, cumulative in timings)
+    print(f"\nImport profile: {len(timings)} top-level imports, {total / 1000:.1f} ms in total", file=stream)
+    for name, cumulative in sorted(timings, key=lambda item: -item[1])[:top]:
+        print(f"  {cumulative / 1000:9.1f} ms  {name}", file=stream)
+
+
+def run_import_profile(command, argv):
+    """
+    Run a command with argv under -X importtime, pass its output through and report
+    imports. The module is imported by an import statement of the -c program, so
+    every import it triggers is accounted for, and none of this CLI's own are.
+    """
+    module_name, kwargs, _ = COMMANDS[command]
+    code = (f"import sys; sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); "
+            f"import {module_name}; sys.exit({module_name}.main(sys.argv[1:], **{kwargs!r}))")
+    command = [sys.executable, "-X", "importtime", "-c", code] + argv
+    process = subprocess.Popen(command, stderr=subprocess.PIPE, text=True)
+    lines = []
+    for line in process.stderr:
+        if line.startswith("import time:"):
+            lines.append(line)
+        else:
+            sys.stderr.write(line)
+    returncode = process.wait()
+    print_import_profile(parse_importtime(lines))
+    return returncode
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.import_profile:
+        return run_import_profile(args.command, args.args)
+    module_name, kwargs, _ = COMMANDS[args.command]
+    module = importlib.import_module(module_name)
+    return module.main(args.args, **kwargs)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
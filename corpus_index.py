@@ -0,0 +1,334 @@
+"""
+Corpus Index Module
+
+This module keeps a persistent on-disk index of the text files in the analyzed folders.
+For every file it records the size, modification time and content hash, together with
+the value extracted from the file (for example the interest keywords found in it).
+
+On each run only files that are new or have changed are read and processed again; the
+rest are served from the index, and entries for files that were deleted are dropped.
+When the changed paths are known (from file system events), update() brings just their
+entries up to date without walking the folders.
+The index is shared by the corpus tools (nlp_analyzer, knowledge_graph, time_analysis)
+so a folder scanned by one of them is already up to date for the others.
+
+Files are read through source_adapters: a ChatGPT export is stored as one entry whose
+"documents" list holds the id, timestamp and extracted value of each conversation, and
+scan() returns every conversation as a record of its own.
+
+An extractor is any picklable callable with two attributes:
+  - name (str): Key the extracted value is stored under in each entry (e.g. "topics").
+  - fingerprint (str): Changes whenever the extractor would produce different values,
+    which invalidates every stored value (e.g. when the keyword list changes).
+It is called with an iterable of text chunks for one file and must return a JSON
+serializable value. An extractor that computes several values in the same read (see
+dedup.SignedExtractor) also has a names attribute and returns a dict with a value for
+each name; each is stored under its own key of the entry.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+from source_adapters import (SOURCE_EXTENSIONS, document_id, is_chat_export, iter_chat_documents,
+                             iter_decoded_chunks)
+from utils import DEFAULT_CHUNK_SIZE, iter_text_files, safe_mkdir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join("output", "corpus_index.json")
+INDEX_VERSION = 1
+
+
+class CorpusIndex:
+    """
+    Manifest of path -> {size, mtime, hash, <extractor.name>} for the files of a corpus.
+
+    Parameters:
+      - path (str): JSON file the index is persisted to. If None, the index only lives
+        in memory, which gives the same results without reuse across runs.
+      - extractor: Extractor applied to new and changed files (see module docstring).
+    """
+
+    def __init__(self, path, extractor):
+        self.path = path
+        self.extractor = extractor
+        self.entries = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """Load the index from disk, discarding it if it was built by another extractor."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable corpus index {self.path}: {e}")
+            return
+        if (data.get("version") != INDEX_VERSION
+                or data.get("extractor") != self.extractor.name
+                or data.get("fingerprint") != self.extractor.fingerprint):
+            logger.info(f"Corpus index {self.path} is out of date and will be rebuilt.")
+            self._dirty = True
+            return
+        self.entries = data.get("entries", {})
+
+    def save(self):
+        """Write the index to disk atomically if it has changed."""
+        if not self.path or not self._dirty:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            safe_mkdir(directory)
+        data = {
+            "version": INDEX_VERSION,
+            "extractor": self.extractor.name,
+            "fingerprint": self.extractor.fingerprint,
+            "entries": self.entries,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def scan(self, folders, days=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=1):
+        """
+        Bring the index up to date for the given folders and return their entries.
+
+        Parameters:
+          - folders (list): Folder paths to walk recursively.
+          - days (int): (Optional) Only return files modified within the last 'days' days.
+            Older files are neither read nor dropped from the index.
+          - chunk_size (int): Number of bytes read from a file at a time.
+          - workers (int): Number of processes used to read and extract changed files.
+            Results are merged in walk order, so the output does not depend on it.
+
+        Returns a list of (path, entry) tuples in walk order. Each conversation of a chat
+        export is a record of its own, with path "<file>#<conversation id>" and an entry
+        holding the conversation's mtime and extracted value; with 'days', conversations
+        older than the cutoff are left out. Files that could not be read are logged and
+        left out.
+        """
+        folders = [os.path.abspath(folder) for folder in folders]
+        cutoff = time.time() - days * 86400 if days else None
+
+        seen = set()
+        records = []
+        stale = []
+        for path, stat in iter_text_files(folders, extensions=SOURCE_EXTENSIONS):
+            seen.add(path)
+            if cutoff is not None and stat.st_mtime < cutoff:
+                continue
+            entry = self.entries.get(path)
+            if _is_stale(entry, stat):
+                stale.append((len(records), path, stat))
+            records.append((path, entry))
+
+        jobs = [(path, stat.st_size, stat.st_mtime, self.entries.get(path)) for _, path, stat in stale]
+        for (position, path, _), (entry, error) in zip(stale, self._run(jobs, chunk_size, workers)):
+            if error is not None:
+                logger.error(f"Error processing file {path}: {error}")
+                self.entries.pop(path, None)
+            else:
+                self.entries[path] = entry
+            records[position] = (path, entry)
+        if stale:
+            self._dirty = True
+
+        removed = self._prune(folders, seen)
+        self.save()
+        files = sum(entry is not None for _, entry in records)
+        records = list(self._documents(records, cutoff))
+        logger.info(f"Corpus index: {files} files, {len(records)} documents, {len(stale)} read, "
+                    f"{removed} removed.")
+        return records
+
+    def update(self, paths, folders, chunk_size=DEFAULT_CHUNK_SIZE, workers=1):
+        """
+        Bring the entries of the given paths up to date, without walking the folders.
+        The index is not saved; call save() when convenient.
+
+        Parameters:
+          - paths (iterable): Files or directories that changed, e.g. from file system
+            events. A directory stands for every file under it, and a path that no
+            longer exists drops its entries. Paths outside the folders are ignored.
+          - folders (list): Folders the index covers.
+          - chunk_size (int): Number of bytes read from a file at a time.
+          - workers (int): Number of processes used to read and extract changed files.
+
+        Returns a dict mapping each file whose entry was added, changed or dropped to its
+        records, as scan() returns them (an empty list for a dropped file).
+        """
+        prefixes = tuple(os.path.join(os.path.abspath(folder), "") for folder in folders)
+        files = {}
+        for path in paths:
+            path = os.path.abspath(path)
+            if not path.startswith(prefixes):
+                continue
+            if os.path.isdir(path) or path not in self.entries and not path.endswith(SOURCE_EXTENSIONS):
+                # A directory created, deleted or moved, or a file that is not indexed
+                below = os.path.join(path, "")
+                files.update((known, None) for known in self.entries if known.startswith(below))
+                if os.path.isdir(path):
+                    files.update(iter_text_files([path], extensions=SOURCE_EXTENSIONS))
+                continue
+            try:
+                files[path] = os.stat(path)
+            except OSError:
+                files[path] = None
+
+        changed = {}
+        stale = []
+        for path, stat in files.items():
+            if stat is None:
+                if self.entries.pop(path, None) is not None:
+                    changed[path] = []
+            elif _is_stale(self.entries.get(path), stat):
+                stale.append(path)
+        jobs = [(path, files[path].st_size, files[path].st_mtime, self.entries.get(path)) for path in stale]
+        for path, (entry, error) in zip(stale, self._run(jobs, chunk_size, workers)):
+            if error is not None:
+                logger.error(f"Error processing file {path}: {error}")
+                self.entries.pop(path, None)
+                changed[path] = []
+            else:
+                self.entries[path] = entry
+                changed[path] = list(self._documents([(path, entry)], None))
+        if changed:
+            self._dirty = True
+        logger.info(f"Corpus index: {len(stale)} read, {len(changed) - len(stale)} removed.")
+        return changed
+
+    def _documents(self, records, cutoff):
+        """Expand chat export entries into one record per conversation."""
+        names = value_names(self.extractor)
+        for path, entry in records:
+            if entry is None:
+                continue
+            if "documents" not in entry:
+                yield path, entry
+                continue
+            for document in entry["documents"]:
+                if cutoff is None or document["mtime"] >= cutoff:
+                    yield document_id(path, document["id"]), dict(
+                        {name: document[name] for name in names}, mtime=document["mtime"])
+
+    def _run(self, jobs, chunk_size, workers):
+        """Index the given files, in a process pool when workers > 1. Results keep job order."""
+        if workers <= 1 or len(jobs) < 2:
+            return [index_file(*job, self.extractor, chunk_size) for job in jobs]
+        workers = min(workers, len(jobs))
+        # Several files per task keeps the pickling overhead small for tiny files, while
+        # leaving enough tasks per worker to even out files of very different sizes.
+        batch = max(1, len(jobs) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(index_file, *zip(*jobs), repeat(self.extractor), repeat(chunk_size),
+                                     chunksize=batch))
+
+    def _prune(self, folders, seen):
+        """Drop entries under the scanned folders whose files no longer exist."""
+        prefixes = tuple(os.path.join(folder, "") for folder in folders)
+        removed = [path for path in self.entries if path.startswith(prefixes) and path not in seen]
+        for path in removed:
+            del self.entries[path]
+        if removed:
+            self._dirty = True
+        return len(removed)
+
+
+def _is_stale(entry, stat):
+    return entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime
+
+
+def value_names(extractor):
+    """Keys an extractor's values are stored under in each entry."""
+    return getattr(extractor, "names", (extractor.name,))
+
+
+def _values(extractor, value):
+    return value if hasattr(extractor, "names") else {extractor.name: value}
+
+
+def index_file(path, size, mtime, old, extractor, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Build the index entry for a file whose size or mtime changed.
+
+    Parameters:
+      - path (str): File to index.
+      - size (int), mtime (float): The file's current stat values.
+      - old (dict): The file's previous entry, or None for a new file.
+      - extractor: Extractor applied to the file's text.
+
+    Returns an (entry, error) tuple; entry is None if the file could not be read or the
+    extractor failed on it, so one bad file does not abort a scan (or a worker pool).
+    """
+    try:
+        # Same size usually means the file was only touched: confirm with the hash
+        # before paying for extraction.
+        if old is not None and old["size"] == size and hash_file(path, chunk_size) == old["hash"]:
+            return dict(old, mtime=mtime), None
+        if is_chat_export(path):
+            digest, documents = extract_chat_export(path, extractor, mtime, chunk_size)
+            return {"size": size, "mtime": mtime, "hash": digest, "documents": documents}, None
+        digest, value = extract_file(path, extractor, chunk_size)
+        return dict(_values(extractor, value), size=size, mtime=mtime, hash=digest), None
+    except Exception as e:
+        return None, str(e)
+
+
+def hash_file(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return the SHA-1 hex digest of a file's contents."""
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def extract_file(path, extractor, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read a UTF-8 file once, hashing its bytes while feeding the decoded text to extractor.
+
+    Returns a (hex digest, extracted value) tuple.
+    """
+    sha = hashlib.sha1()
+    stream = iter_decoded_chunks(path, chunk_size, on_block=sha.update)
+    value = extractor(stream)
+    # Make sure the whole file went through the hash even if the extractor stopped early
+    for _ in stream:
+        pass
+    return sha.hexdigest(), value
+
+
+def extract_chat_export(path, extractor, mtime, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read a ChatGPT export once, hashing its bytes while applying extractor to each
+    conversation in turn.
+
+    Parameters:
+      - mtime (float): The file's modification time, used for conversations without
+        a timestamp of their own.
+
+    Returns a (hex digest, documents) tuple, where documents is a list of
+    {id, mtime, <extractor.name>} dicts (one key per name for extractors with names) in
+    file order. The list is empty for a .json file that is not a chat export.
+    """
+    sha = hashlib.sha1()
+    stream = iter_decoded_chunks(path, chunk_size, on_block=sha.update)
+    documents = []
+    for conversation_id, timestamp, texts in iter_chat_documents(stream):
+        documents.append(dict(_values(extractor, extractor(texts)), id=conversation_id,
+                              mtime=timestamp if timestamp is not None else mtime))
+    for _ in stream:
+        pass
+    return sha.hexdigest(), documents
@@ -0,0 +1,316 @@
+"""
+Dedup Module
+
+Finds documents that are copies or near-copies of an earlier document in the analyzed
+folders, so the corpus tools can count each text once.
+
+  - Exact copies are found by the SHA-1 hash of their text.
+  - Near-copies are found with MinHash: every document is reduced to a signature of
+    NUM_PERM minimum hash values over its word shingles (runs of SHINGLE_SIZE words),
+    and the fraction of equal values between two signatures estimates the Jaccard
+    similarity of their shingle sets. Locality-sensitive hashing (LSH) splits the
+    signatures into bands, so only documents sharing a band are compared.
+
+Signatures are computed through a CorpusIndex, so they are persisted and only
+recomputed for new or changed files. The corpus tools wrap their extractor in
+SignedExtractor, which computes the signature from the same read of each file as the
+extracted value; SignatureExtractor computes signatures alone. A document is a
+duplicate when an earlier document in walk order has the same hash or an estimated
+similarity of at least the threshold; the earlier one is kept.
+
+DuplicateIndex keeps the LSH buckets between calls, so the watcher can check changed
+documents against the others without going over the whole corpus again.
+"""
+
+import re
+import zlib
+import hashlib
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+SHINGLE_SIZE = 3
+DEFAULT_DEDUP_THRESHOLD = 0.85
+# Shingles hashed per numpy operation, which bounds the temporary arrays
+HASH_BLOCK = 1 << 14
+# Characters collected before they are hashed, so short messages are hashed together
+BUFFER_SIZE = 1 << 16
+
+_WORD = re.compile(r"\w+")
+_MASK32 = (1 << 32) - 1
+
+
+@lru_cache(maxsize=1 << 18)
+def _word_hash(word):
+    return zlib.crc32(word.encode("utf-8", "surrogatepass"))
+
+
+@lru_cache(maxsize=None)
+def _permutations(num_perm):
+    """
+    Stable multipliers and offsets of the num_perm hash functions. With an odd
+    multiplier, a * x + b mod 2^32 is a permutation of the 32-bit shingle hashes.
+    """
+    import numpy as np
+
+    params = []
+    for i in range(num_perm):
+        digest = hashlib.sha256(f"minhash:{i}".encode("ascii")).digest()
+        params.append((int.from_bytes(digest[:4], "little") | 1, int.from_bytes(digest[4:8], "little")))
+    return (np.array([a for a, _ in params], dtype=np.uint32),
+            np.array([b for _, b in params], dtype=np.uint32))
+
+
+class MinHasher:
+    """
+    Incremental SHA-1 hash and MinHash signature of one document's text.
+
+    Text can be fed in chunks of any size: a word cut by the end of a chunk and the
+    last words of the previous chunk are carried over, so the result does not depend
+    on where the chunks were split.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE):
+        import numpy as np
+
+        self._np = np
+        self.shingle_size = shingle_size
+        self._a, self._b = _permutations(num_perm)
+        self._min = np.full(num_perm, _MASK32, dtype=np.uint32)
+        self._sha = hashlib.sha1()
+        self._tail = ""
+        self._pending = []
+        self._pending_size = 0
+        self._recent = []
+        self._shingles = 0
+
+    def update(self, text):
+        self._sha.update(text.encode("utf-8", "surrogatepass"))
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self):
+        text = self._tail + "".join(self._pending).lower()
+        self._pending = []
+        self._pending_size = 0
+        if not text:
+            return
+        words = _WORD.findall(text)
+        self._tail = words.pop() if words and _WORD.match(text[-1]) else ""
+        self._add(list(map(_word_hash, words)))
+
+    def _add(self, hashes):
+        np = self._np
+        tokens = self._recent + hashes
+        count = len(tokens) - self.shingle_size + 1
+        if count <= 0:
+            self._recent = tokens
+            return
+        words = np.array(tokens, dtype=np.uint64)
+        shingles = words[:count].copy()
+        for offset in range(1, self.shingle_size):
+            # uint64 arithmetic wraps around, which is what the hash wants
+            shingles = shingles * np.uint64(1000003) + words[offset:offset + count]
+        # Folded to 32 bits: numpy multiplies uint32 arrays many times faster than uint64
+        shingles = (shingles ^ (shingles >> np.uint64(32))).astype(np.uint32)
+        for start in range(0, len(shingles), HASH_BLOCK):
+            block = shingles[start:start + HASH_BLOCK]
+            values = block[None, :] * self._a[:, None] + self._b[:, None]
+            np.minimum(self._min, values.min(axis=1), out=self._min)
+        self._shingles += count
+        self._recent = tokens[count:]
+
+    def digest(self):
+        """
+        Return {"sha1": hex digest, "minhash": hex signature}. The signature is None for
+        a document without words. Documents shorter than a shingle are one shingle.
+        """
+        self._flush()
+        if self._tail:
+            self._add([_word_hash(self._tail)])
+            self._tail = ""
+        if not self._shingles and self._recent:
+            self._recent += [0] * (self.shingle_size - len(self._recent))
+            self._add([])
+        minhash = None
+        if self._shingles:
+            minhash = self._min.astype("<u4").tobytes().hex()
+        return {"sha1": self._sha.hexdigest(), "minhash": minhash}
+
+
+class SignatureExtractor:
+    """Corpus index extractor storing the hash and MinHash signature of each document."""
+
+    name = "signature"
+    fingerprint = f"minhash:{NUM_PERM}:{SHINGLE_SIZE}:crc32:u32"
+
+    def __call__(self, chunks):
+        hasher = MinHasher()
+        for chunk in chunks:
+            hasher.update(chunk)
+        return hasher.digest()
+
+
+class SignedExtractor:
+    """
+    Corpus index extractor that applies another extractor and, in the same pass over
+    the text, computes the document's signature. Entries hold the wrapped extractor's
+    value under its name and the signature under "signature".
+
+    Parameters:
+      - extractor: Extractor to wrap (see corpus_index).
+    """
+
+    def __init__(self, extractor):
+        self.extractor = extractor
+        self.name = f"{extractor.name}+{SignatureExtractor.name}"
+        self.names = (extractor.name, SignatureExtractor.name)
+        self.fingerprint = f"{extractor.fingerprint}:{SignatureExtractor.fingerprint}"
+
+    def __call__(self, chunks):
+        hasher = MinHasher()
+
+        def hashed():
+            for chunk in chunks:
+                hasher.update(chunk)
+                yield chunk
+
+        stream = hashed()
+        value = self.extractor(stream)
+        # The signature covers the whole text even if the extractor stopped early
+        for _ in stream:
+            pass
+        return {self.extractor.name: value, SignatureExtractor.name: hasher.digest()}
+
+
+def lsh_params(threshold, num_perm=NUM_PERM):
+    """
+    Pick (bands, rows) with bands * rows == num_perm for an LSH similarity threshold.
+
+    Two documents share a band with probability 1 - (1 - s^rows)^bands, which rises
+    steeply around s = (1 / bands)^(1 / rows). The largest rows value whose rise comes
+    below the threshold is used, so near-copies are rarely missed; candidates are then
+    checked against the threshold itself.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class DuplicateIndex:
+    """
+    Documents added so far, with their hashes and LSH buckets, so that each document
+    added or removed is only compared with the documents sharing a bucket with it.
+
+    A document added is a duplicate of the earliest added document with the same hash,
+    or else of the earliest kept document with an estimated similarity of at least the
+    threshold. When a document is removed, the documents that copied it are added
+    again, so they are kept or matched with another document.
+
+    Parameters:
+      - threshold (float): Estimated Jaccard similarity from which a document counts as
+        a near-copy. 1.0 only finds exact copies.
+    """
+
+    def __init__(self, threshold=DEFAULT_DEDUP_THRESHOLD):
+        import numpy as np
+
+        self._np = np
+        self.threshold = threshold
+        self.bands, self.rows = lsh_params(threshold)
+        # Duplicate path -> path of the document it copies
+        self.duplicates = {}
+        self._values = {}
+        self._order = {}
+        self._added = 0
+        self._hashes = {}
+        self._copies = {}
+        # Kept documents with a signature -> (signature, bucket keys)
+        self._signatures = {}
+        self._buckets = {}
+
+    def add(self, path, value):
+        """
+        Add a document from its "signature" value; a document added before must be
+        removed first. Returns the path of the document it copies, or None if it is kept.
+        """
+        np = self._np
+        self._values[path] = value
+        # Documents added again after the removal of their original keep their place
+        if path not in self._order:
+            self._order[path] = self._added
+            self._added += 1
+        original = self._hashes.get(value["sha1"])
+        if original is None:
+            self._hashes[value["sha1"]] = path
+            if self.threshold < 1 and value["minhash"] is not None:
+                signature = np.frombuffer(bytes.fromhex(value["minhash"]), dtype="<u4")
+                rows = self.rows
+                keys = [signature[band * rows:(band + 1) * rows].tobytes() + bytes([band])
+                        for band in range(self.bands)]
+                candidates = {candidate for key in keys for candidate in self._buckets.get(key, ())}
+                original = next((candidate for candidate in sorted(candidates, key=self._order.__getitem__)
+                                 if np.count_nonzero(self._signatures[candidate][0] == signature)
+                                 >= self.threshold * len(signature)), None)
+                if original is None:
+                    for key in keys:
+                        self._buckets.setdefault(key, set()).add(path)
+                    self._signatures[path] = (signature, keys)
+        if original is not None:
+            self.duplicates[path] = original
+            self._copies.setdefault(original, set()).add(path)
+        return original
+
+    def remove(self, path):
+        """
+        Remove a document. Returns the paths of the documents that copied it, which were
+        added again and may now be kept.
+        """
+        value = self._values.pop(path, None)
+        if value is None:
+            return []
+        del self._order[path]
+        original = self.duplicates.pop(path, None)
+        if original is not None:
+            self._copies[original].discard(path)
+        if self._hashes.get(value["sha1"]) == path:
+            del self._hashes[value["sha1"]]
+        signature = self._signatures.pop(path, None)
+        if signature is not None:
+            for key in signature[1]:
+                bucket = self._buckets[key]
+                bucket.discard(path)
+                if not bucket:
+                    del self._buckets[key]
+        copies = sorted(self._copies.pop(path, ()), key=self._order.__getitem__)
+        for copy in copies:
+            del self.duplicates[copy]
+            self.add(copy, self._values[copy])
+        return copies
+
+
+def find_duplicates(records, threshold=DEFAULT_DEDUP_THRESHOLD):
+    """
+    Find the duplicates among scanned documents.
+
+    Parameters:
+      - records (list): (path, entry) tuples from a CorpusIndex scan with
+        SignatureExtractor, in walk order.
+      - threshold (float): Estimated Jaccard similarity from which a document counts as
+        a near-copy. 1.0 only removes exact copies.
+
+    Returns a dict mapping each duplicate's path to the path of the document it copies.
+    """
+    index = DuplicateIndex(threshold)
+    for path, entry in records:
+        index.add(path, entry[SignatureExtractor.name])
+    return index.duplicates
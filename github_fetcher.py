@@ -2,67 +2,227 @@
 GitHub Fetcher Module
 
 This module queries the GitHub API for repositories matching a set of interest keywords.
-It supports an optional date filter (only fetching repos updated within the last X days)
-and includes modern machine learning and NLP buzzwords in its query.
+It supports an optional date filter (only fetching repos updated within the last X days),
+and per-interest "since" times so a run only asks for repos pushed after the last
+successful fetch of each interest (see metadata_store).
+
+Interests are fetched concurrently by a bounded thread pool sharing one pooled session.
+The fetcher follows the search API's rate-limit headers (X-RateLimit-Remaining/Reset and
+Retry-After), retries transient failures with exponential backoff and pages through
+results beyond a single page. Requests go through the shared http_cache, which answers
+recent searches locally and revalidates older ones with conditional requests, so
+searches whose results have not changed do not use up quota.
+
+The API endpoint can be pointed at a local stub server with the GITHUB_API_URL
+environment variable or the api_url parameter.
 """
 
 import os
-import requests
+import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import HTTPCache
+
 logger = logging.getLogger(__name__)
 
-GITHUB_API_URL = "https://api.github.com/search/repositories"
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com/search/repositories")
+
+# The search API returns at most 100 items per page
+MAX_PER_PAGE = 100
+DEFAULT_WORKERS = 4
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+MAX_BACKOFF = 60.0
+REQUEST_TIMEOUT = 30
+
+
+class RateLimiter:
+    """
+    Pause shared by all fetch threads. When one response reports that the quota is used
+    up (or asks to retry later), every thread waits until the reset time before sending
+    its next request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def wait(self):
+        """Block until requests are allowed again."""
+        with self._lock:
+            delay = self._resume_at - time.time()
+        if delay > 0:
+            logger.info(f"GitHub rate limit reached, waiting {delay:.0f}s")
+            time.sleep(delay)
+
+    def pause_until(self, timestamp):
+        """Hold back all requests until the given epoch time."""
+        with self._lock:
+            self._resume_at = max(self._resume_at, timestamp)
+
+    def update(self, response):
+        """Pause until the quota resets if the response says none is left."""
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset is not None and int(remaining) <= 0:
+            self.pause_until(float(reset))
+
+
+def make_session(pool_size=DEFAULT_WORKERS):
+    """Create a requests session whose connection pool fits pool_size concurrent threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _retry_delay(response, attempt):
+    """
+    Return how long to wait before retrying a failed response, or None if it should not
+    be retried. Rate-limit responses say when to come back; server errors back off.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    if response.status_code in (403, 429):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining == "0" and reset is not None:
+            return max(0.0, float(reset) - time.time())
+        if response.status_code == 403:
+            return None
+    if response.status_code == 429 or response.status_code >= 500:
+        return min(MAX_BACKOFF, BACKOFF_BASE * 2 ** attempt)
+    return None
+
+
+def _get_json(session, cache, url, params, headers, limiter):
+    """
+    GET a search page through the response cache and return its decoded JSON,
+    honouring rate limits and retrying transient failures.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = cache.get(session, url, params=params, headers=headers, source="github",
+                                 timeout=REQUEST_TIMEOUT, before_request=limiter.wait)
+        except requests.RequestException as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = min(MAX_BACKOFF, BACKOFF_BASE * 2 ** attempt)
+            logger.warning(f"GitHub request failed ({e}), retrying in {delay:.0f}s")
+            time.sleep(delay)
+            continue
+
+        limiter.update(response)
+        if response.status_code >= 400 and attempt < MAX_RETRIES:
+            delay = _retry_delay(response, attempt)
+            if delay is not None:
+                logger.warning(f"GitHub returned {response.status_code}, retrying in {delay:.0f}s")
+                limiter.pause_until(time.time() + delay)
+                continue
+        response.raise_for_status()
+        return response.json()
+
+
+def _fetch_interest(session, cache, api_url, interest, max_results, days, headers, limiter, since=None):
+    """
+    Fetch up to max_results repositories for one interest, paging as needed. since (a
+    naive UTC datetime) limits the search to repos pushed on or after its day, when that
+    is later than the 'days' cutoff.
+    """
+    # Build query string with date filter if specified. Whole days keep the query (and
+    # its cache key) the same for a day; repos seen again are deduplicated by the store.
+    threshold = datetime.utcnow() - timedelta(days=days) if days else None
+    if since and (threshold is None or since > threshold):
+        threshold = since
+    query = f"{interest} pushed:>={threshold:%Y-%m-%d}" if threshold else interest
+
+    per_page = min(max_results, MAX_PER_PAGE)
+    repos = []
+    page = 1
+    while len(repos) < max_results:
+        params = {
+            "q": query,
+            "sort": "stars",
+            "order": "desc",
+            "per_page": per_page,
+            "page": page
+        }
+        data = _get_json(session, cache, api_url, params, headers, limiter)
+        items = data.get("items", [])
+        for item in items[:max_results - len(repos)]:
+            repos.append({
+                "interest": interest,
+                "name": item.get("full_name"),
+                "html_url": item.get("html_url"),
+                "description": item.get("description"),
+                "language": item.get("language"),
+                "last_pushed": item.get("pushed_at")
+            })
+        if len(items) < per_page:
+            break
+        page += 1
+    return repos
 
 
-def fetch_github_repos(interests, max_results_per_interest=5, days=None):
+def fetch_github_repos(interests, max_results_per_interest=5, days=None, max_workers=DEFAULT_WORKERS,
+                       session=None, api_url=None, cache=None, since=None, failed=None):
     """
     For each interest keyword, fetch GitHub repositories using the GitHub API.
-    
+
     Parameters:
       - interests (list): List of interest keywords.
-      - max_results_per_interest (int): Max number of repos per interest.
+      - max_results_per_interest (int or dict): Max number of repos per interest, or a
+        dict of interest -> max (interests missing from it get 5).
       - days (int): (Optional) Only fetch repos updated within the last 'days' days.
-      
-    Returns a list of dictionaries with repo information.
+      - max_workers (int): Number of interests fetched concurrently.
+      - session (requests.Session): (Optional) Session to reuse; one is created otherwise.
+      - api_url (str): (Optional) Search endpoint, e.g. a local stub server.
+      - cache (HTTPCache): (Optional) Response cache; an in-memory one is used otherwise.
+      - since (dict): (Optional) interest -> naive UTC datetime; only fetch repos of that
+        interest pushed after it.
+      - failed (set): (Optional) Interests whose fetch failed are added to it.
+
+    Returns a list of dictionaries with repo information, grouped in the order of interests.
     """
-    all_repos = []
-    headers = {}
+    headers = {"Accept": "application/vnd.github+json"}
     github_token = os.environ.get("GITHUB_TOKEN")
     if github_token:
         headers["Authorization"] = f"token {github_token}"
 
-    for interest in interests:
-        # Build query string with date filter if specified
-        if days:
-            threshold_date = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d")
-            query = f"{interest} pushed:>={threshold_date}"
-        else:
-            query = interest
+    api_url = api_url or GITHUB_API_URL
+    session = session or make_session(max_workers)
+    limiter = RateLimiter()
+    cache = cache or HTTPCache(None)
 
-        params = {
-            "q": query,
-            "sort": "stars",
-            "order": "desc",
-            "per_page": max_results_per_interest
-        }
+    def fetch(interest):
+        if isinstance(max_results_per_interest, dict):
+            max_results = max_results_per_interest.get(interest, 5)
+        else:
+            max_results = max_results_per_interest
         try:
-            response = requests.get(GITHUB_API_URL, params=params, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            items = data.get("items", [])
-            for item in items:
-                repo_info = {
-                    "interest": interest,
-                    "name": item.get("full_name"),
-                    "html_url": item.get("html_url"),
-                    "description": item.get("description"),
-                    "language": item.get("language"),
-                    "last_pushed": item.get("pushed_at")
-                }
-                all_repos.append(repo_info)
+            return _fetch_interest(session, cache, api_url, interest, max_results, days, headers, limiter,
+                                   since=(since or {}).get(interest))
         except Exception as e:
             logger.error(f"Error fetching GitHub repos for interest '{interest}': {e}")
+            if failed is not None:
+                failed.add(interest)
+            return []
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(fetch, interests))
 
+    all_repos = []
+    for repos in results:
+        all_repos.extend(repos)
     return all_repos
@@ -0,0 +1,289 @@
+"""
+HTTP Cache Module
+
+This module provides the on-disk response cache shared by github_fetcher and
+papers_fetcher. Responses are keyed by their normalized URL and query parameters and
+stored in a single SQLite file together with their ETag/Last-Modified validators.
+
+  - Each source (e.g. "github", "arxiv") has its own time-to-live; fresh entries are
+    served without touching the network.
+  - Stale entries are revalidated with a conditional request, so an unchanged result
+    costs a 304 instead of a full response (and no search quota on GitHub).
+  - The total size of stored bodies is bounded; least recently used entries are evicted.
+  - In offline mode every request is answered from the cache (stale or not), and a miss
+    raises OfflineCacheMiss, so a whole pipeline run can be replayed without network.
+  - A streamed request (stream=True) hands the body to the caller as it downloads, e.g.
+    to a feed parser, while a copy is kept; the copy is stored once the body is complete.
+"""
+
+import io
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from instrumentation import tracer
+from utils import safe_mkdir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join("output", "http_cache.sqlite")
+
+# Seconds a response stays fresh, per source
+DEFAULT_TTLS = {
+    "github": 60 * 60,
+    "arxiv": 6 * 60 * 60,
+}
+DEFAULT_TTL = 60 * 60
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Response headers kept with a cached body
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+# Bytes requested from the network at a time for streamed bodies
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class OfflineCacheMiss(Exception):
+    """Raised in offline mode when a request has no cached response."""
+
+
+class TeeReader(io.RawIOBase):
+    """
+    File-like view of a streamed requests.Response body that keeps a copy of what is
+    read. Once the end is reached, the response is closed and on_complete is called with
+    the whole body, which is also kept as .body.
+    """
+
+    def __init__(self, response, on_complete, chunk_size=STREAM_CHUNK_SIZE):
+        self._response = response
+        self._chunks = response.iter_content(chunk_size)
+        self._on_complete = on_complete
+        self._blocks = []
+        self._pending = b""
+        self.body = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            if self.body is not None:
+                return 0
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self.body = b"".join(self._blocks)
+                self._blocks = []
+                self._response.close()
+                self._on_complete(self.body)
+                return 0
+            self._blocks.append(chunk)
+            self._pending = chunk
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class CachedResponse:
+    """
+    Minimal response object returned by HTTPCache.get, exposing the parts of
+    requests.Response the fetchers use. The body is either given as content or read
+    from a TeeReader as it downloads.
+    """
+
+    def __init__(self, url, status_code, headers, content=None, from_cache=False, stream=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self._content = content
+        self._stream = stream
+        self.from_cache = from_cache
+
+    @property
+    def content(self):
+        """The whole body; a streamed body is read to the end first."""
+        if self._content is None:
+            self._stream.read()
+            self._content = self._stream.body
+        return self._content
+
+    @property
+    def raw(self):
+        """
+        File-like view of the body, e.g. for incremental XML parsing. A streamed body is
+        downloaded as it is read, and can only be read once.
+        """
+        if self._content is None:
+            return self._stream
+        return io.BytesIO(self._content)
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+def normalize_key(url, params=None):
+    """Return a canonical cache key for a URL and its query parameters."""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query.extend((str(k), str(v)) for k, v in params.items())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/",
+                       urlencode(sorted(query)), ""))
+
+
+class HTTPCache:
+    """
+    SQLite-backed response cache.
+
+    Parameters:
+      - path (str): Database file, or None for an in-memory cache that lasts one run.
+      - ttls (dict): Seconds a response stays fresh, per source name.
+      - max_bytes (int): Upper bound on the total size of stored bodies.
+      - offline (bool): Serve every request from the cache and never use the network.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttls=None, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._lock = threading.Lock()
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                safe_mkdir(directory)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, source TEXT, status INTEGER, headers TEXT, body BLOB,"
+            " etag TEXT, last_modified TEXT, stored_at REAL, accessed_at REAL, size INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _lookup(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, headers, body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                (key,)).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+        return row
+
+    def _store(self, key, source, response, body):
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, source, response.status_code, json.dumps(headers), body,
+                 response.headers.get("ETag"), response.headers.get("Last-Modified"), now, now, len(body)))
+            self._evict()
+            self._db.commit()
+
+    def _touch(self, key):
+        with self._lock:
+            self._db.execute("UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+
+    def _evict(self):
+        """Delete least recently used entries until the stored bodies fit max_bytes."""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def get(self, session, url, params=None, headers=None, source="default", timeout=None, before_request=None,
+            stream=False):
+        """
+        GET url through the cache.
+
+        Parameters:
+          - session (requests.Session): Session used when the network is needed.
+          - url (str), params (dict), headers (dict): The request. Headers are not part
+            of the cache key.
+          - source (str): Name selecting the time-to-live (see DEFAULT_TTLS).
+          - timeout (float): Request timeout.
+          - before_request (callable): (Optional) Called right before a network request,
+            e.g. to respect rate limits; not called when the cache answers.
+          - stream (bool): Download a 200 response's body as the caller reads it from
+            the response's raw stream. The body is stored once it was read to the end.
+
+        Returns a CachedResponse. Only 200 responses are stored; other statuses are
+        passed through so the caller can handle them.
+
+        Every call is recorded as an "http" span, and the http.* counters track cache
+        hits, network requests, 304 revalidations and downloaded bytes.
+        """
+        with tracer.span(f"GET {source}", category="http", url=normalize_key(url, params)) as span:
+            response = self._get(session, url, params, headers, source, timeout, before_request, span, stream)
+            span["status"] = response.status_code
+            if response._stream is None:
+                span["bytes"] = len(response.content)
+        return response
+
+    def _get(self, session, url, params, headers, source, timeout, before_request, span, stream):
+        key = span["url"]
+        row = self._lookup(key)
+        if row is not None:
+            status, stored_headers, body, etag, last_modified, stored_at = row
+            cached = CachedResponse(key, status, json.loads(stored_headers), body, from_cache=True)
+            if self.offline or time.time() - stored_at < self.ttls.get(source, DEFAULT_TTL):
+                span["result"] = "hit"
+                tracer.count("http.cache_hits")
+                return cached
+        elif self.offline:
+            raise OfflineCacheMiss(f"No cached response for {key}")
+
+        request_headers = dict(headers or {})
+        if row is not None:
+            if etag:
+                request_headers["If-None-Match"] = etag
+            if last_modified:
+                request_headers["If-Modified-Since"] = last_modified
+        if before_request:
+            before_request()
+        response = session.get(url, params=params, headers=request_headers, timeout=timeout, stream=stream)
+        tracer.count("http.requests")
+        tracer.count(f"http.requests.{source}")
+
+        if response.status_code == 304 and row is not None:
+            response.close()
+            span["result"] = "revalidated"
+            tracer.count("http.not_modified")
+            self._touch(key)
+            # Keep the live headers (rate-limit counters etc.) with the cached body
+            return CachedResponse(key, status, response.headers, body, from_cache=True)
+        span["result"] = "network"
+        if stream and response.status_code == 200:
+            def complete(body):
+                # The span has finished by now; its args are still stored with it
+                span["bytes"] = len(body)
+                tracer.count("http.bytes", len(body))
+                self._store(key, source, response, body)
+
+            return CachedResponse(response.url, 200, response.headers, stream=TeeReader(response, complete))
+        tracer.count("http.bytes", len(response.content))
+        if response.status_code == 200:
+            self._store(key, source, response, response.content)
+        return CachedResponse(response.url, response.status_code, response.headers, response.content)
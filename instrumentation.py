@@ -0,0 +1,212 @@
+"""
+Instrumentation Module
+
+Lightweight timing, counters and opt-in profiling for the pipeline.
+
+  - tracer.span(name) times a block of code. Spans in the "stage" category are logged
+    when they finish; all spans are kept as Chrome trace events (open the file written
+    by tracer.write_trace in chrome://tracing or https://ui.perfetto.dev).
+  - tracer.count(name, value) adds to a named counter, e.g. HTTP requests or bytes.
+  - stage(name, profile) combines a stage span with an optional profiler: "cpu" runs the
+    stage under cProfile, "memory" under tracemalloc. Reports go to the output folder.
+    cProfile only sees the thread the stage runs on, while tracemalloc counts every
+    allocation of the process, so the pipeline runs stages one at a time when profiling.
+
+Recording a span costs a couple of microseconds, so the tracer is always on.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from utils import safe_mkdir
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = "output"
+PROFILE_MODES = ("cpu", "memory")
+# Lines of profiler output included in the text reports
+PROFILE_TOP = 30
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+class Tracer:
+    """
+    Collects spans and counters for one process. Thread-safe: fetch threads record
+    their HTTP calls into the same tracer as the main thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.events = []
+        self.counters = Counter()
+
+    def reset(self):
+        with self._lock:
+            self._origin = time.perf_counter()
+            self.events = []
+            self.counters = Counter()
+
+    @contextmanager
+    def span(self, name, category="stage", **args):
+        """
+        Time the enclosed block. Yields a dict whose contents are stored with the span,
+        so the block can attach results (status codes, sizes...).
+        """
+        args = dict(args)
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            if category == "stage":
+                args.setdefault("peak_rss_mb", peak_rss_mb())
+                logger.info(f"Stage '{name}' finished in {end - start:.2f}s")
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self._origin) * 1e6),
+                "dur": round((end - start) * 1e6),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def summary(self):
+        """Return {"stages": {name: seconds}, "counters": {...}} for the recorded run."""
+        with self._lock:
+            stages = {}
+            for event in self.events:
+                if event["cat"] == "stage":
+                    stages[event["name"]] = stages.get(event["name"], 0.0) + event["dur"] / 1e6
+            return {"stages": stages, "counters": dict(self.counters)}
+
+    def write_trace(self, path):
+        """Write the spans and final counter values as a Chrome trace JSON file."""
+        directory = os.path.dirname(path)
+        if directory:
+            safe_mkdir(directory)
+        with self._lock:
+            events = list(self.events)
+            counters = dict(self.counters)
+        now = round((time.perf_counter() - self._origin) * 1e6)
+        for name, value in sorted(counters.items()):
+            events.append({"name": name, "ph": "C", "ts": now, "pid": os.getpid(), "tid": 0,
+                           "args": {"value": value}})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"counters": counters}}, f)
+        logger.info(f"Trace written to {path}")
+
+
+# Shared by all modules of the process
+tracer = Tracer()
+
+
+def parse_profile_args(values):
+    """
+    Turn --profile values like ["github", "analyze:memory"] into {stage: mode}.
+    The mode defaults to "cpu". Raises ValueError for an unknown mode.
+    """
+    profiles = {}
+    for value in values or []:
+        name, _, mode = value.partition(":")
+        mode = mode or "cpu"
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}' for stage '{name}' (use cpu or memory)")
+        profiles[name] = mode
+    return profiles
+
+
+@contextmanager
+def stage(name, profile=None, output_dir=PROFILE_DIR):
+    """
+    Run a pipeline stage inside a tracer span, optionally profiled.
+
+    Parameters:
+      - name (str): Stage name, used for the span and the report file names.
+      - profile (str): None, "cpu" (cProfile) or "memory" (tracemalloc).
+      - output_dir (str): Folder the profile reports are written to.
+    """
+    with tracer.span(name) as args:
+        if profile == "cpu":
+            with _cpu_profile(name, output_dir):
+                yield args
+        elif profile == "memory":
+            with _memory_profile(name, output_dir, args):
+                yield args
+        else:
+            yield args
+
+
+@contextmanager
+def _cpu_profile(name, output_dir):
+    import io
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        safe_mkdir(output_dir)
+        stats_path = os.path.join(output_dir, f"profile_{name}.prof")
+        profiler.dump_stats(stats_path)
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        report_path = os.path.join(output_dir, f"profile_{name}.txt")
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+        logger.info(f"CPU profile of '{name}' written to {stats_path} and {report_path}")
+
+
+@contextmanager
+def _memory_profile(name, output_dir, args):
+    import tracemalloc
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(10)
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if started:
+            tracemalloc.stop()
+        # tracemalloc counts the allocations of every thread, not only the stage's
+        args["process_traced_peak_mb"] = round(peak / (1024 * 1024), 1)
+        safe_mkdir(output_dir)
+        report_path = os.path.join(output_dir, f"profile_{name}_memory.txt")
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(f"Traced memory of the whole process while '{name}' ran: current {current / 1024 / 1024:.1f} MB, "
+                    f"peak {peak / 1024 / 1024:.1f} MB\n\n")
+            for stat in snapshot.statistics("lineno")[:PROFILE_TOP]:
+                f.write(f"{stat}\n")
+        logger.info(f"Memory profile of '{name}' written to {report_path} (process peak {peak / 1024 / 1024:.1f} MB)")
@@ -1,42 +1,124 @@
 #!/usr/bin/env python
+"""
+Knowledge Graph Module
+
+Builds a co-occurrence graph of the interest topics found in the analyzed files.
+
+The topic sets of all files are collected into a sparse document x topic matrix and the
+co-occurrence counts are computed in one sparse product. Weak edges can be pruned by a
+minimum count or by pointwise mutual information (PMI). The graph can be exported as
+GraphML and a weighted edge list, and the rendered picture can be limited to the top-N
+topics, so large corpora can be handled in headless batch runs.
+"""
 import argparse
 import os
 import logging
-import itertools
-
-import networkx as nx
-import matplotlib.pyplot as plt
+from array import array
 
-from nlp_analyzer import extract_interests_from_text
+# numpy, scipy, networkx and matplotlib are imported by the functions that use them,
+# so importing this module (e.g. from cli.py) stays fast.
+from corpus_index import DEFAULT_INDEX_PATH
+from dedup import DEFAULT_DEDUP_THRESHOLD
+from nlp_analyzer import scan_folders
+from utils import safe_mkdir
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def build_cooccurrence_graph(folders):
+def build_topic_matrix(topic_sets):
+    """
+    Build a binary sparse matrix with one row per document and one column per topic.
+
+    Parameters:
+      - topic_sets (iterable): The topics found in each document.
+
+    Returns (CSR matrix, list of topics in column order).
+    """
+    import numpy as np
+    import scipy.sparse as sp
+
+    columns = {}
+    rows = array("q")
+    cols = array("q")
+    n_docs = 0
+    for topics in topic_sets:
+        for topic in topics:
+            rows.append(n_docs)
+            cols.append(columns.setdefault(topic, len(columns)))
+        n_docs += 1
+    data = np.ones(len(rows), dtype=np.int32)
+    index = (np.frombuffer(rows, dtype=np.int64), np.frombuffer(cols, dtype=np.int64))
+    matrix = sp.csr_matrix((data, index), shape=(n_docs, len(columns)))
+    topics = sorted(columns, key=columns.get)
+    return matrix, topics
+
+def cooccurrence_edges(matrix, min_count=1, min_pmi=None):
+    """
+    Compute topic co-occurrence counts as matrix.T @ matrix and prune weak edges.
+
+    Parameters:
+      - matrix (csr_matrix): Binary document x topic matrix.
+      - min_count (int): Drop edges whose topics co-occur in fewer documents.
+      - min_pmi (float): (Optional) Drop edges whose PMI is below this value.
+
+    Returns (rows, cols, counts, pmi) arrays describing the kept edges (rows < cols).
+    """
+    import numpy as np
+    import scipy.sparse as sp
+
+    n_docs = matrix.shape[0]
+    doc_freq = np.asarray(matrix.sum(axis=0)).ravel()
+    counts = sp.triu(matrix.T @ matrix, k=1).tocoo()
+    rows, cols, weights = counts.row, counts.col, counts.data
+    pmi = np.log(weights * n_docs / (doc_freq[rows] * doc_freq[cols].astype(np.float64)))
+    keep = weights >= min_count
+    if min_pmi is not None:
+        keep &= pmi >= min_pmi
+    return rows[keep], cols[keep], weights[keep], pmi[keep]
+
+def build_cooccurrence_graph(folders, index_path=None, workers=1, min_count=1, min_pmi=None,
+                             dedup_threshold=DEFAULT_DEDUP_THRESHOLD):
+    """
+    Count how often each pair of topics appears in the same file. Copies and near-copies
+    of a document are counted once (see nlp_analyzer.scan_folders).
+
+    Returns (cooccurrences, topics_set), where cooccurrences maps a sorted topic pair to
+    the number of files containing both.
+    """
+    records = scan_folders(folders, index_path=index_path, workers=workers, dedup_threshold=dedup_threshold)
+    matrix, topics = build_topic_matrix(entry["topics"] for _, entry in records)
+    rows, cols, weights, _ = cooccurrence_edges(matrix, min_count=min_count, min_pmi=min_pmi)
     cooccurrences = {}
-    topics_set = set()
-    for folder in folders:
-        if not os.path.isdir(folder):
-            logger.warning(f"Folder not found: {folder}")
-            continue
-        for root, dirs, files in os.walk(folder):
-            for file in files:
-                if file.endswith(".txt") or file.endswith(".md"):
-                    file_path = os.path.join(root, file)
-                    try:
-                        with open(file_path, "r", encoding="utf-8") as f:
-                            text = f.read()
-                        topics = extract_interests_from_text(text)
-                        topics_set.update(topics)
-                        # Update co-occurrence counts for each unique pair in the file
-                        for pair in itertools.combinations(set(topics), 2):
-                            sorted_pair = tuple(sorted(pair))
-                            cooccurrences[sorted_pair] = cooccurrences.get(sorted_pair, 0) + 1
-                    except Exception as e:
-                        logger.error(f"Error processing file {file_path}: {e}")
-    return cooccurrences, topics_set
-
-def visualize_graph(cooccurrences, topics_set):
+    for i, j, weight in zip(rows.tolist(), cols.tolist(), weights.tolist()):
+        pair = tuple(sorted((topics[i], topics[j])))
+        cooccurrences[pair] = weight
+    return cooccurrences, set(topics)
+
+def export_graph(G, output_dir="output"):
+    """Write the graph as GraphML and as a tab-separated weighted edge list."""
+    import networkx as nx
+
+    safe_mkdir(output_dir)
+    graphml_path = os.path.join(output_dir, "knowledge_graph.graphml")
+    edges_path = os.path.join(output_dir, "knowledge_graph_edges.tsv")
+    nx.write_graphml(G, graphml_path)
+    nx.write_weighted_edgelist(G, edges_path, delimiter="\t")
+    print(f"Knowledge graph exported to {graphml_path} and {edges_path}")
+
+def visualize_graph(cooccurrences, topics_set, top_n=None, headless=False, export=False, output_dir="output"):
+    """
+    Draw the topic graph and save it as output/knowledge_graph.png.
+
+    Parameters:
+      - top_n (int): (Optional) Only draw the top_n topics by weighted degree.
+      - headless (bool): Render without a display and do not open a window.
+      - export (bool): Also write the full graph as GraphML and an edge list.
+    """
+    import networkx as nx
+    import matplotlib.pyplot as plt
+
+    if headless:
+        plt.switch_backend("Agg")
     G = nx.Graph()
     # Add nodes
     for topic in topics_set:
@@ -44,27 +126,48 @@ def visualize_graph(cooccurrences, topics_set):
     # Add edges with weights
     for (topic1, topic2), weight in cooccurrences.items():
         G.add_edge(topic1, topic2, weight=weight)
+    if export:
+        export_graph(G, output_dir)
+    if top_n and G.number_of_nodes() > top_n:
+        strength = dict(G.degree(weight="weight"))
+        top = sorted(G.nodes, key=lambda node: (-strength[node], node))[:top_n]
+        G = G.subgraph(top)
     pos = nx.spring_layout(G, k=0.5, iterations=50)
     plt.figure(figsize=(10, 10))
     weights = [G[u][v]['weight'] for u, v in G.edges()]
     nx.draw(G, pos, with_labels=True, node_color="skyblue", edge_color="gray", 
             width=[w * 0.5 for w in weights], font_size=10)
     plt.title("Knowledge Graph of Topics")
-    output_path = "output/knowledge_graph.png"
+    safe_mkdir(output_dir)
+    output_path = os.path.join(output_dir, "knowledge_graph.png")
     plt.savefig(output_path)
-    plt.show()
+    if not headless:
+        plt.show()
+    plt.close()
     print(f"Knowledge graph saved as {output_path}")
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Build a Knowledge Graph from Text Files")
     parser.add_argument("-f", "--folders", nargs="+", required=True, help="Folders to analyze")
-    args = parser.parse_args()
+    parser.add_argument("--index", type=str, default=DEFAULT_INDEX_PATH, help="Corpus index file used to skip unchanged files")
+    parser.add_argument("--no_index", action="store_true", help="Do not use the corpus index; re-read every file")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to analyze files")
+    parser.add_argument("--dedup_threshold", type=float, default=DEFAULT_DEDUP_THRESHOLD,
+                        help="Count documents at least this similar to an earlier one once (0 disables)")
+    parser.add_argument("--min_count", type=int, default=1, help="Drop edges between topics that co-occur in fewer files")
+    parser.add_argument("--min_pmi", type=float, default=None, help="Drop edges whose pointwise mutual information is below this value")
+    parser.add_argument("--top_n", type=int, default=None, help="Only draw the N most connected topics")
+    parser.add_argument("--headless", action="store_true", help="Render without a display and export GraphML and edge-list files")
+    args = parser.parse_args(argv)
     
-    cooccurrences, topics_set = build_cooccurrence_graph(args.folders)
+    index_path = None if args.no_index else args.index
+    cooccurrences, topics_set = build_cooccurrence_graph(args.folders, index_path=index_path, workers=args.workers,
+                                                         min_count=args.min_count, min_pmi=args.min_pmi,
+                                                         dedup_threshold=args.dedup_threshold)
     if not topics_set:
         logger.info("No topics found in the provided folders.")
         return
-    visualize_graph(cooccurrences, topics_set)
+    visualize_graph(cooccurrences, topics_set, top_n=args.top_n, headless=args.headless, export=args.headless)
 
 if __name__ == "__main__":
     main()
@@ -7,20 +7,33 @@ GitHub repositories and arXiv research papers that match those interests.
 
 import argparse
 import os
+import math
 import logging
+from datetime import datetime
+from functools import lru_cache
 
-from nlp_analyzer import analyze_folders
-from github_fetcher import fetch_github_repos
-from papers_fetcher import fetch_papers
+from corpus_index import DEFAULT_INDEX_PATH
+from dedup import DEFAULT_DEDUP_THRESHOLD
+from nlp_analyzer import DEFAULT_HALF_LIFE_DAYS, analyze_folders, extract_interests_from_text, load_keywords
+from instrumentation import parse_profile_args, tracer
+from metadata_store import METADATA_STORE_PATH, MetadataStore
+from result_store import DEFAULT_FORMAT, write_results
 from utils import safe_mkdir
 
-import pandas as pd
+# The fetch side (requests, the fetchers, the HTTP cache, relevance ranking) is imported
+# by the functions that use it, so "cli.py analyze" does not load it.
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Results fetched per interest of average weight; higher-ranked interests get more
+GITHUB_RESULTS_PER_INTEREST = 5
+ARXIV_RESULTS_PER_INTEREST = 3
+# No interest gets more than this many times the base count
+MAX_WEIGHT_FACTOR = 3
 
-def parse_args():
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(
         description="Analyze your personal documents & ChatGPT history to fetch "
                     "relevant GitHub repositories and research papers based on your interests."
@@ -37,75 +50,505 @@ def parse_args():
         default="",
         help="(Optional) Path to a text file that contains additional manual interests."
     )
+    parser.add_argument(
+        "-k", "--keywords_file",
+        type=str,
+        default="",
+        help="(Optional) Path to a text file with one candidate keyword per line, "
+             "used instead of the built-in keyword list."
+    )
     parser.add_argument(
         "--days",
         type=int,
         default=None,
         help="(Optional) Only consider files and online content from the last X days."
     )
+    parser.add_argument(
+        "--index",
+        type=str,
+        default=DEFAULT_INDEX_PATH,
+        help="Corpus index file used to skip files that have not changed since the last run."
+    )
+    parser.add_argument(
+        "--no_index",
+        action="store_true",
+        help="Do not read or write the corpus index; re-read every file."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to read and analyze files in parallel."
+    )
+    parser.add_argument(
+        "--dedup_threshold",
+        type=float,
+        default=DEFAULT_DEDUP_THRESHOLD,
+        help="Count documents at least this similar to an earlier one once when ranking interests (0 disables)."
+    )
+    parser.add_argument(
+        "--half_life_days",
+        type=float,
+        default=DEFAULT_HALF_LIFE_DAYS,
+        help="Files this many days old count half when ranking interests (0 disables the decay)."
+    )
+    parser.add_argument(
+        "--max_interests",
+        type=int,
+        default=None,
+        help="(Optional) Only fetch results for this many of the top-ranked interests."
+    )
+    parser.add_argument(
+        "--max_requests",
+        type=int,
+        default=None,
+        help="(Optional) Budget of GitHub and arXiv API calls; lower-ranked interests are dropped to fit it."
+    )
     parser.add_argument(
         "--advanced_nlp",
         action="store_true",
         help="Use advanced NLP extraction with spaCy."
     )
+    parser.add_argument(
+        "--nlp_batch_size",
+        type=int,
+        default=64,
+        help="Number of documents per spaCy batch when using --advanced_nlp."
+    )
+    parser.add_argument(
+        "--nlp_processes",
+        type=int,
+        default=1,
+        help="Number of processes spaCy uses when using --advanced_nlp."
+    )
+    parser.add_argument(
+        "--fetch_workers",
+        type=int,
+        default=4,
+        help="Number of concurrent requests used when fetching GitHub repositories."
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="HTTP response cache shared by the GitHub and arXiv fetchers (default: output/http_cache.sqlite)."
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Do not read or write the HTTP response cache."
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        type=int,
+        default=256,
+        help="Maximum size of the HTTP response cache in megabytes."
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Replay GitHub and arXiv results from the HTTP cache without using the network."
+    )
+    parser.add_argument(
+        "--store_format",
+        choices=["parquet", "jsonl"],
+        default=DEFAULT_FORMAT,
+        help="Format the fetched results are stored in for the summarizer and web app."
+    )
+    parser.add_argument(
+        "--metadata_store",
+        type=str,
+        default=METADATA_STORE_PATH,
+        help="SQLite store of every fetched repo and paper; each interest is only searched for items "
+             "newer than its last successful fetch."
+    )
+    parser.add_argument(
+        "--no_metadata_store",
+        action="store_true",
+        help="Do not read or write the metadata store."
+    )
+    parser.add_argument(
+        "--full_fetch",
+        action="store_true",
+        help="Fetch the full results of every interest, not only what is new since its last fetch."
+    )
+    parser.add_argument(
+        "--excel",
+        action="store_true",
+        help="Also export the fetched results as Excel files."
+    )
     parser.add_argument(
         "--download_pdfs",
         action="store_true",
         help="If set, download PDFs of the research papers from arXiv."
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--download_workers",
+        type=int,
+        default=4,
+        help="Number of concurrent PDF downloads when using --download_pdfs."
+    )
+    parser.add_argument(
+        "--download_top_k",
+        type=int,
+        default=None,
+        help="(Optional) Only download the PDFs of the N papers most relevant to your documents."
+    )
+    parser.add_argument(
+        "--no_relevance",
+        action="store_true",
+        help="Keep fetched results in API order instead of ranking them against your documents."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reuse the outputs of the stages a previous run with the same settings completed."
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="(Optional) Write a Chrome-trace JSON file of the stages and HTTP calls to this path."
+    )
+    parser.add_argument(
+        "--profile",
+        action="append",
+        metavar="STAGE[:cpu|memory]",
+        help="Profile a stage (analyze, relevance, github, store_repos, arxiv, downloads, store_papers) with cProfile "
+             "(cpu, the default) or tracemalloc (memory, which covers the whole process). Can be repeated; "
+             "the stages run one at a time while profiling."
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None, fetch=True):
+    """
+    Run the pipeline: extract interests from the folders, then fetch and store matching
+    GitHub repositories and arXiv papers.
+
+    Parameters:
+      - argv (list): (Optional) Command line arguments; sys.argv is used otherwise.
+      - fetch (bool): If False, only print the extracted interests (cli.py analyze).
+    """
+    args = parse_args(argv)
+    try:
+        profiles = parse_profile_args(args.profile)
+    except ValueError as e:
+        logger.error(str(e))
+        return
+
+    try:
+        return run_pipeline(args, fetch=fetch, profiles=profiles)
+    finally:
+        summary = tracer.summary()
+        if summary["stages"]:
+            timings = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in summary["stages"].items())
+            logger.info(f"Stage timings: {timings}")
+        if summary["counters"]:
+            logger.info(f"Counters: {summary['counters']}")
+        if args.trace:
+            tracer.write_trace(args.trace)
+
+
+def pipeline_settings(args):
+    """The arguments that determine the stage outputs, used to key the resume cache."""
+    return {
+        "folders": [os.path.abspath(folder) for folder in args.folders],
+        "manual_interests": args.manual_interests,
+        "keywords_file": args.keywords_file,
+        "days": args.days,
+        "half_life_days": args.half_life_days,
+        "dedup_threshold": args.dedup_threshold,
+        "max_interests": args.max_interests,
+        "max_requests": args.max_requests,
+        "advanced_nlp": args.advanced_nlp,
+        "offline": args.offline,
+        "store_format": args.store_format,
+        "metadata_store": None if args.no_metadata_store else os.path.abspath(args.metadata_store),
+        "full_fetch": args.full_fetch,
+        "excel": args.excel,
+        "download_pdfs": args.download_pdfs,
+        "download_top_k": args.download_top_k,
+        "relevance": not args.no_relevance,
+    }
+
+
+def estimated_requests(interest_count):
+    """API calls needed for this many interests: one GitHub search each, one arXiv query per batch."""
+    from papers_fetcher import DEFAULT_BATCH_SIZE as ARXIV_BATCH_SIZE
+
+    return interest_count + math.ceil(interest_count / ARXIV_BATCH_SIZE)
+
+
+def scaled_limits(ranked, base):
+    """
+    Split base * len(ranked) results over the interests in proportion to their weights,
+    giving each at least 1 and at most MAX_WEIGHT_FACTOR * base.
+    """
+    total_weight = sum(weight for _, weight in ranked)
+    if total_weight <= 0:
+        return {interest: base for interest, _ in ranked}
+    budget = base * len(ranked)
+    return {interest: min(MAX_WEIGHT_FACTOR * base, max(1, round(budget * weight / total_weight)))
+            for interest, weight in ranked}
+
+
+def plan_fetch(ranked, max_interests=None, max_requests=None):
+    """
+    Choose which interests to fetch and how many results to ask for each.
+
+    Parameters:
+      - ranked (list): (interest, weight) pairs, highest ranked first.
+      - max_interests (int): (Optional) Keep at most this many interests.
+      - max_requests (int): (Optional) Keep only as many interests as fit this API call
+        budget (one page per interest; interests needing more results may page further).
+
+    Returns (interests, GitHub results per interest, arXiv results per interest).
+    """
+    count = len(ranked)
+    if max_interests is not None:
+        count = min(count, max(0, max_interests))
+    if max_requests is not None:
+        while count and estimated_requests(count) > max_requests:
+            count -= 1
+    selected = [(interest, weight) for interest, weight in ranked[:count]]
+    if count < len(ranked):
+        dropped = [interest for interest, _ in ranked[count:]]
+        logger.info(f"Fetch budget: using the top {count} of {len(ranked)} interests; skipping {dropped}")
+    logger.info(f"Planned API calls: {estimated_requests(count)}")
+    return ([interest for interest, _ in selected],
+            scaled_limits(selected, GITHUB_RESULTS_PER_INTEREST),
+            scaled_limits(selected, ARXIV_RESULTS_PER_INTEREST))
+
 
+def run_pipeline(args, fetch=True, profiles=None):
+    """
+    Run the pipeline stages for parsed arguments; profiles maps stage name -> profiler.
 
-def main():
-    args = parse_args()
+    The stages form this graph, and each starts as soon as its inputs are ready:
+
+        analyze -+-> github --> store_repos
+                 +-> arxiv ---> store_papers
+                       '~~~~~~> downloads (reads papers while arxiv is still fetching)
+        relevance ---> store_repos, store_papers (and downloads with --download_top_k)
+
+    The relevance stage vectorizes the user's documents while the fetches run; the
+    stored results are then ordered by relevance, and with --download_top_k the
+    downloads wait for all papers and only fetch the most relevant ones.
+
+    With the metadata store, the fetches only ask for items newer than the last
+    successful fetch of each interest and upsert what they get, so the result files
+    hold what this run found and the store everything found so far. The store stages
+    then only add the relevance scores to the stored items.
+    """
+    from pipeline import PIPELINE_CACHE_DIR, Pipeline, PipelineError, run_key
 
     # Create output folders if they do not exist
     safe_mkdir("output")
     safe_mkdir("papers")
 
-    # Analyze the provided folders to extract interests (with optional advanced NLP and date filtering)
-    logger.info("Analyzing folders for interests...")
-    extracted_interests = analyze_folders(args.folders, advanced=args.advanced_nlp, days=args.days)
-    logger.info(f"Extracted interests: {extracted_interests}")
-
-    # If a manual interests file is provided, add its contents
-    if args.manual_interests and os.path.isfile(args.manual_interests):
-        with open(args.manual_interests, "r", encoding="utf-8") as f:
-            manual_text = f.read()
-        # We always use basic extraction for the manual text
-        from nlp_analyzer import extract_interests_from_text
-        manual_interests = extract_interests_from_text(manual_text)
-        logger.info(f"Manual interests found: {manual_interests}")
-        all_interests = list(set(extracted_interests + manual_interests))
-    else:
-        all_interests = extracted_interests
+    keywords = None
+    if args.keywords_file:
+        keywords = load_keywords(args.keywords_file)
+        logger.info(f"Loaded {len(keywords)} candidate keywords from {args.keywords_file}")
 
-    if not all_interests:
+    cache_dir = os.path.join(PIPELINE_CACHE_DIR, run_key(pipeline_settings(args)))
+    pipeline = Pipeline(cache_dir=cache_dir, resume=args.resume, profiles=profiles)
+
+    def analyze(context):
+        # Analyze the provided folders to extract interests (with optional advanced NLP and date filtering)
+        logger.info("Analyzing folders for interests...")
+        ranked = analyze_folders(args.folders, advanced=args.advanced_nlp, days=args.days,
+                                 keywords=keywords, index_path=None if args.no_index else args.index,
+                                 workers=args.workers, nlp_batch_size=args.nlp_batch_size,
+                                 nlp_processes=args.nlp_processes, half_life_days=args.half_life_days,
+                                 with_scores=True, dedup_threshold=args.dedup_threshold)
+        logger.info(f"Extracted interests: {[interest for interest, _ in ranked]}")
+
+        # If a manual interests file is provided, add its contents
+        if args.manual_interests and os.path.isfile(args.manual_interests):
+            with open(args.manual_interests, "r", encoding="utf-8") as f:
+                manual_text = f.read()
+            # We always use basic extraction for the manual text
+            manual_interests = extract_interests_from_text(manual_text, keywords)
+            logger.info(f"Manual interests found: {manual_interests}")
+            # Interests listed by hand rank with the top extracted one
+            manual = set(manual_interests)
+            ranked = [(interest, 1.0) for interest in sorted(manual)] + \
+                     [(interest, weight) for interest, weight in ranked if interest not in manual]
+        return ranked
+
+    pipeline.add("analyze", analyze)
+    try:
+        ranked = pipeline.run(["analyze"])["analyze"]
+    except PipelineError as e:
+        logger.error(f"{e}. Run again with --resume to continue from the completed stages.")
+        return 1
+
+    if not ranked:
         logger.warning("No interests were extracted. Please check your input folders or provide a manual interests file.")
         return
+    if not fetch:
+        for interest, weight in ranked:
+            print(f"{interest}\t{weight:.3f}")
+        return
+    all_interests, github_limits, arxiv_limits = plan_fetch(ranked, args.max_interests, args.max_requests)
+    if not all_interests:
+        logger.warning("The fetch budget leaves no interests to fetch; raise --max_interests or --max_requests.")
+        return
+
+    if args.offline and args.no_cache:
+        logger.error("--offline needs the HTTP cache; remove --no_cache.")
+        return
+    from http_cache import DEFAULT_CACHE_PATH, HTTPCache
+
+    cache = HTTPCache(None if args.no_cache else args.cache or DEFAULT_CACHE_PATH, max_bytes=args.cache_max_mb * 1024 * 1024,
+                      offline=args.offline)
+    download_pdfs = args.download_pdfs
+    if args.offline and download_pdfs:
+        logger.warning("PDF downloads are skipped in offline mode.")
+        download_pdfs = False
+
+    use_relevance = not args.no_relevance
+
+    store = None if args.no_metadata_store else MetadataStore(args.metadata_store)
+    # Fetch windows start here, so items pushed or published during the run are not missed
+    started = datetime.utcnow().replace(microsecond=0)
+    run_id = None
+    if store is not None:
+        run_id = store.start_run(started, pipeline_settings(args))
+        store.record_interests(ranked, run_id)
+
+    def fetch_windows(source):
+        # Rounded down to the day, so the queries stay the same (and cached, and
+        # replayable offline) for a day; items fetched again are deduplicated by upsert
+        if store is None or args.full_fetch:
+            return None
+        since = {interest: datetime.combine(fetched_at.date(), datetime.min.time())
+                 for interest, fetched_at in store.last_fetched(source, all_interests).items()}
+        if since:
+            logger.info(f"Only fetching {source} items newer than the last fetch for {len(since)} interests.")
+        return since
+
+    def save_fetch(source, dataset, results, failed):
+        # Stored before the interests are marked, so a failure leaves them to be fetched again
+        if store is None:
+            return
+        store.upsert(dataset, results, run_id)
+        if not args.offline:
+            store.mark_fetched(source, [interest for interest in all_interests if interest not in failed], started)
+
+    def relevance(context):
+        from relevance import RELEVANCE_INDEX_PATH, load_relevance_index
+
+        # Vectorize the documents, or reuse the saved vectors if the files did not change
+        load_relevance_index(args.folders, RELEVANCE_INDEX_PATH, days=args.days)
+        return RELEVANCE_INDEX_PATH
+
+    @lru_cache(maxsize=None)
+    def relevance_index(path):
+        from relevance import RelevanceIndex
+
+        return RelevanceIndex.load(path)
+
+    def by_relevance(context, name):
+        # Most relevant results first, in API order when relevance ranking is off
+        from relevance import rank_by_relevance
+
+        results = context.inputs[name]
+        if "relevance" in context.inputs:
+            results = rank_by_relevance(relevance_index(context.inputs["relevance"]), results)
+        return results
+
+    def github(context):
+        from github_fetcher import fetch_github_repos
+
+        # Fetch GitHub repositories for the interests (with optional days filter)
+        logger.info("Fetching GitHub repositories...")
+        failed = set()
+        github_results = fetch_github_repos(all_interests, max_results_per_interest=github_limits, days=args.days,
+                                            max_workers=args.fetch_workers, cache=cache,
+                                            since=fetch_windows("github"), failed=failed)
+        logger.info(f"Fetched {len(github_results)} repositories from GitHub.")
+        save_fetch("github", "github_repos", github_results, failed)
+        return github_results
+
+    def store_repos(context):
+        # Save GitHub repos to the result store
+        repos = by_relevance(context, "github")
+        if store is not None and "relevance" in context.inputs:
+            # The github stage stored the repositories already
+            store.set_relevance("github_repos", repos)
+        repos_path = write_results(repos, "github_repos", fmt=args.store_format)
+        logger.info(f"GitHub repository data saved to {repos_path}")
+        if args.excel:
+            write_results(repos, "github_repos", fmt="excel")
+        return repos_path
+
+    def arxiv(context):
+        from papers_fetcher import iter_papers
+
+        # Fetch research papers from arXiv for the interests (with optional days filter)
+        logger.info("Fetching research papers from arXiv...")
+        papers = []
+        failed = set()
+        for paper in iter_papers(all_interests, max_results_per_interest=arxiv_limits, days=args.days,
+                                 cache=cache, since=fetch_windows("arxiv"), failed=failed):
+            papers.append(paper)
+            context.emit(paper)
+        logger.info(f"Fetched {len(papers)} research papers from arXiv.")
+        save_fetch("arxiv", "arxiv_papers", papers, failed)
+        return papers
+
+    def downloads(context):
+        from pdf_downloader import PDFDownloader
+
+        # Downloads start while the remaining feeds are still being fetched
+        downloader = PDFDownloader("papers", max_workers=args.download_workers)
+        if args.download_top_k is None:
+            papers = context.stream()
+        else:
+            papers = by_relevance(context, "arxiv")[:args.download_top_k]
+            logger.info(f"Downloading the PDFs of the {len(papers)} most relevant papers.")
+        try:
+            for paper in papers:
+                downloader.submit(paper["pdf_url"], paper["title"])
+        finally:
+            paths = downloader.close()
+        return paths
+
+    def store_papers(context):
+        # Save arXiv papers metadata to the result store (for use with the paper summarizer)
+        papers = by_relevance(context, "arxiv")
+        if store is not None and "relevance" in context.inputs:
+            # The arxiv stage stored the papers already
+            store.set_relevance("arxiv_papers", papers)
+        papers_path = write_results(papers, "arxiv_papers", fmt=args.store_format)
+        logger.info(f"arXiv papers metadata saved to {papers_path}")
+        if args.excel:
+            write_results(papers, "arxiv_papers", fmt="excel")
+        return papers_path
 
-    # Fetch GitHub repositories for the interests (with optional days filter)
-    logger.info("Fetching GitHub repositories...")
-    github_results = fetch_github_repos(all_interests, max_results_per_interest=5, days=args.days)
-    logger.info(f"Fetched {len(github_results)} repositories from GitHub.")
-
-    # Save GitHub repos to an Excel file
-    excel_path = os.path.join("output", "github_repos.xlsx")
-    df = pd.DataFrame(github_results)
-    df.to_excel(excel_path, index=False)
-    logger.info(f"GitHub repository data saved to {excel_path}")
-
-    # Fetch research papers from arXiv for the interests (with optional days filter)
-    logger.info("Fetching research papers from arXiv...")
-    papers = fetch_papers(all_interests, max_results_per_interest=3,
-                           download_pdfs=args.download_pdfs, output_dir="papers", days=args.days)
-    logger.info(f"Fetched {len(papers)} research papers from arXiv.")
-
-    # Save arXiv papers metadata to an Excel file (for use with the paper summarizer)
-    arxiv_excel_path = os.path.join("output", "arxiv_papers.xlsx")
-    df_papers = pd.DataFrame(papers)
-    df_papers.to_excel(arxiv_excel_path, index=False)
-    logger.info(f"arXiv papers metadata saved to {arxiv_excel_path}")
+    ranking = ["relevance"] if use_relevance else []
+    if use_relevance:
+        pipeline.add("relevance", relevance)
+    pipeline.add("github", github, deps=["analyze"])
+    pipeline.add("store_repos", store_repos, deps=["github"] + ranking)
+    pipeline.add("arxiv", arxiv, deps=["analyze"], streams=True)
+    pipeline.add("store_papers", store_papers, deps=["arxiv"] + ranking)
+    if download_pdfs and args.download_top_k is not None:
+        pipeline.add("downloads", downloads, deps=["arxiv"] + ranking)
+    elif download_pdfs:
+        pipeline.add("downloads", downloads, deps=["analyze"], stream_from="arxiv")
+    try:
+        pipeline.run()
+    except PipelineError as e:
+        logger.error(f"{e}. Run again with --resume to continue from the completed stages.")
+        if store is not None:
+            store.finish_run(run_id, "failed")
+        return 1
+    if store is not None:
+        store.finish_run(run_id)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,322 @@
+"""
+Metadata Store Module
+
+This module keeps every repository and paper fetched by main.py (and the watcher) in
+one SQLite file, output/metadata.sqlite, together with the ranked interests and the
+history of runs, so each run builds on what earlier runs already saw:
+
+  - repos and papers hold one row per (interest, item), upserted on every fetch: an
+    item fetched again is updated in place and keeps the run it was first seen in.
+    They are indexed on the repository name, the arXiv id, the push/publication date
+    and the relevance (the primary keys start with the interest, so they serve lookups
+    by interest as well).
+  - interests records the latest weight of each interest and when its GitHub and arXiv
+    results were last fetched successfully. The fetchers only ask for items newer than
+    that day (a "pushed:>=" qualifier on GitHub, a submittedDate range on arXiv).
+  - runs records when each run started and finished, its status and its settings.
+
+web_app and paper_summarizer read sorted, filtered and paged slices of the tables
+through read(), instead of loading whole result files. snapshot() copies one table into
+an in-memory store, so a series of reads sees a single version of it.
+
+Dates are stored as ISO 8601 UTC strings ("2024-01-31T12:00:00Z"), which sort
+chronologically as text.
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+
+from result_store import SCHEMAS, apply_schema
+from utils import safe_mkdir
+
+logger = logging.getLogger(__name__)
+
+METADATA_STORE_PATH = os.path.join("output", "metadata.sqlite")
+SOURCES = ("github", "arxiv")
+
+# Dataset name (see result_store.SCHEMAS) -> table, key column and date column
+TABLES = {
+    "github_repos": ("repos", "name", "last_pushed"),
+    "arxiv_papers": ("papers", "arxiv_id", "published"),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    interest TEXT NOT NULL, name TEXT NOT NULL, html_url TEXT, description TEXT, language TEXT,
+    last_pushed TEXT, relevance REAL, first_run INTEGER, last_run INTEGER,
+    PRIMARY KEY (interest, name));
+CREATE INDEX IF NOT EXISTS repos_name ON repos (name);
+CREATE INDEX IF NOT EXISTS repos_last_pushed ON repos (last_pushed);
+CREATE INDEX IF NOT EXISTS repos_relevance ON repos (relevance);
+CREATE TABLE IF NOT EXISTS papers (
+    interest TEXT NOT NULL, arxiv_id TEXT NOT NULL, title TEXT, published TEXT, summary TEXT,
+    pdf_url TEXT, relevance REAL, first_run INTEGER, last_run INTEGER,
+    PRIMARY KEY (interest, arxiv_id));
+CREATE INDEX IF NOT EXISTS papers_arxiv_id ON papers (arxiv_id);
+CREATE INDEX IF NOT EXISTS papers_published ON papers (published);
+CREATE INDEX IF NOT EXISTS papers_relevance ON papers (relevance);
+CREATE TABLE IF NOT EXISTS interests (
+    interest TEXT PRIMARY KEY, weight REAL, ranked_run INTEGER,
+    github_fetched_at TEXT, arxiv_fetched_at TEXT);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, started_at TEXT, finished_at TEXT, status TEXT,
+    settings TEXT, repos INTEGER, papers INTEGER);
+"""
+
+_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def to_iso(value):
+    """
+    Return a date as an ISO 8601 UTC string, or None. Accepts datetimes (naive ones are
+    taken as UTC), pandas Timestamps and strings such as the APIs return.
+    """
+    if value is None or value != value:
+        return None
+    if isinstance(value, str):
+        if not value:
+            return None
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime(_TIME_FORMAT)
+
+
+def from_iso(text):
+    """Parse a stored date into a naive UTC datetime."""
+    return datetime.strptime(text, _TIME_FORMAT)
+
+
+class MetadataStore:
+    """
+    SQLite store of fetched repositories and papers, interests and runs.
+
+    Parameters:
+      - path (str): Database file, or None for an in-memory store that lasts one run.
+    """
+
+    def __init__(self, path=METADATA_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                safe_mkdir(directory)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def start_run(self, started_at, settings=None):
+        """Record the start of a run and return its id."""
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO runs (started_at, status, settings) VALUES (?, 'running', ?)",
+                (to_iso(started_at), json.dumps(settings, sort_keys=True, default=str)))
+            self._db.commit()
+        return cursor.lastrowid
+
+    def finish_run(self, run_id, status="ok"):
+        """Record the end of a run with the number of repositories and papers it stored."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE runs SET finished_at = ?, status = ?,"
+                " repos = (SELECT COUNT(*) FROM repos WHERE last_run = ?),"
+                " papers = (SELECT COUNT(*) FROM papers WHERE last_run = ?) WHERE id = ?",
+                (to_iso(datetime.utcnow()), status, run_id, run_id, run_id))
+            self._db.commit()
+
+    def runs(self, limit=10):
+        """Return the latest runs as dictionaries, newest first."""
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,))
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def record_interests(self, ranked, run_id=None):
+        """Save the (interest, weight) pairs of a run's ranking."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO interests (interest, weight, ranked_run) VALUES (?, ?, ?)"
+                " ON CONFLICT (interest) DO UPDATE SET weight = excluded.weight, ranked_run = excluded.ranked_run",
+                [(interest, weight, run_id) for interest, weight in ranked])
+            self._db.commit()
+
+    def last_fetched(self, source, interests):
+        """
+        Return {interest: naive UTC datetime} of the last successful fetch from source
+        ("github" or "arxiv") for the interests that have one.
+        """
+        column = _fetched_column(source)
+        with self._lock:
+            rows = self._db.execute(f"SELECT interest, {column} FROM interests WHERE {column} IS NOT NULL").fetchall()
+        wanted = set(interests)
+        return {interest: from_iso(fetched_at) for interest, fetched_at in rows if interest in wanted}
+
+    def mark_fetched(self, source, interests, fetched_at):
+        """
+        Record that the interests were fetched successfully from source. fetched_at should
+        be when the fetch started, so items pushed or published during it are asked for
+        again next time rather than missed.
+        """
+        column = _fetched_column(source)
+        with self._lock:
+            self._db.executemany(
+                f"INSERT INTO interests (interest, {column}) VALUES (?, ?)"
+                f" ON CONFLICT (interest) DO UPDATE SET {column} = excluded.{column}",
+                [(interest, to_iso(fetched_at)) for interest in interests])
+            self._db.commit()
+
+    def upsert(self, dataset, records, run_id=None):
+        """
+        Insert or update fetched items.
+
+        Parameters:
+          - dataset (str): "github_repos" or "arxiv_papers".
+          - records (list): Result dictionaries, e.g. from fetch_github_repos. Records
+            without an interest or key are skipped; a missing relevance keeps the
+            stored one.
+          - run_id (int): (Optional) Run the items were fetched in.
+
+        Returns the number of records stored.
+        """
+        table, key, date_column = TABLES[dataset]
+        columns = list(SCHEMAS[dataset])
+        rows = []
+        for record in records:
+            if not record.get("interest") or not record.get(key):
+                continue
+            row = [record.get(column) for column in columns]
+            row[columns.index(date_column)] = to_iso(record.get(date_column))
+            relevance = record.get("relevance")
+            row[columns.index("relevance")] = None if relevance is None or relevance != relevance else float(relevance)
+            rows.append(row + [run_id, run_id])
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns
+                            if column not in ("interest", key, "relevance"))
+        with self._lock:
+            self._db.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}, first_run, last_run)"
+                f" VALUES ({', '.join('?' * (len(columns) + 2))})"
+                f" ON CONFLICT (interest, {key}) DO UPDATE SET {updates},"
+                f" relevance = COALESCE(excluded.relevance, {table}.relevance), last_run = excluded.last_run",
+                rows)
+            self._db.commit()
+        return len(rows)
+
+    def snapshot(self, dataset):
+        """
+        Return an in-memory MetadataStore holding a copy of a dataset's table as it is now,
+        with the same indexes. Rows keep their relative order, and writes to this store
+        after the call do not show in the copy.
+        """
+        table, _, _ = TABLES[dataset]
+        copy = MetadataStore(None)
+        with self._lock:
+            if self.path:
+                # A single INSERT ... SELECT reads one consistent version of the table
+                copy._db.execute("ATTACH DATABASE ? AS source", (self.path,))
+                copy._db.execute(f"INSERT INTO main.{table} SELECT * FROM source.{table} ORDER BY rowid")
+                copy._db.commit()
+                copy._db.execute("DETACH DATABASE source")
+            else:
+                self._db.backup(copy._db)
+        return copy
+
+    def set_relevance(self, dataset, records):
+        """
+        Update the relevance of stored items, e.g. once the fetched ones were ranked, and
+        leave their other columns alone. Records without a relevance are skipped.
+
+        Returns the number of records whose relevance was given.
+        """
+        table, key, _ = TABLES[dataset]
+        rows = [(float(record["relevance"]), record.get("interest"), record.get(key)) for record in records
+                if record.get("relevance") is not None and record["relevance"] == record["relevance"]]
+        with self._lock:
+            self._db.executemany(f"UPDATE {table} SET relevance = ? WHERE interest = ? AND {key} = ?", rows)
+            self._db.commit()
+        return len(rows)
+
+    def last_run_id(self):
+        """Id of the latest run that finished successfully, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT MAX(id) FROM runs WHERE status = 'ok'").fetchone()
+        return row[0]
+
+    def _where(self, dataset, interest, since, run=None):
+        _, _, date_column = TABLES[dataset]
+        clauses = []
+        params = []
+        if run is not None:
+            clauses.append("last_run = ?")
+            params.append(run)
+        if interest is not None:
+            clauses.append("interest = ?")
+            params.append(interest)
+        if since is not None:
+            clauses.append(f"{date_column} >= ?")
+            params.append(to_iso(since))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count(self, dataset, interest=None, since=None, run=None):
+        """
+        Number of stored items, optionally of one interest, dated since a datetime and
+        last fetched in a run.
+        """
+        table, _, _ = TABLES[dataset]
+        where, params = self._where(dataset, interest, since, run)
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+
+    def read(self, dataset, columns=None, interest=None, since=None, run=None, sort=None, descending=False,
+             limit=None, offset=0):
+        """
+        Read a slice of a dataset.
+
+        Parameters:
+          - dataset (str): "github_repos" or "arxiv_papers".
+          - columns (list): (Optional) Columns to return; all schema columns by default.
+          - interest (str): (Optional) Only items fetched for this interest.
+          - since (datetime or str): (Optional) Only items pushed or published since then.
+          - run (int): (Optional) Only items last fetched in this run.
+          - sort (str): (Optional) Schema column to order by; empty values come last.
+            Items keep the order they were first stored in otherwise.
+          - descending (bool): Sort in descending order.
+          - limit (int), offset (int): (Optional) Page of the ordered items to return.
+
+        Returns a DataFrame typed like the result_store datasets.
+        """
+        import pandas as pd
+
+        table, _, _ = TABLES[dataset]
+        schema = list(SCHEMAS[dataset])
+        columns = list(columns or schema)
+        selected = [column for column in columns if column in schema]
+        if sort is not None and sort not in schema:
+            raise ValueError(f"Unknown column to sort {dataset} by: {sort}")
+        where, params = self._where(dataset, interest, since, run)
+        order = f"{sort} {'DESC' if descending else 'ASC'} NULLS LAST, rowid" if sort else "rowid"
+        query = f"SELECT {', '.join(selected) or 'rowid'} FROM {table}{where} ORDER BY {order}"
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params += [-1 if limit is None else limit, offset]
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        df = pd.DataFrame(rows, columns=selected or ["rowid"]).reindex(columns=columns)
+        return apply_schema(df, dataset, columns)
+
+
+def _fetched_column(source):
+    if source not in SOURCES:
+        raise ValueError(f"Unknown source: {source}")
+    return f"{source}_fetched_at"
@@ -13,13 +13,24 @@ Candidate keywords (in lowercase) include:
     named entity recognition, summarization, and many more.
 """
 
-import os
 import re
-import logging
+import math
 import time
+import logging
+import hashlib
+from collections import Counter
+from functools import lru_cache
+
+from corpus_index import CorpusIndex
+from dedup import DEFAULT_DEDUP_THRESHOLD, SignedExtractor, find_duplicates
+from source_adapters import iter_document_texts
+from utils import DEFAULT_CHUNK_SIZE
 
 logger = logging.getLogger(__name__)
 
+# Files this many days old count half as much when ranking interests
+DEFAULT_HALF_LIFE_DAYS = 90
+
 # Pre-defined candidate keywords (in lowercase)
 CANDIDATE_KEYWORDS = [
     "machine learning", "deep learning", "neural network", "transformer", "attention",
@@ -36,57 +47,326 @@ CANDIDATE_KEYWORDS = [
 ]
 
 
-def extract_interests_from_text(text):
+_WORD_CHAR = re.compile(r"\w")
+
+
+def _is_word_boundary(text, i):
+    """Return True if regex \\b would match between text[i - 1] and text[i]."""
+    before = _WORD_CHAR.match(text[i - 1]) is not None
+    after = _WORD_CHAR.match(text[i]) is not None
+    return before != after
+
+
+def _trie_pattern(node):
     """
-    Given a text string, searches for candidate keywords using regex and returns a list of matches.
+    Render a character trie (nested dicts, "" marks the end of a keyword) as a regex
+    fragment. Shared prefixes are factored out so the regex engine walks the trie instead
+    of trying every keyword at every position.
     """
-    found_keywords = set()
-    lower_text = text.lower()
-    for keyword in CANDIDATE_KEYWORDS:
-        pattern = r"\b" + re.escape(keyword) + r"\b"
-        if re.search(pattern, lower_text):
-            found_keywords.add(keyword)
-    return list(found_keywords)
+    terminal = "" in node
+    branches = [re.escape(char) + _trie_pattern(child)
+                for char, child in sorted(node.items()) if char != ""]
+    if not branches:
+        return ""
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+    body = "(?:" + "|".join(branches) + ")"
+    return body + "?" if terminal else body
 
 
-def analyze_folders(folders, advanced=False, days=None):
+class KeywordMatcher:
     """
-    Analyze all text files (.txt and .md) in the provided folder paths.
+    Compiled matcher that finds every keyword of a vocabulary in a single pass over a text.
+
+    The vocabulary is compiled once into a trie-shaped regex anchored on word boundaries,
+    so each position of the text is tested against the trie rather than against every
+    keyword separately. Matching is done inside a lookahead, which means keywords that
+    overlap ("entity recognition" inside "named entity recognition") are all reported,
+    exactly as a separate word-boundary search per keyword would report them.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = sorted({k.strip().lower() for k in keywords if k and k.strip()})
+        self.max_length = max((len(k) for k in self.keywords), default=0)
+
+        trie = {}
+        for keyword in self.keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = True
+        if self.keywords:
+            self._pattern = re.compile(r"\b(?=(" + _trie_pattern(trie) + r")\b)")
+        else:
+            self._pattern = None
+
+        # A match only reports the longest keyword starting at a position. Any shorter
+        # keyword that is a word-bounded prefix of it occurs at the same place, so the
+        # prefixes are resolved here once instead of at match time.
+        vocabulary = set(self.keywords)
+        self._implied = {}
+        for keyword in self.keywords:
+            self._implied[keyword] = [keyword] + [
+                keyword[:i] for i in range(1, len(keyword))
+                if keyword[:i] in vocabulary and _is_word_boundary(keyword, i)
+            ]
+
+    def __reduce__(self):
+        # Rebuild through the cache so worker processes compile each vocabulary once.
+        return get_matcher, (tuple(self.keywords),)
+
+    def count(self, text, lowered=False):
+        """
+        Count keyword occurrences in text.
+
+        Parameters:
+          - text (str): The text to scan.
+          - lowered (bool): Set if text is already lowercase, to skip the copy.
+
+        Returns a Counter mapping each keyword found to its number of occurrences.
+        """
+        counts = Counter()
+        if self._pattern is not None:
+            self._count_into(counts, text if lowered else text.lower(), 0, None)
+        return counts
+
+    def find(self, text):
+        """Return the set of keywords that occur in text."""
+        return set(self.count(text))
+
+    def count_chunks(self, chunks):
+        """
+        Count keyword occurrences across a stream of text chunks, such as the pieces
+        of a file read with utils.iter_file_chunks.
+
+        Only the tail of the previous chunk is kept between iterations, so memory is
+        bounded by the chunk size. The tail is long enough that a keyword straddling a
+        chunk boundary is still found, and each match is counted exactly once.
+
+        Returns a Counter mapping each keyword found to its number of occurrences.
+        """
+        counts = Counter()
+        if self._pattern is None:
+            return counts
+        # A match may run max_length characters past its start and needs one more
+        # character of context for its closing word boundary.
+        overlap = self.max_length + 1
+        carry = ""
+        start = 0
+        for chunk in chunks:
+            buffer = carry + chunk.lower()
+            limit = len(buffer) - overlap
+            if limit > start:
+                self._count_into(counts, buffer, start, limit)
+                # Keep one character before the limit as context for the opening \b
+                carry = buffer[limit - 1:]
+                start = 1
+            else:
+                carry = buffer
+        if carry:
+            self._count_into(counts, carry, start, None)
+        return counts
+
+    def _count_into(self, counts, text, start, limit):
+        """Add matches starting in text[start:limit] to counts."""
+        implied = self._implied
+        for match in self._pattern.finditer(text, start):
+            if limit is not None and match.start() >= limit:
+                break
+            for keyword in implied[match.group(1)]:
+                counts[keyword] += 1
+
+
+@lru_cache(maxsize=8)
+def get_matcher(keywords=None):
+    """
+    Return a compiled KeywordMatcher for a vocabulary, reusing a cached one when possible.
+
+    Parameters:
+      - keywords (tuple): Keywords to match. Defaults to CANDIDATE_KEYWORDS.
+    """
+    return KeywordMatcher(CANDIDATE_KEYWORDS if keywords is None else keywords)
+
+
+def load_keywords(path):
+    """
+    Load a keyword vocabulary from a text file with one keyword per line.
+    Blank lines and lines starting with '#' are ignored.
+    """
+    keywords = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                keywords.append(line.lower())
+    return keywords
+
+
+def count_interests_in_text(text, keywords=None):
+    """
+    Count how often each candidate keyword occurs in a text string.
+
+    Parameters:
+      - text (str): The text to scan.
+      - keywords (list): (Optional) Vocabulary to use instead of CANDIDATE_KEYWORDS.
+
+    Returns a Counter of keyword -> number of occurrences.
+    """
+    return get_matcher(None if keywords is None else tuple(keywords)).count(text)
+
+
+def extract_interests_from_text(text, keywords=None):
+    """
+    Given a text string, searches for candidate keywords in a single pass and returns a list of matches.
+    """
+    return list(count_interests_in_text(text, keywords))
+
+
+class KeywordExtractor:
+    """
+    Corpus index extractor that stores the keyword counts of each file under "topics".
+
+    Parameters:
+      - keywords (list): (Optional) Vocabulary to use instead of CANDIDATE_KEYWORDS.
+    """
+
+    name = "topics"
+
+    def __init__(self, keywords=None):
+        self.keywords = tuple(get_matcher(None if keywords is None else tuple(keywords)).keywords)
+        self.fingerprint = hashlib.sha1("\n".join(self.keywords).encode("utf-8")).hexdigest()
+
+    def __call__(self, chunks):
+        return dict(get_matcher(self.keywords).count_chunks(chunks))
+
+
+def scan_folders(folders, days=None, keywords=None, chunk_size=DEFAULT_CHUNK_SIZE, index_path=None, workers=1,
+                 dedup_threshold=DEFAULT_DEDUP_THRESHOLD):
+    """
+    Extract the keyword counts of every document in the folders: each text file, and
+    each conversation of a ChatGPT export (see source_adapters).
+
+    Parameters:
+      - days (int): If provided, only include files modified in the last 'days' days.
+      - keywords (list): (Optional) Vocabulary to use instead of CANDIDATE_KEYWORDS.
+      - chunk_size (int): Number of bytes read from a file at a time.
+      - index_path (str): (Optional) Corpus index file. When given, only new or changed
+        files are read and the rest are served from the index.
+      - workers (int): Number of processes used to read and extract files.
+      - dedup_threshold (float): Leave out documents that are exact copies or near-copies
+        (at least this similar) of an earlier document, see dedup.py. The signatures are
+        computed in the same read as the keyword counts and stored with them in the
+        corpus index. None or 0 keeps every document.
+
+    Returns a list of (path, entry) tuples, where entry["topics"] maps keyword -> count
+    and entry["mtime"] is the file's modification time (a conversation's own update time).
+    """
+    extractor = KeywordExtractor(keywords)
+    if not dedup_threshold:
+        return CorpusIndex(index_path, extractor).scan(folders, days=days, chunk_size=chunk_size, workers=workers)
+    index = CorpusIndex(index_path, SignedExtractor(extractor))
+    records = index.scan(folders, days=days, chunk_size=chunk_size, workers=workers)
+    duplicates = find_duplicates(records, dedup_threshold)
+    if duplicates:
+        logger.info(f"Skipping {len(duplicates)} duplicate documents out of {len(records)}.")
+    return [(path, entry) for path, entry in records if path not in duplicates]
+
+
+def analyze_folders(folders, advanced=False, days=None, keywords=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                    index_path=None, workers=1, nlp_batch_size=64, nlp_processes=1,
+                    half_life_days=DEFAULT_HALF_LIFE_DAYS, with_scores=False, dedup_threshold=DEFAULT_DEDUP_THRESHOLD):
+    """
+    Analyze all text files (.txt and .md) and ChatGPT exports (conversations.json) in the
+    provided folder paths.
+
+    Files are streamed in chunks and matched one at a time, and the per-file counts are
+    merged as they come in, so memory use is bounded by the chunk size rather than by
+    the size of the corpus. Exports are parsed one conversation at a time. In advanced
+    mode texts are streamed to spaCy one chunk or conversation at a time.
     
     Parameters:
       - advanced (bool): If True, use advanced NLP extraction via spaCy.
       - days (int): If provided, only include files modified in the last 'days' days.
+      - keywords (list): (Optional) Vocabulary to use instead of CANDIDATE_KEYWORDS.
+      - chunk_size (int): Number of characters read from a file at a time.
+      - index_path (str): (Optional) Corpus index file used to skip unchanged files.
+      - workers (int): Number of processes used for basic extraction.
+      - nlp_batch_size (int): Documents per spaCy batch in advanced mode.
+      - nlp_processes (int): Number of spaCy processes in advanced mode.
+      - half_life_days (float): Half-life of the recency decay used to rank interests
+        (see rank_interests). None or 0 disables the decay.
+      - with_scores (bool): Return (keyword, score) pairs instead of keywords.
+      - dedup_threshold (float): Count copies and near-copies of a document once (see
+        scan_folders). Advanced mode returns a set of keywords, which copies do not change.
       
-    Returns a deduplicated list of interest keywords found across all files.
-    """
-    aggregated_text = ""
-    now = time.time()
-    for folder in folders:
-        if not os.path.isdir(folder):
-            logger.warning(f"Folder not found: {folder}")
-            continue
-
-        for root, dirs, files in os.walk(folder):
-            for file in files:
-                if file.endswith(".txt") or file.endswith(".md"):
-                    file_path = os.path.join(folder, file)
-                    # If days is specified, only include files modified within that range
-                    if days:
-                        mod_time = os.path.getmtime(file_path)
-                        if (now - mod_time) > days * 86400:
-                            continue
-                    try:
-                        with open(file_path, "r", encoding="utf-8") as f:
-                            content = f.read()
-                        aggregated_text += "\n" + content
-                    except Exception as e:
-                        logger.error(f"Error reading {file_path}: {e}")
-
+    Returns a deduplicated list of interest keywords found across all files, highest
+    ranked first. Advanced mode does not weight keywords; they all score 1.0.
+    """
     if advanced:
         try:
             from advanced_nlp import extract_keywords_advanced
             logger.info("Using advanced NLP extraction via spaCy...")
-            return extract_keywords_advanced(aggregated_text, CANDIDATE_KEYWORDS)
+            texts = iter_document_texts(folders, days, chunk_size)
+            found = sorted(extract_keywords_advanced(texts, keywords or CANDIDATE_KEYWORDS,
+                                                     batch_size=nlp_batch_size, n_process=nlp_processes))
+            return [(keyword, 1.0) for keyword in found] if with_scores else found
         except Exception as e:
             logger.error("Advanced NLP extraction failed, falling back to basic extraction: " + str(e))
-    return extract_interests_from_text(aggregated_text)
+    records = scan_folders(folders, days=days, keywords=keywords, chunk_size=chunk_size,
+                           index_path=index_path, workers=workers, dedup_threshold=dedup_threshold)
+    ranked = rank_interests(records, half_life_days=half_life_days)
+    return ranked if with_scores else [keyword for keyword, _ in ranked]
+
+
+def rank_interests(records, half_life_days=DEFAULT_HALF_LIFE_DAYS, now=None):
+    """
+    Score keywords by how much and how recently they were written about.
+
+    Each file contributes (1 + log tf) for every keyword it contains, scaled by a
+    recency decay of 0.5 ** (age in days / half_life_days) from its modification time.
+    The sums are multiplied by a smoothed inverse document frequency,
+    log((1 + files) / (1 + files containing the keyword)) + 1, so a keyword that
+    appears a little in every file does not outrank one that dominates some of them.
+
+    Parameters:
+      - records (list): (path, entry) tuples from scan_folders.
+      - half_life_days (float): Age at which a file counts half. None or 0 disables decay.
+      - now (float): (Optional) Reference epoch time, defaults to the current time.
+
+    Returns a list of (keyword, score) sorted by descending score, with scores scaled so
+    the top keyword has 1.0.
+    """
+    now = time.time() if now is None else now
+    doc_freq = Counter()
+    weighted = Counter()
+    for _, entry in records:
+        decay = 1.0
+        if half_life_days:
+            age_days = max(0.0, now - entry["mtime"]) / 86400
+            decay = 0.5 ** (age_days / half_life_days)
+        for keyword, count in entry["topics"].items():
+            doc_freq[keyword] += 1
+            weighted[keyword] += (1 + math.log(count)) * decay
+
+    n_docs = len(records)
+    scores = {keyword: weight * (math.log((1 + n_docs) / (1 + doc_freq[keyword])) + 1)
+              for keyword, weight in weighted.items()}
+    top = max(scores.values(), default=0.0) or 1.0
+    return sorted(((keyword, score / top) for keyword, score in scores.items()),
+                  key=lambda item: (-item[1], item[0]))
+
+
+def count_folder_interests(folders, days=None, keywords=None, chunk_size=DEFAULT_CHUNK_SIZE, index_path=None,
+                           workers=1):
+    """
+    Stream every text file in the folders through the keyword matcher.
+
+    Parameters are the same as for scan_folders.
+
+    Returns a Counter of keyword -> number of occurrences across all files.
+    """
+    totals = Counter()
+    for _, entry in scan_folders(folders, days=days, keywords=keywords, chunk_size=chunk_size,
+                                 index_path=index_path, workers=workers):
+        totals.update(entry["topics"])
+    return totals
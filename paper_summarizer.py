@@ -1,56 +1,232 @@
 #!/usr/bin/env python
 import argparse
 import os
+import json
+import hashlib
 import logging
-import pandas as pd
-
-from transformers import pipeline
+from metadata_store import METADATA_STORE_PATH, MetadataStore
+from result_store import read_results, read_results_file
+from utils import safe_mkdir
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def summarize_papers(metadata_file, output_file):
-    if not os.path.exists(metadata_file):
+# Default model of the transformers "summarization" pipeline, named explicitly so it is
+# part of the cache key
+DEFAULT_MODEL = "sshleifer/distilbart-cnn-12-6"
+SUMMARY_CACHE_PATH = os.path.join("output", "summary_cache.json")
+DEFAULT_BATCH_SIZE = 8
+# Papers summarized (in length-sorted batches) before their part of the report is written
+REPORT_BLOCK_SIZE = 64
+
+def _cache_key(model, text):
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+def _load_cache(cache_path):
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable summary cache {cache_path}: {e}")
+    return {}
+
+def _save_cache(cache, cache_path):
+    if not cache_path:
+        return
+    directory = os.path.dirname(cache_path)
+    if directory:
+        safe_mkdir(directory)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, cache_path)
+
+def _load_summarizer(model, threads=None):
+    # Imported here so runs that are fully served from the cache never load torch
+    import torch
+    from transformers import pipeline
+
+    if threads:
+        torch.set_num_threads(threads)
+    return pipeline("summarization", model=model)
+
+def _summarize_texts(summarizer, texts, batch_size):
+    """
+    Summarize texts in batches of similar length, so little of each batch is padding.
+    Inputs longer than the model accepts are truncated. Returns summaries in input order,
+    with None for texts that could not be summarized.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    results = [None] * len(texts)
+    options = {"max_length": 130, "min_length": 30, "do_sample": False, "truncation": True}
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        try:
+            outputs = summarizer([texts[i] for i in batch], batch_size=len(batch), **options)
+        except Exception as e:
+            # Retry one by one so a single bad input does not lose the whole batch
+            logger.warning(f"Batch summarization failed ({e}), retrying papers individually")
+            outputs = []
+            for i in batch:
+                try:
+                    outputs.append(summarizer(texts[i], **options)[0])
+                except Exception as err:
+                    logger.error(f"Error summarizing paper: {err}")
+                    outputs.append(None)
+        for i, output in zip(batch, outputs):
+            results[i] = output["summary_text"] if output else None
+    return results
+
+def _write_summary(f, title, original_summary, generated_summary):
+    f.write(f"## {title}\n\n")
+    f.write("**Original Summary:**\n\n")
+    f.write(f"{original_summary}\n\n")
+    f.write("**Generated Summary:**\n\n")
+    f.write(f"{generated_summary}\n\n")
+    f.write("---\n\n")
+
+def _most_relevant(df, top_k, folders=None):
+    """
+    Keep the top_k rows of the papers DataFrame, most relevant first. With folders the
+    papers are scored against the relevance index of those folders; otherwise the
+    relevance stored by main.py is used, and papers keep their stored order without it.
+    """
+    if folders:
+        from relevance import load_relevance_index
+
+        index = load_relevance_index(folders)
+        texts = [f"{title}\n{summary}" for title, summary in zip(df["title"].fillna(""), df["summary"].fillna(""))]
+        df = df.assign(relevance=index.score(texts))
+    elif "relevance" not in df.columns or df["relevance"].isna().all():
+        logger.warning("The papers have no relevance scores; summarizing the first ones. Pass --folders to rank them.")
+        return df.head(top_k)
+    return df.sort_values("relevance", ascending=False, kind="stable", na_position="last").head(top_k)
+
+def _read_store(store_path, columns, top_k, folders, interest, since, all_papers):
+    """
+    Read the papers from the metadata store, letting it pick the top_k by stored relevance.
+    Without since or all_papers, only the papers fetched by the latest successful run are
+    read, i.e. the ones found in its fetch windows.
+    """
+    store = MetadataStore(store_path)
+    try:
+        run = None
+        if since is None and not all_papers:
+            run = store.last_run_id()
+            if run is not None:
+                logger.info(f"Summarizing the papers fetched by run {run}; pass --all for every stored paper.")
+        by_relevance = top_k is not None and not folders
+        return store.read("arxiv_papers", columns=columns, interest=interest, since=since, run=run,
+                          sort="relevance" if by_relevance else None, descending=True,
+                          limit=top_k if by_relevance else None)
+    finally:
+        store.close()
+
+def summarize_papers(metadata_file, output_file, model=DEFAULT_MODEL, batch_size=DEFAULT_BATCH_SIZE, threads=None,
+                     cache_path=SUMMARY_CACHE_PATH, top_k=None, folders=None, store_path=METADATA_STORE_PATH,
+                     interest=None, since=None, all_papers=False):
+    """
+    Summarize the abstracts listed in the metadata file into a markdown report.
+
+    Abstracts already summarized by the same model are taken from the summary cache; the
+    rest go through the pipeline in length-bucketed batches. The report is written block
+    by block as summaries become available.
+
+    Parameters:
+      - metadata_file (str): arXiv papers metadata file (Parquet, JSON Lines or Excel).
+        If None, the papers are read from the metadata store, or from the "arxiv_papers"
+        dataset of the result store if there is no metadata store.
+      - output_file (str): Markdown file the summaries are written to.
+      - model (str): Hugging Face summarization model.
+      - batch_size (int): Number of abstracts per inference batch.
+      - threads (int): (Optional) Number of CPU threads torch may use.
+      - cache_path (str): (Optional) JSON file caching summaries by abstract and model.
+      - top_k (int): (Optional) Only summarize the this many most relevant papers.
+      - folders (list): (Optional) Rank the papers against the documents of these
+        folders (see relevance.py) instead of by their stored relevance.
+      - store_path (str): Metadata store read when no metadata file is given.
+      - interest (str): (Optional) Only papers fetched for this interest (metadata store only).
+      - since (str): (Optional) Only papers published since this date (metadata store only).
+        Without it, only the papers fetched by the latest run of main.py are read from the
+        metadata store.
+      - all_papers (bool): Read every paper of the metadata store when since is not given.
+    """
+    columns = ["title", "summary", "relevance"]
+    use_store = metadata_file is None and store_path and os.path.exists(store_path)
+    if (interest or since) and not use_store:
+        logger.warning("--interest and --since only apply to papers read from the metadata store; ignoring them.")
+    if use_store:
+        df = _read_store(store_path, columns, top_k, folders, interest, since, all_papers)
+    elif metadata_file is None:
+        df = read_results("arxiv_papers", columns=columns)
+    elif not os.path.exists(metadata_file):
         logger.error(f"Metadata file {metadata_file} not found.")
         return
-    df = pd.read_excel(metadata_file)
+    else:
+        df = read_results_file(metadata_file, name="arxiv_papers", columns=columns)
     if df.empty:
         logger.error("No papers found in the metadata file.")
         return
-    summarizer = pipeline("summarization")
-    summaries = []
-    for idx, row in df.iterrows():
-        title = row.get("title", "No Title")
-        summary_text = row.get("summary", "")
-        if summary_text:
-            try:
-                summarized = summarizer(summary_text, max_length=130, min_length=30, do_sample=False)[0]['summary_text']
-            except Exception as e:
-                logger.error(f"Error summarizing paper '{title}': {e}")
-                summarized = "Summary not available"
-        else:
-            summarized = "No summary provided."
-        summaries.append({"title": title, "original_summary": summary_text, "generated_summary": summarized})
-    
-    # Write summaries to a markdown file
+    if top_k is not None:
+        df = _most_relevant(df, top_k, folders)
+
+    rows = []
+    for title, summary_text in zip(df["title"], df["summary"]):
+        rows.append((title if isinstance(title, str) else "No Title",
+                     summary_text if isinstance(summary_text, str) else ""))
+
+    cache = _load_cache(cache_path)
+    summarizer = None
+    new_summaries = 0
     with open(output_file, "w", encoding="utf-8") as f:
         f.write("# Paper Summaries\n\n")
-        for item in summaries:
-            f.write(f"## {item['title']}\n\n")
-            f.write("**Original Summary:**\n\n")
-            f.write(f"{item['original_summary']}\n\n")
-            f.write("**Generated Summary:**\n\n")
-            f.write(f"{item['generated_summary']}\n\n")
-            f.write("---\n\n")
+        for start in range(0, len(rows), REPORT_BLOCK_SIZE):
+            block = rows[start:start + REPORT_BLOCK_SIZE]
+            pending = sorted({summary_text for _, summary_text in block
+                              if summary_text and _cache_key(model, summary_text) not in cache})
+            if pending:
+                if summarizer is None:
+                    summarizer = _load_summarizer(model, threads)
+                for text, summarized in zip(pending, _summarize_texts(summarizer, pending, batch_size)):
+                    if summarized is not None:
+                        cache[_cache_key(model, text)] = summarized
+                        new_summaries += 1
+                _save_cache(cache, cache_path)
+
+            for title, summary_text in block:
+                if summary_text:
+                    summarized = cache.get(_cache_key(model, summary_text), "Summary not available")
+                else:
+                    summarized = "No summary provided."
+                _write_summary(f, title, summary_text, summarized)
+            f.flush()
+    logger.info(f"Summarized {new_summaries} new papers; {len(rows) - new_summaries} served from cache or skipped.")
     print(f"Paper summaries written to {output_file}")
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Summarize Research Papers from Metadata")
-    parser.add_argument("-m", "--metadata", type=str, default="output/arxiv_papers.xlsx", help="Path to arXiv papers metadata Excel file")
+    parser.add_argument("-m", "--metadata", type=str, default=None, help="Path to an arXiv papers metadata file (default: the stored arxiv_papers results)")
     parser.add_argument("-o", "--output", type=str, default="output/paper_summaries.md", help="Output markdown file for summaries")
-    args = parser.parse_args()
+    parser.add_argument("--model", type=str, default=DEFAULT_MODEL, help="Summarization model")
+    parser.add_argument("--batch_size", type=int, default=DEFAULT_BATCH_SIZE, help="Number of abstracts per inference batch")
+    parser.add_argument("--threads", type=int, default=None, help="Number of CPU threads used by torch")
+    parser.add_argument("--cache", type=str, default=SUMMARY_CACHE_PATH, help="Summary cache file")
+    parser.add_argument("--no_cache", action="store_true", help="Do not read or write the summary cache")
+    parser.add_argument("--top_k", type=int, default=None, help="Only summarize the N most relevant papers")
+    parser.add_argument("-f", "--folders", nargs="+", default=None,
+                        help="Rank the papers against the documents in these folders (with --top_k)")
+    parser.add_argument("--metadata_store", type=str, default=METADATA_STORE_PATH, help="Metadata store read when no metadata file is given")
+    parser.add_argument("--interest", type=str, default=None, help="Only summarize papers fetched for this interest")
+    parser.add_argument("--since", type=str, default=None, help="Only summarize papers published since this date (YYYY-MM-DD)")
+    parser.add_argument("--all", action="store_true",
+                        help="Summarize every stored paper (default without --since: the papers fetched by the latest run)")
+    args = parser.parse_args(argv)
     
-    summarize_papers(args.metadata, args.output)
+    summarize_papers(args.metadata, args.output, model=args.model, batch_size=args.batch_size,
+                     threads=args.threads, cache_path=None if args.no_cache else args.cache,
+                     top_k=args.top_k, folders=args.folders, store_path=args.metadata_store,
+                     interest=args.interest, since=args.since, all_papers=args.all)
 
 if __name__ == "__main__":
     main()
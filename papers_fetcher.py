@@ -3,96 +3,289 @@ Papers Fetcher Module
 
 This module queries the arXiv API to fetch the latest research papers related to a list of interest keywords.
 It supports an optional date filter (only including papers published within the last X days) and can download PDFs.
+
+Several interests are combined into one OR'd query and results are paged through with
+start/max_results. When the page budget runs out before every interest of a batch has
+enough papers (a prolific interest can fill all the pages), the interests still short
+are queried again on their own. Feeds are parsed as they download (the response cache
+keeps a copy of the body and stores it once complete), and the date filter is applied
+by arXiv through a submittedDate range rather than after download. Per-interest "since"
+times narrow that range to papers submitted after the last successful fetch of each
+interest (see metadata_store). Queries go through the shared http_cache, so repeated
+runs are answered locally. The API endpoint can be overridden with the ARXIV_API_URL
+environment variable.
 """
 
 import os
-import requests
+import time
 import logging
+import threading
 import xml.etree.ElementTree as ET
-from urllib.parse import quote
 from datetime import datetime, timedelta
 
+import requests
+
+from http_cache import HTTPCache
+from nlp_analyzer import KeywordMatcher
+from pdf_downloader import DEFAULT_WORKERS as DEFAULT_DOWNLOAD_WORKERS, PDFDownloader, arxiv_id_from_url
+
 logger = logging.getLogger(__name__)
 
-ARXIV_API_URL = "http://export.arxiv.org/api/query?search_query=all:{query}&start=0&max_results={max_results}"
+ARXIV_API_URL = os.environ.get("ARXIV_API_URL", "http://export.arxiv.org/api/query")
+ATOM = "{http://www.w3.org/2005/Atom}"
 
+# arXiv asks API clients to leave 3 seconds between consecutive calls
+REQUEST_SPACING = 3.0
+# Interests OR'd together into one search_query
+DEFAULT_BATCH_SIZE = 5
+# Largest page requested in one call, and how many pages one query may use
+PAGE_SIZE = 100
+MAX_PAGES = 5
+REQUEST_TIMEOUT = 60
 
-def fetch_papers(interests, max_results_per_interest=3, download_pdfs=False, output_dir="papers", days=None):
+
+class RequestSpacer:
     """
-    For each interest, fetch papers from the arXiv API.
-    
+    Enforces a minimum interval between calls to wait(). Slots are handed out under a
+    lock and the sleep happens outside it, so only the threads talking to arXiv wait.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# Shared by every fetch in the process
+_spacer = RequestSpacer(REQUEST_SPACING)
+
+
+def build_search_query(interests, threshold=None, now=None):
+    """
+    Build an arXiv search_query that matches any of the interests, optionally limited
+    to papers submitted after threshold.
+
+    The date range runs from the start of threshold's day to the end of today, so the
+    query text (and with it the response cache key) stays the same for a whole day.
+    """
+    query = " OR ".join(f'all:"{interest}"' for interest in interests)
+    if len(interests) > 1:
+        query = f"({query})"
+    if threshold:
+        end = (now or datetime.utcnow()).date() + timedelta(days=1)
+        query += f" AND submittedDate:[{threshold:%Y%m%d}0000 TO {end:%Y%m%d}0000]"
+    return query
+
+
+def iter_entries(stream):
+    """
+    Incrementally parse an Atom feed from a file-like object and yield each entry as a
+    dict. Parsed entries are cleared so memory does not grow with the feed.
+    """
+    root = None
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+        if elem.tag != ATOM + "entry":
+            continue
+        entry_id = elem.findtext(ATOM + "id", "").strip()
+        pdf_url = None
+        for link in elem.findall(ATOM + "link"):
+            if link.attrib.get("type") == "application/pdf":
+                pdf_url = link.attrib.get("href")
+                break
+        if not pdf_url:
+            pdf_url = f"http://arxiv.org/pdf/{entry_id.split('/')[-1]}.pdf"
+        yield {
+            "id": entry_id,
+            "title": elem.findtext(ATOM + "title", "").strip(),
+            "published": elem.findtext(ATOM + "published", "").strip(),
+            "summary": elem.findtext(ATOM + "summary", "").strip(),
+            "pdf_url": pdf_url,
+        }
+        root.remove(elem)
+
+
+def _match_interests(entry, interests, matcher):
+    """
+    Work out which interests of a batch an entry was returned for. Exact keyword matches
+    in the title and abstract are preferred; otherwise fall back to interests whose words
+    all appear in the text, which tolerates arXiv's stemming (plurals etc.).
+    """
+    text = (entry["title"] + " " + entry["summary"]).lower()
+    found = matcher.find(text)
+    if found:
+        return [interest for interest in interests if interest.lower() in found]
+    return [interest for interest in interests if all(word in text for word in interest.lower().split())]
+
+
+def _fetch_query(session, cache, api_url, query, page_size, interests, candidates, remaining, thresholds, seen):
+    """
+    Yield papers from up to MAX_PAGES pages of one search_query, paging until the
+    interests it was built for have enough or the results run out.
+
+    candidates(entry) returns the interests an entry counts for. remaining (interest ->
+    papers still wanted) and seen ((interest, arXiv id) pairs already yielded) are
+    updated as papers are yielded.
+
+    Returns True if the results ran out before the page budget did.
+    """
+    for page in range(MAX_PAGES):
+        params = {"search_query": query, "start": page * page_size, "max_results": page_size}
+        # Only calls that reach arXiv are spaced; cached pages are served immediately
+        response = cache.get(session, api_url, params=params, source="arxiv", timeout=REQUEST_TIMEOUT,
+                             before_request=_spacer.wait, stream=True)
+        response.raise_for_status()
+
+        count = 0
+        for entry in iter_entries(response.raw):
+            count += 1
+            published_dt = datetime.strptime(entry["published"], "%Y-%m-%dT%H:%M:%SZ")
+            arxiv_id = arxiv_id_from_url(entry["pdf_url"])
+            for interest in candidates(entry):
+                # The query asks for the earliest threshold of its interests; this also
+                # guards against clock skew
+                if thresholds[interest] and published_dt < thresholds[interest]:
+                    continue
+                if remaining[interest] > 0 and (interest, arxiv_id) not in seen:
+                    remaining[interest] -= 1
+                    seen.add((interest, arxiv_id))
+                    yield {
+                        "interest": interest,
+                        "arxiv_id": arxiv_id,
+                        "title": entry["title"],
+                        "published": entry["published"],
+                        "summary": entry["summary"],
+                        "pdf_url": entry["pdf_url"]
+                    }
+        if count < page_size:
+            return True
+        if not any(remaining[interest] for interest in interests):
+            return False
+    return False
+
+
+def _fetch_batch(session, cache, api_url, batch, max_results, thresholds):
+    """
+    Yield papers for one batch of interests, paging until every interest has enough.
+    max_results is an int, or a dict of interest -> max (missing interests get 3).
+    thresholds maps each interest to the datetime its papers must be published after,
+    or None; the query asks for papers after the earliest of them.
+
+    If the pages of the OR'd query run out while some interests still have fewer papers
+    than their max, each of those is queried again on its own.
+    """
+    if isinstance(max_results, dict):
+        limits = {interest: max_results.get(interest, 3) for interest in batch}
+    else:
+        limits = {interest: max_results for interest in batch}
+    remaining = dict(limits)
+    seen = set()
+    # Built per batch rather than through get_matcher, whose small cache is kept for the
+    # corpus vocabularies
+    matcher = KeywordMatcher(batch)
+    threshold = None if None in thresholds.values() else min(thresholds.values())
+    query = build_search_query(batch, threshold)
+    page_size = max(1, min(PAGE_SIZE, sum(remaining.values())))
+    exhausted = yield from _fetch_query(session, cache, api_url, query, page_size, batch,
+                                        lambda entry: _match_interests(entry, batch, matcher),
+                                        remaining, thresholds, seen)
+    if exhausted or len(batch) == 1:
+        return
+
+    for interest in batch:
+        if remaining[interest] <= 0:
+            continue
+        logger.info(f"Querying arXiv for '{interest}' on its own: the batch query found "
+                    f"{limits[interest] - remaining[interest]} of {limits[interest]} papers.")
+        # Every paper of a single-interest query is one of its papers; the ones already
+        # yielded are skipped, so the page also covers them
+        yield from _fetch_query(session, cache, api_url, build_search_query([interest], thresholds[interest]),
+                                max(1, min(PAGE_SIZE, limits[interest])), [interest],
+                                lambda entry, interest=interest: [interest], remaining, thresholds, seen)
+
+
+def iter_papers(interests, max_results_per_interest=3, days=None, batch_size=DEFAULT_BATCH_SIZE,
+                session=None, api_url=None, cache=None, since=None, failed=None):
+    """
+    Query arXiv for the interests and yield paper metadata as each feed is parsed.
+
+    Interests are grouped into batches that share one OR'd search_query, the 'days'
+    cutoff is sent to arXiv as a submittedDate range, and calls are spaced as arXiv
+    requires. Each paper is attributed to the interests of its batch it matches.
+
     Parameters:
       - interests (list): List of interest keywords.
-      - max_results_per_interest (int): Max number of papers per interest.
-      - download_pdfs (bool): If True, download the paper PDFs.
-      - output_dir (str): Directory to save PDFs.
+      - max_results_per_interest (int or dict): Max number of papers per interest, or a
+        dict of interest -> max.
       - days (int): (Optional) Only include papers published in the last 'days' days.
-    
-    Returns a list of dictionaries with paper metadata.
+      - batch_size (int): Number of interests combined into one query.
+      - session (requests.Session): (Optional) Session to reuse.
+      - api_url (str): (Optional) Query endpoint, e.g. a local stub server.
+      - cache (HTTPCache): (Optional) Response cache; an in-memory one is used otherwise.
+      - since (dict): (Optional) interest -> naive UTC datetime; only include papers of
+        that interest published after it.
+      - failed (set): (Optional) Interests of batches whose fetch failed are added to it.
     """
-    papers = []
     threshold = None
     if days:
-        threshold = datetime.utcnow() - timedelta(days=days)
+        # Whole days, like the query's date range
+        threshold = datetime.combine((datetime.utcnow() - timedelta(days=days)).date(), datetime.min.time())
+    session = session or requests.Session()
+    api_url = api_url or ARXIV_API_URL
+    cache = cache or HTTPCache(None)
 
-    for interest in interests:
-        query = quote(interest)
-        url = ARXIV_API_URL.format(query=query, max_results=max_results_per_interest)
+    for i in range(0, len(interests), batch_size):
+        batch = interests[i:i + batch_size]
+        thresholds = {}
+        for interest in batch:
+            limits = [t for t in (threshold, (since or {}).get(interest)) if t is not None]
+            thresholds[interest] = max(limits, default=None)
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            root = ET.fromstring(response.content)
-            ns = {"atom": "http://www.w3.org/2005/Atom"}
-
-            for entry in root.findall("atom:entry", ns):
-                title = entry.find("atom:title", ns).text.strip()
-                published_str = entry.find("atom:published", ns).text.strip()
-                published_dt = datetime.strptime(published_str, "%Y-%m-%dT%H:%M:%SZ")
-                
-                # If a threshold is set, skip papers older than the threshold
-                if threshold and published_dt < threshold:
-                    continue
-
-                summary = entry.find("atom:summary", ns).text.strip()
-                pdf_url = None
-                for link in entry.findall("atom:link", ns):
-                    if link.attrib.get("type") == "application/pdf":
-                        pdf_url = link.attrib.get("href")
-                        break
-                if not pdf_url:
-                    entry_id = entry.find("atom:id", ns).text.strip().split("/")[-1]
-                    pdf_url = f"http://arxiv.org/pdf/{entry_id}.pdf"
-
-                paper = {
-                    "interest": interest,
-                    "title": title,
-                    "published": published_str,
-                    "summary": summary,
-                    "pdf_url": pdf_url
-                }
-                papers.append(paper)
-
-                if download_pdfs:
-                    download_pdf(pdf_url, title, output_dir)
+            yield from _fetch_batch(session, cache, api_url, batch, max_results_per_interest, thresholds)
         except Exception as e:
-            logger.error(f"Error fetching papers for interest '{interest}': {e}")
+            logger.error(f"Error fetching papers for interests {batch}: {e}")
+            if failed is not None:
+                failed.update(batch)
 
-    return papers
 
-
-def download_pdf(pdf_url, title, output_dir):
+def fetch_papers(interests, max_results_per_interest=3, download_pdfs=False, output_dir="papers", days=None,
+                 batch_size=DEFAULT_BATCH_SIZE, download_workers=DEFAULT_DOWNLOAD_WORKERS, cache=None):
     """
-    Download the PDF from the given URL and save it in output_dir using a sanitized title.
+    For each interest, fetch papers from the arXiv API.
+    
+    Parameters:
+      - interests (list): List of interest keywords.
+      - max_results_per_interest (int): Max number of papers per interest.
+      - download_pdfs (bool): If True, download the paper PDFs.
+      - output_dir (str): Directory to save PDFs.
+      - days (int): (Optional) Only include papers published in the last 'days' days.
+      - batch_size (int): Number of interests combined into one arXiv query.
+      - download_workers (int): Number of concurrent PDF downloads.
+      - cache (HTTPCache): (Optional) Shared response cache for the arXiv queries.
+    
+    Returns a list of dictionaries with paper metadata.
     """
+    papers = []
+    downloader = PDFDownloader(output_dir, max_workers=download_workers) if download_pdfs else None
     try:
-        response = requests.get(pdf_url, stream=True)
-        response.raise_for_status()
-        safe_title = "".join(c if c.isalnum() or c in " -_." else "_" for c in title)[:50]
-        pdf_path = os.path.join(output_dir, f"{safe_title}.pdf")
-        with open(pdf_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=1024):
-                if chunk:
-                    f.write(chunk)
-        logger.info(f"Downloaded PDF for paper '{title}'")
-    except Exception as e:
-        logger.error(f"Error downloading PDF from {pdf_url}: {e}")
+        for paper in iter_papers(interests, max_results_per_interest, days=days, batch_size=batch_size,
+                                 cache=cache):
+            papers.append(paper)
+            # Downloads start while the remaining feeds are still being fetched
+            if downloader:
+                downloader.submit(paper["pdf_url"], paper["title"])
+    finally:
+        if downloader:
+            downloader.close()
+    return papers
@@ -0,0 +1,169 @@
+"""
+PDF Downloader Module
+
+This module downloads research paper PDFs with a bounded pool of worker threads.
+
+Papers are deduplicated by arXiv id, so a paper matched under several interests is
+downloaded once and saved as <arxiv id>.pdf. Files that are already complete are
+skipped, and interrupted downloads resume from their .part file with an HTTP Range
+request. Data is written in large blocks and the finished file is renamed into place
+atomically. A manifest.json in the output folder records each file's size and SHA-256.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import tracer
+from utils import safe_mkdir
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+DEFAULT_WORKERS = 4
+CHUNK_SIZE = 1 << 20
+REQUEST_TIMEOUT = 60
+
+
+def arxiv_id_from_url(pdf_url):
+    """
+    Return the arXiv id of a PDF link, e.g. "2401.00001v1" for
+    http://arxiv.org/pdf/2401.00001v1.pdf. Old-style ids keep their archive prefix
+    with the slash replaced ("hep-th_9901001v1") so they can be used as file names.
+    """
+    path = pdf_url.split("://", 1)[-1].split("?", 1)[0]
+    if "/pdf/" in path:
+        path = path.split("/pdf/", 1)[1]
+    else:
+        path = path.rsplit("/", 1)[-1]
+    if path.endswith(".pdf"):
+        path = path[:-4]
+    return path.replace("/", "_")
+
+
+class PDFDownloader:
+    """
+    Download manager for paper PDFs. Use as a context manager, or call close() to wait
+    for the queued downloads and write the manifest.
+
+    Parameters:
+      - output_dir (str): Folder the PDFs and manifest are written to.
+      - max_workers (int): Number of concurrent downloads.
+      - session (requests.Session): (Optional) Session to reuse.
+    """
+
+    def __init__(self, output_dir, max_workers=DEFAULT_WORKERS, session=None):
+        self.output_dir = output_dir
+        safe_mkdir(output_dir)
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable PDF manifest {self.manifest_path}: {e}")
+        return {}
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def submit(self, pdf_url, title=None):
+        """
+        Queue a PDF for download unless the same paper is already queued.
+        Returns a future resolving to the saved file path, or None if the download failed.
+        """
+        arxiv_id = arxiv_id_from_url(pdf_url)
+        with self._lock:
+            future = self._futures.get(arxiv_id)
+            if future is None:
+                future = self._executor.submit(self._download, arxiv_id, pdf_url, title)
+                self._futures[arxiv_id] = future
+        return future
+
+    def close(self):
+        """Wait for all queued downloads, write the manifest and return {arxiv id: path}."""
+        self._executor.shutdown(wait=True)
+        self._save_manifest()
+        return {arxiv_id: future.result() for arxiv_id, future in self._futures.items()}
+
+    def _is_complete(self, arxiv_id, pdf_path):
+        with self._lock:
+            entry = self.manifest.get(arxiv_id)
+        return entry is not None and os.path.exists(pdf_path) and os.path.getsize(pdf_path) == entry["size"]
+
+    def _download(self, arxiv_id, pdf_url, title):
+        pdf_path = os.path.join(self.output_dir, f"{arxiv_id}.pdf")
+        if self._is_complete(arxiv_id, pdf_path):
+            logger.debug(f"PDF for {arxiv_id} already downloaded")
+            return pdf_path
+        try:
+            with tracer.span("GET pdf", category="http", url=pdf_url) as span:
+                size, checksum = self._fetch(pdf_url, pdf_path)
+                span["bytes"] = size
+            tracer.count("pdf.downloads")
+            tracer.count("pdf.bytes", size)
+        except Exception as e:
+            logger.error(f"Error downloading PDF from {pdf_url}: {e}")
+            return None
+        with self._lock:
+            self.manifest[arxiv_id] = {"url": pdf_url, "title": title, "size": size, "sha256": checksum}
+        logger.info(f"Downloaded PDF for paper '{title or arxiv_id}'")
+        return pdf_path
+
+    def _fetch(self, pdf_url, pdf_path):
+        """Download pdf_url to pdf_path, resuming a partial file. Returns (size, sha256)."""
+        part_path = pdf_path + ".part"
+        sha = hashlib.sha256()
+        offset = 0
+        if os.path.exists(part_path):
+            with open(part_path, "rb") as f:
+                while True:
+                    block = f.read(CHUNK_SIZE)
+                    if not block:
+                        break
+                    sha.update(block)
+                    offset += len(block)
+
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with self.session.get(pdf_url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            if offset and response.status_code in (200, 416):
+                # The server ignored the range or the part file is stale: start over
+                os.remove(part_path)
+                return self._fetch(pdf_url, pdf_path)
+            response.raise_for_status()
+            with open(part_path, "ab" if offset else "wb", buffering=CHUNK_SIZE) as f:
+                for block in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if block:
+                        f.write(block)
+                        sha.update(block)
+                        offset += len(block)
+        os.replace(part_path, pdf_path)
+        return offset, sha.hexdigest()
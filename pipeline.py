@@ -0,0 +1,253 @@
+"""
+Pipeline Module
+
+A small stage graph for running the steps of main.py concurrently.
+
+Each stage names the stages it depends on and starts as soon as they have finished,
+on its own thread, so independent stages (e.g. the GitHub and arXiv fetches) overlap
+and a write starts the moment its producer is done. A stage can also stream items to
+one consumer stage while it is still running (e.g. papers to the PDF downloads).
+
+When stages are profiled, they run one at a time instead (a streaming stage's consumer
+after it), since tracemalloc measures the whole process and concurrent stages would
+show up in each other's profiles.
+
+When a cache folder is given, every finished stage's output is saved there as JSON.
+A later run with resume=True loads those outputs instead of running the stages again,
+so a run that failed halfway continues from the last completed stages.
+"""
+
+import os
+import json
+import queue
+import shutil
+import hashlib
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from instrumentation import stage as instrumented_stage, tracer
+from utils import safe_mkdir
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_CACHE_DIR = os.path.join("output", "pipeline")
+
+_END = object()
+
+
+class PipelineError(Exception):
+    """Raised when one or more stages failed. failures maps stage name -> exception."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        names = ", ".join(f"{name} ({error})" for name, error in failures.items())
+        super().__init__(f"Pipeline stages failed: {names}")
+
+
+class Stream:
+    """Single-consumer channel from a producing stage to the stage reading it."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        self._queue.put(item)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(_END)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            yield item
+
+
+class StageContext:
+    """
+    What a stage function receives.
+
+      - inputs: {dependency name: output} of the stages it depends on.
+      - emit(item): send an item to the consuming stage (streaming stages only).
+      - stream(): iterate over the items of the stage named by stream_from.
+    """
+
+    def __init__(self, inputs, out_stream=None, in_stream=None):
+        self.inputs = inputs
+        self._out = out_stream
+        self._in = in_stream
+
+    def emit(self, item):
+        if self._out is not None:
+            self._out.put(item)
+
+    def stream(self):
+        return iter(self._in) if self._in is not None else iter(())
+
+
+class Pipeline:
+    """
+    Stage graph runner.
+
+    Parameters:
+      - cache_dir (str): (Optional) Folder the stage outputs are saved in.
+      - resume (bool): Load saved outputs of completed stages instead of running them.
+        Without it, outputs saved by an earlier run are discarded first.
+      - profiles (dict): (Optional) {stage name: "cpu" | "memory"} profilers, see
+        instrumentation.stage. With any profiler, the stages run one at a time.
+    """
+
+    def __init__(self, cache_dir=None, resume=False, profiles=None):
+        self.cache_dir = cache_dir
+        self.resume = resume
+        self.profiles = profiles or {}
+        self.stages = {}
+        self.results = {}
+        if cache_dir and not resume and os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir)
+
+    def add(self, name, func, deps=(), streams=False, stream_from=None):
+        """
+        Add a stage.
+
+        Parameters:
+          - name (str): Stage name.
+          - func (callable): Called with a StageContext; its return value is the output.
+            It must be JSON-serializable when a cache folder is used.
+          - deps (list): Names of the stages whose outputs this stage needs.
+          - streams (bool): The stage emits items for a consumer. Its output must be the
+            list of items it emitted, so they can be replayed when it is resumed.
+          - stream_from (str): Name of a streaming stage whose items this stage reads.
+            The consumer starts with its deps, alongside the producer.
+        """
+        if stream_from is not None and not self.stages.get(stream_from, {}).get("streams"):
+            raise ValueError(f"Stage '{stream_from}' must be added with streams=True before '{name}'")
+        self.stages[name] = {
+            "func": func,
+            "deps": list(deps),
+            "streams": streams,
+            "stream_from": stream_from,
+            "stream": Stream() if streams else None,
+        }
+
+    def _cache_path(self, name):
+        return os.path.join(self.cache_dir, f"{name}.json") if self.cache_dir else None
+
+    def _load(self, name):
+        path = self._cache_path(name)
+        if not self.resume or not path or not os.path.exists(path):
+            return False, None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return True, json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable output of stage '{name}': {e}")
+            return False, None
+
+    def _save(self, name, output):
+        path = self._cache_path(name)
+        if not path:
+            return
+        safe_mkdir(self.cache_dir)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(output, f)
+        os.replace(tmp_path, path)
+
+    def _run_stage(self, name):
+        spec = self.stages[name]
+        out_stream = spec["stream"]
+        try:
+            found, output = self._load(name)
+            if found:
+                logger.info(f"Stage '{name}' resumed from {self._cache_path(name)}")
+                tracer.count("pipeline.resumed_stages")
+                for item in (output if out_stream is not None else ()):
+                    out_stream.put(item)
+                return output
+            in_stream = self.stages[spec["stream_from"]]["stream"] if spec["stream_from"] else None
+            context = StageContext({dep: self.results[dep] for dep in spec["deps"]}, out_stream, in_stream)
+            with instrumented_stage(name, self.profiles.get(name)):
+                output = spec["func"](context)
+            self._save(name, output)
+            return output
+        finally:
+            if out_stream is not None:
+                out_stream.close()
+
+    def _required(self, targets):
+        """The targets plus everything they depend on, directly or through a stream."""
+        required = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name in required:
+                continue
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage '{name}'")
+            required.add(name)
+            pending.extend(self.stages[name]["deps"])
+            if self.stages[name]["stream_from"]:
+                pending.append(self.stages[name]["stream_from"])
+        return required
+
+    def run(self, targets=None):
+        """
+        Run the given stages (default: all) and their dependencies. Stages that already
+        finished in an earlier call are not run again.
+
+        Returns {stage name: output}. Raises PipelineError if any stage failed; stages
+        that did not depend on the failed ones still run to completion first.
+        """
+        todo = self._required(targets or list(self.stages)) - set(self.results)
+        failures = {}
+        blocked = set()
+        running = {}
+        serial = bool(self.profiles)
+        if serial and len(todo) > 1:
+            logger.info("Profiling is on; running the pipeline stages one at a time.")
+
+        with ThreadPoolExecutor(max_workers=1 if serial else max(1, len(todo))) as executor:
+            while todo or running:
+                for name in sorted(todo):
+                    deps = self.stages[name]["deps"]
+                    if serial and self.stages[name]["stream_from"]:
+                        # A consumer run before its producer would wait for it forever
+                        deps = deps + [self.stages[name]["stream_from"]]
+                    if any(dep in failures or dep in blocked for dep in deps):
+                        logger.error(f"Stage '{name}' skipped because a stage it depends on failed")
+                        blocked.add(name)
+                        todo.discard(name)
+                        if self.stages[name]["stream"] is not None:
+                            self.stages[name]["stream"].close()
+                    elif all(dep in self.results for dep in deps):
+                        running[executor.submit(self._run_stage, name)] = name
+                        todo.discard(name)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                    except Exception as e:
+                        logger.error(f"Stage '{name}' failed: {e}")
+                        failures[name] = e
+
+        if failures:
+            raise PipelineError(failures)
+        return self.results
+
+
+def run_key(values):
+    """Short stable hash of the settings a run's cached stage outputs depend on."""
+    text = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
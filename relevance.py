@@ -0,0 +1,347 @@
+"""
+Relevance Module
+
+Scores fetched repositories and papers against the user's own documents, so the
+pipeline can order its results and spend download and summarization time on the most
+relevant ones first.
+
+Every document of the analyzed folders (see source_adapters) becomes a sparse TF-IDF
+vector over hashed words: words are hashed into N_FEATURES columns instead of being
+looked up in a vocabulary, so a repository description or paper abstract can be turned
+into a vector in the same space without rebuilding anything. Term weights are
+(1 + log tf) * idf, with the same smoothed idf as nlp_analyzer.rank_interests, and
+every row is L2-normalized. An item's relevance is its highest cosine similarity to
+any document, computed as a sparse matrix product in batches of items.
+
+The term counts of every document and the document frequency of every term (counted
+over the terms kept in the documents' vectors) are saved to output/relevance_index.npz,
+keyed by the path, size and modification time of the file each document came from.
+Later runs only read the files that are new or changed, subtract the dropped rows from
+the document frequencies and add the new ones, and recompute the weights from the
+counts, so an unchanged corpus costs a directory scan and a changed file costs one
+file read.
+"""
+
+import os
+import re
+import time
+import zlib
+import logging
+from functools import lru_cache
+
+from source_adapters import SOURCE_EXTENSIONS, iter_file_texts
+from utils import DEFAULT_CHUNK_SIZE, iter_text_files, safe_mkdir
+
+logger = logging.getLogger(__name__)
+
+RELEVANCE_INDEX_PATH = os.path.join("output", "relevance_index.npz")
+N_FEATURES = 1 << 18
+# Only the most frequent words of a document are kept in its vector
+MAX_TERMS_PER_DOC = 1000
+# Items scored per sparse matrix product, which bounds the similarity matrix
+SCORE_BATCH_SIZE = 256
+# Identifies the vectorizer; saved indexes built differently are rebuilt
+VECTORIZER_FINGERPRINT = f"crc32:{N_FEATURES}:{MAX_TERMS_PER_DOC}:sublinear-tf:smooth-idf:kept-terms-df"
+
+_WORD = re.compile(r"\w\w+")
+
+
+@lru_cache(maxsize=1 << 18)
+def _term_id(word):
+    return zlib.crc32(word.encode("utf-8", "surrogatepass")) % N_FEATURES
+
+
+def hashed_terms(text):
+    """Return (term ids, counts) arrays of a text's words, ids sorted ascending."""
+    import numpy as np
+
+    ids = np.fromiter(map(_term_id, _WORD.findall(text.lower())), dtype=np.int64)
+    return np.unique(ids, return_counts=True)
+
+
+def index_fingerprint(days=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Settings an index is built with; a saved index with other settings is rebuilt."""
+    return f"{VECTORIZER_FINGERPRINT}:chunks={chunk_size}:days={days}"
+
+
+def _normalize_rows(matrix):
+    import numpy as np
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return matrix.multiply(1.0 / norms[:, None]).tocsr()
+
+
+def _count_rows(texts):
+    """
+    Return a csr_matrix of term counts with one row per text, keeping the
+    MAX_TERMS_PER_DOC most frequent terms of each.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    indptr = [0]
+    indices = []
+    counts = []
+    for text in texts:
+        ids, tf = hashed_terms(text)
+        if len(ids) > MAX_TERMS_PER_DOC:
+            keep = np.sort(np.argsort(-tf, kind="stable")[:MAX_TERMS_PER_DOC])
+            ids, tf = ids[keep], tf[keep]
+        indices.append(ids.astype(np.int32))
+        counts.append(tf.astype(np.int32))
+        indptr.append(indptr[-1] + len(ids))
+    indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32)
+    tf = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int32)
+    return sparse.csr_matrix((tf, indices, np.array(indptr, dtype=np.int64)), shape=(len(indptr) - 1, N_FEATURES))
+
+
+def _doc_freq(rows):
+    """Number of rows each term occurs in (the rows hold every term at most once)."""
+    import numpy as np
+
+    return np.bincount(rows.indices, minlength=N_FEATURES).astype(np.int64)
+
+
+class RelevanceIndex:
+    """
+    TF-IDF vectors of a corpus, and scoring of new texts against them.
+
+    The index holds the term counts of every document and the document frequency of
+    every term, and derives the weighted vectors from them, so documents can be added
+    and removed (see update) without vectorizing the others again.
+
+    Parameters:
+      - rows (csr_matrix): Term counts, one row per document.
+      - doc_freq (ndarray): (Optional) Number of documents containing each term;
+        counted from the rows if not given.
+      - files (list): (Optional) (path, size, mtime_ns, number of rows) of the files
+        the rows were read from, in row order.
+      - fingerprint (str): (Optional) Settings the index was built with (see
+        index_fingerprint).
+    """
+
+    def __init__(self, rows, doc_freq=None, files=None, fingerprint=None):
+        self.rows = rows
+        self.doc_freq = _doc_freq(rows) if doc_freq is None else doc_freq
+        self.files = list(files or [])
+        self.fingerprint = fingerprint
+        self._matrix = None
+        self._columns = None
+
+    @classmethod
+    def build(cls, texts, fingerprint=None):
+        """Build the index from an iterable of document texts, one document at a time."""
+        index = cls(_count_rows(texts), fingerprint=fingerprint)
+        logger.info(f"Relevance index built: {index.rows.shape[0]} documents, {index.rows.nnz} terms")
+        return index
+
+    @property
+    def idf(self):
+        """idf weight of every hashed term."""
+        import numpy as np
+
+        return (np.log((1 + self.rows.shape[0]) / (1 + self.doc_freq)) + 1).astype(np.float32)
+
+    @property
+    def matrix(self):
+        """L2-normalized TF-IDF document vectors, one row per document."""
+        import numpy as np
+        from scipy import sparse
+
+        if self._matrix is None:
+            rows = self.rows
+            data = ((1 + np.log(rows.data)) * self.idf[rows.indices]).astype(np.float32)
+            self._matrix = _normalize_rows(sparse.csr_matrix((data, rows.indices, rows.indptr), shape=rows.shape))
+        return self._matrix
+
+    def update(self, files, read_texts):
+        """
+        Bring the index up to date with the current files of the corpus.
+
+        Rows of files that are gone or whose size or modification time changed are
+        dropped, only new and changed files are read, and the document frequencies are
+        adjusted by the dropped and added rows.
+
+        Parameters:
+          - files (list): (path, size, mtime_ns) of every current file.
+          - read_texts (callable): Returns the document texts of a path.
+
+        Returns the number of files read or dropped.
+        """
+        import numpy as np
+        from scipy import sparse
+
+        current = {path: (size, mtime) for path, size, mtime in files}
+        keep = np.zeros(self.rows.shape[0], dtype=bool)
+        kept_files = []
+        start = 0
+        for path, size, mtime, count in self.files:
+            if current.get(path) == (size, mtime):
+                keep[start:start + count] = True
+                kept_files.append((path, size, mtime, count))
+            start += count
+        known = {path for path, _, _, _ in kept_files}
+        new_files = []
+
+        def new_texts():
+            # Documents are vectorized as they are read, one at a time
+            for path, size, mtime in files:
+                if path in known:
+                    continue
+                count = 0
+                try:
+                    for text in read_texts(path):
+                        count += 1
+                        yield text
+                except (OSError, ValueError) as e:
+                    logger.error(f"Error reading {path}: {e}")
+                new_files.append((path, size, mtime, count))
+
+        added = _count_rows(new_texts())
+        dropped = len(self.files) - len(kept_files)
+        if not new_files and not dropped:
+            return 0
+        removed = self.rows[~keep]
+        self.doc_freq = self.doc_freq - _doc_freq(removed) + _doc_freq(added)
+        self.rows = sparse.vstack([self.rows[keep], added], format="csr")
+        self.files = kept_files + new_files
+        self._matrix = None
+        self._columns = None
+        logger.info(f"Relevance index updated: {len(new_files)} files read, {dropped} dropped, "
+                    f"{self.rows.shape[0]} documents")
+        return len(new_files) + dropped
+
+    def save(self, path=RELEVANCE_INDEX_PATH):
+        import numpy as np
+
+        directory = os.path.dirname(path)
+        if directory:
+            safe_mkdir(directory)
+        tmp_path = path + ".tmp.npz"
+        paths, sizes, mtimes, counts = zip(*self.files) if self.files else ((), (), (), ())
+        np.savez(tmp_path, data=self.rows.data, indices=self.rows.indices, indptr=self.rows.indptr,
+                 shape=np.array(self.rows.shape), doc_freq=self.doc_freq,
+                 paths=np.array(paths, dtype=str), sizes=np.array(sizes, dtype=np.int64),
+                 mtimes=np.array(mtimes, dtype=np.int64), counts=np.array(counts, dtype=np.int64),
+                 fingerprint=np.array(self.fingerprint or ""))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=RELEVANCE_INDEX_PATH):
+        import numpy as np
+        from scipy import sparse
+
+        with np.load(path, allow_pickle=False) as data:
+            rows = sparse.csr_matrix((data["data"], data["indices"], data["indptr"]), shape=tuple(data["shape"]))
+            files = list(zip(data["paths"].tolist(), data["sizes"].tolist(), data["mtimes"].tolist(),
+                             data["counts"].tolist()))
+            return cls(rows, data["doc_freq"], files, str(data["fingerprint"]) or None)
+
+    def vectorize(self, texts):
+        """Return the L2-normalized TF-IDF vectors of texts as a csr_matrix."""
+        import numpy as np
+        from scipy import sparse
+
+        indptr = [0]
+        indices = []
+        counts = []
+        for text in texts:
+            ids, tf = hashed_terms(text)
+            indices.append(ids)
+            counts.append(tf)
+            indptr.append(indptr[-1] + len(ids))
+        indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+        tf = np.concatenate(counts) if counts else np.zeros(0)
+        data = ((1 + np.log(tf)) * self.idf[indices]).astype(np.float32)
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, N_FEATURES))
+        return _normalize_rows(matrix)
+
+    def score(self, texts, batch_size=SCORE_BATCH_SIZE):
+        """
+        Return an array with the relevance of each text: its highest cosine similarity
+        to a document of the index, between 0 and 1.
+        """
+        import numpy as np
+
+        texts = list(texts)
+        scores = np.zeros(len(texts), dtype=np.float32)
+        if not texts or self.rows.shape[0] == 0:
+            return scores
+        if self._columns is None:
+            self._columns = self.matrix.T.tocsr()
+        for start in range(0, len(texts), batch_size):
+            vectors = self.vectorize(texts[start:start + batch_size])
+            similarities = vectors @ self._columns
+            scores[start:start + vectors.shape[0]] = similarities.max(axis=1).toarray().ravel()
+        return scores
+
+
+def load_relevance_index(folders, path=RELEVANCE_INDEX_PATH, days=None, rebuild=False,
+                         chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Load the saved relevance index of the folders, bring it up to date with the files
+    that changed since it was saved, and save it again if any did.
+
+    Parameters:
+      - folders (list): Folders whose documents the items are compared with.
+      - path (str): File the index is saved to. If None, it is built and not saved.
+      - days (int): If provided, only use documents from the last 'days' days.
+      - rebuild (bool): Ignore the saved index.
+      - chunk_size (int): Characters read from a plain file at a time. Each chunk of a
+        larger file is a document of its own.
+
+    Returns a RelevanceIndex.
+    """
+    fingerprint = index_fingerprint(days, chunk_size)
+    index = None
+    if path and not rebuild and os.path.exists(path):
+        try:
+            index = RelevanceIndex.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable relevance index {path}: {e}")
+        if index is not None and index.fingerprint != fingerprint:
+            logger.info(f"Rebuilding relevance index {path} built with other settings")
+            index = None
+    # A new index is saved even when the folders are empty, so later runs find it
+    new = index is None
+    if new:
+        index = RelevanceIndex(_count_rows([]), fingerprint=fingerprint)
+
+    folders = [os.path.abspath(folder) for folder in folders]
+    files = [(file_path, stat.st_size, stat.st_mtime_ns)
+             for file_path, stat in iter_text_files(folders, days=days, extensions=SOURCE_EXTENSIONS)]
+    cutoff = time.time() - days * 86400 if days else None
+    changed = index.update(files, lambda file_path: iter_file_texts(file_path, chunk_size, cutoff))
+    if not changed and not new:
+        logger.info(f"Reusing relevance index {path}")
+    if path and (changed or new):
+        index.save(path)
+    return index
+
+
+def item_text(item):
+    """Text of a fetched repository or paper: its name or title and its description or abstract."""
+    fields = ("name", "title", "description", "summary")
+    return "\n".join(item[field] for field in fields if isinstance(item.get(field), str))
+
+
+def rank_by_relevance(index, items, top_k=None):
+    """
+    Score fetched items and order them by relevance, highest first.
+
+    Parameters:
+      - index (RelevanceIndex): Index of the user's documents.
+      - items (list): Repository or paper dictionaries.
+      - top_k (int): (Optional) Only return this many items.
+
+    Returns new dictionaries with a "relevance" field; items with equal scores keep
+    their original order.
+    """
+    import numpy as np
+
+    scores = index.score(item_text(item) for item in items)
+    order = np.argsort(-scores, kind="stable")
+    if top_k is not None:
+        order = order[:top_k]
+    return [dict(items[i], relevance=round(float(scores[i]), 4)) for i in order]
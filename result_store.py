@@ -0,0 +1,217 @@
+"""
+Result Store Module
+
+This module stores the fetched results that main.py hands to paper_summarizer and
+web_app. Each dataset ("github_repos", "arxiv_papers") has a typed column schema and
+is saved under the output folder in one of these formats:
+
+  - parquet (default): a directory of Parquet part files. Appending adds a part file,
+    and reads are memory-mapped and only load the requested columns. Needs pyarrow;
+    without it the store falls back to jsonl.
+  - jsonl: one JSON object per line. Appending adds lines; reads are streamed in chunks
+    and keep only the requested columns.
+  - excel: export only, for people who want to open the results in a spreadsheet.
+    Excel files written by older versions are still read if nothing newer exists.
+"""
+
+import os
+import glob
+import shutil
+import logging
+import importlib.util
+from datetime import datetime
+
+# pandas is imported by the functions that use it, so that importing this module for
+# its constants (e.g. from cli.py) stays fast.
+from utils import safe_mkdir
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = "output"
+DEFAULT_FORMAT = "parquet"
+
+# File suffix per format, in the order read_results looks for them
+FORMATS = {
+    "parquet": ".parquet",
+    "jsonl": ".jsonl",
+    "excel": ".xlsx",
+}
+
+SCHEMAS = {
+    "github_repos": {
+        "interest": "string",
+        "name": "string",
+        "html_url": "string",
+        "description": "string",
+        "language": "string",
+        "last_pushed": "datetime64[ns, UTC]",
+        "relevance": "Float64",
+    },
+    "arxiv_papers": {
+        "interest": "string",
+        "arxiv_id": "string",
+        "title": "string",
+        "published": "datetime64[ns, UTC]",
+        "summary": "string",
+        "pdf_url": "string",
+        "relevance": "Float64",
+    },
+}
+
+JSONL_CHUNK_ROWS = 10000
+
+
+def has_parquet_support():
+    """Return True if pyarrow is available for Parquet storage."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def result_path(name, fmt=DEFAULT_FORMAT, results_dir=RESULTS_DIR):
+    """Return where dataset 'name' is stored in the given format."""
+    return os.path.join(results_dir, name + FORMATS[fmt])
+
+
+def apply_schema(df, name, columns=None):
+    """
+    Cast a DataFrame to the dataset's column types, adding any schema columns it lacks.
+    Columns outside the schema are kept as they are.
+    """
+    import pandas as pd
+
+    schema = SCHEMAS.get(name, {})
+    for column, dtype in schema.items():
+        if columns is not None and column not in columns:
+            continue
+        if column not in df.columns:
+            df[column] = pd.Series(pd.NA, index=df.index, dtype="object")
+        if dtype.startswith("datetime64"):
+            df[column] = pd.to_datetime(df[column], utc=True, errors="coerce")
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def write_results(records, name, fmt=DEFAULT_FORMAT, append=False, results_dir=RESULTS_DIR):
+    """
+    Save a list of result dictionaries as dataset 'name'.
+
+    Parameters:
+      - records (list): Result dictionaries, e.g. from fetch_github_repos.
+      - name (str): Dataset name (a key of SCHEMAS for typed columns).
+      - fmt (str): "parquet", "jsonl" or "excel".
+      - append (bool): Add to the stored dataset instead of replacing it (not for excel).
+      - results_dir (str): Folder the dataset is stored in.
+
+    Returns the path written.
+    """
+    import pandas as pd
+
+    if fmt == "parquet" and not has_parquet_support():
+        logger.warning("pyarrow is not installed; storing results as jsonl instead of parquet.")
+        fmt = "jsonl"
+    safe_mkdir(results_dir)
+    path = result_path(name, fmt, results_dir)
+    df = apply_schema(pd.DataFrame(records), name)
+
+    if not append and fmt != "excel":
+        # Replacing the dataset: drop what is stored in either format so reads don't
+        # pick up an older copy
+        for stored_fmt in ("parquet", "jsonl"):
+            _remove(result_path(name, stored_fmt, results_dir))
+
+    if fmt == "parquet":
+        safe_mkdir(path)
+        part = os.path.join(path, f"part-{datetime.utcnow():%Y%m%d%H%M%S%f}.parquet")
+        df.to_parquet(part, index=False)
+    elif fmt == "jsonl":
+        with open(path, "a" if append else "w", encoding="utf-8") as f:
+            if not df.empty:
+                text = df.to_json(orient="records", lines=True, date_format="iso")
+                f.write(text if text.endswith("\n") else text + "\n")
+    elif fmt == "excel":
+        if append:
+            raise ValueError("Excel export does not support append.")
+        # Excel cannot store timezone-aware datetimes
+        for column in df.select_dtypes(include=["datetimetz"]).columns:
+            df[column] = df[column].dt.tz_localize(None)
+        df.to_excel(path, index=False)
+    else:
+        raise ValueError(f"Unknown result format: {fmt}")
+    return path
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def find_results(name, results_dir=RESULTS_DIR):
+    """Return (path, format) of the stored dataset 'name', or (None, None) if there is none."""
+    for fmt in FORMATS:
+        path = result_path(name, fmt, results_dir)
+        if os.path.exists(path):
+            return path, fmt
+    return None, None
+
+
+def read_results_file(path, name=None, columns=None):
+    """
+    Read a stored dataset from an explicit path, choosing the reader from its suffix.
+
+    Parameters:
+      - path (str): Parquet file or directory, .jsonl or .xlsx file.
+      - name (str): (Optional) Dataset name, used to apply its column types.
+      - columns (list): (Optional) Only load these columns. Columns the stored data does
+        not have (e.g. written by an older version) come back empty.
+
+    Returns a DataFrame.
+    """
+    import pandas as pd
+
+    if path.endswith(FORMATS["parquet"]):
+        import pyarrow.parquet as pq
+
+        if os.path.isdir(path) and not glob.glob(os.path.join(path, "*.parquet")):
+            df = pd.DataFrame(columns=columns or list(SCHEMAS.get(name, {})))
+        else:
+            stored = columns
+            if columns is not None:
+                names = set(pq.ParquetDataset(path, memory_map=True).schema.names)
+                stored = [column for column in columns if column in names]
+            df = pq.read_table(path, columns=stored, memory_map=True).to_pandas()
+    elif path.endswith(FORMATS["jsonl"]):
+        df = _read_jsonl(path, columns)
+    else:
+        df = pd.read_excel(path, usecols=None if columns is None else lambda column: column in columns)
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    return apply_schema(df, name, columns) if name else df
+
+
+def _read_jsonl(path, columns):
+    import pandas as pd
+
+    if os.path.getsize(path) == 0:
+        return pd.DataFrame(columns=columns)
+    chunks = []
+    for chunk in pd.read_json(path, lines=True, chunksize=JSONL_CHUNK_ROWS, dtype=False):
+        if columns is not None:
+            chunk = chunk.reindex(columns=columns)
+        chunks.append(chunk)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_results(name, columns=None, results_dir=RESULTS_DIR):
+    """
+    Read dataset 'name' from whichever format it was stored in.
+
+    Returns a DataFrame, empty (with the schema columns) if nothing is stored yet.
+    """
+    import pandas as pd
+
+    path, _ = find_results(name, results_dir)
+    if path is None:
+        return apply_schema(pd.DataFrame(columns=columns or list(SCHEMAS.get(name, {}))), name, columns)
+    return read_results_file(path, name=name, columns=columns)
@@ -0,0 +1,248 @@
+"""
+Source Adapters Module
+
+This module turns the files found in the analyzed folders into documents for the corpus
+tools (nlp_analyzer, knowledge_graph, time_analysis).
+
+  - Plain text files (.txt, .md) are one document each and are read in fixed-size
+    chunks, so a large file never has to fit in memory at once.
+  - ChatGPT exports (the conversations.json file of a data export) are parsed
+    incrementally, one conversation at a time. Each conversation becomes its own
+    document, identified as "<file path>#<conversation id>" and dated by its own
+    update time rather than by the modification time of the export file. Only the
+    conversation being parsed and the chunk being read are held in memory, so exports
+    of several hundred MB are handled at bounded memory.
+
+Other .json files are recognised as not being chat exports from their first element
+(or first character) and yield no documents.
+"""
+
+import re
+import json
+import time
+import codecs
+import logging
+from itertools import chain
+
+from utils import DEFAULT_CHUNK_SIZE, TEXT_EXTENSIONS, iter_file_chunks, iter_text_files
+
+logger = logging.getLogger(__name__)
+
+CHAT_EXPORT_EXTENSIONS = (".json",)
+# Every file type the corpus tools read documents from
+SOURCE_EXTENSIONS = TEXT_EXTENSIONS + CHAT_EXPORT_EXTENSIONS
+DOCUMENT_SEPARATOR = "#"
+# Characters that can continue a JSON number cut off at the end of a chunk
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+# Whitespace allowed between JSON tokens
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def is_chat_export(path):
+    """Return True if the file is read as a chat export rather than as plain text."""
+    return path.endswith(CHAT_EXPORT_EXTENSIONS)
+
+
+def document_id(path, conversation_id):
+    """Identifier of one conversation of a chat export."""
+    return f"{path}{DOCUMENT_SEPARATOR}{conversation_id}"
+
+
+def iter_decoded_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, on_block=None):
+    """
+    Yield the text of a UTF-8 file in chunks, decoding blocks of chunk_size bytes.
+
+    Parameters:
+      - on_block (callable): (Optional) Called with every raw block as it is read, e.g.
+        to hash the file in the same pass.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            if on_block is not None:
+                on_block(block)
+            text = decoder.decode(block)
+            if text:
+                yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_json_array(chunks):
+    """
+    Yield the elements of a top-level JSON array, parsing it from a stream of text chunks.
+
+    Elements are decoded with json.JSONDecoder.raw_decode at an offset into the buffer
+    as soon as they are complete. The text before the offset is only dropped when the
+    next chunk is appended, so memory holds one element plus one chunk and the buffer is
+    copied once per chunk rather than once per element. When an element is still
+    incomplete, decoding is only retried once the rest of the buffer has doubled, which
+    keeps the total parsing work linear in the size of the element.
+
+    Raises ValueError if the text is not a well-formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ""
+    # Start of the unparsed text in buffer
+    idx = 0
+    eof = False
+    started = False
+    expect_item = True
+    items = 0
+    retry_at = 0
+
+    while True:
+        idx = _WHITESPACE.match(buffer, idx).end()
+        pending = len(buffer) - idx
+        # Read more when there is nothing to look at, or when the pending element
+        # failed to decode and the buffer has not grown enough to try again
+        if not eof and (not pending or (expect_item and started and pending < retry_at)):
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+            else:
+                buffer = buffer[idx:] + chunk
+                idx = 0
+            continue
+        if not pending:
+            raise ValueError("Unexpected end of JSON array")
+
+        char = buffer[idx]
+        if not started:
+            if char != "[":
+                raise ValueError("Not a JSON array")
+            idx += 1
+            started = True
+        elif char == "]" and (not expect_item or items == 0):
+            return
+        elif not expect_item:
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' after element {items} of the JSON array")
+            idx += 1
+            expect_item = True
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, idx)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                retry_at = 2 * pending
+                continue
+            if not eof and (end == len(buffer) or buffer[end] in _NUMBER_CHARS):
+                # A number cut off by the end of the buffer goes on in the next chunk
+                retry_at = pending + 1
+                continue
+            yield item
+            idx = end
+            items += 1
+            expect_item = False
+            retry_at = 0
+
+
+def _is_conversation(item):
+    return isinstance(item, dict) and isinstance(item.get("mapping"), dict)
+
+
+def iter_conversations(chunks):
+    """
+    Yield the conversations of a ChatGPT export from a stream of text chunks.
+
+    Yields nothing when the text is not an export: a JSON document that is not an
+    array, or an array whose first element is not a conversation. Raises ValueError if
+    an export turns out to be malformed part way through.
+    """
+    chunks = iter(chunks)
+    head = ""
+    for chunk in chunks:
+        head += chunk
+        if head.strip():
+            break
+    if not head.lstrip().startswith("["):
+        return
+    for position, item in enumerate(iter_json_array(chain([head], chunks))):
+        if _is_conversation(item):
+            yield item
+        elif position == 0:
+            return
+
+
+def _timestamp(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def conversation_texts(conversation):
+    """Yield the title and the text parts of every message of a conversation."""
+    title = conversation.get("title")
+    if isinstance(title, str) and title:
+        yield title
+    for node in conversation["mapping"].values():
+        message = (node or {}).get("message") or {}
+        content = message.get("content") or {}
+        for part in content.get("parts") or ():
+            if isinstance(part, str) and part:
+                yield part
+        # Code and tool output messages keep their text outside of "parts"
+        if isinstance(content.get("text"), str) and content["text"]:
+            yield content["text"]
+
+
+def conversation_time(conversation):
+    """Last activity of a conversation: its update time, else its latest message time."""
+    for key in ("update_time", "create_time"):
+        timestamp = _timestamp(conversation.get(key))
+        if timestamp is not None:
+            return timestamp
+    times = [_timestamp(((node or {}).get("message") or {}).get("create_time"))
+             for node in conversation["mapping"].values()]
+    return max((t for t in times if t is not None), default=None)
+
+
+def iter_chat_documents(chunks):
+    """
+    Yield (conversation id, timestamp, text chunks) for each conversation of a ChatGPT
+    export read from a stream of text chunks. The timestamp is None when the
+    conversation has none; the text chunks are the title and messages, separated by
+    blank lines so that keywords never run from one message into the next.
+    """
+    for position, conversation in enumerate(iter_conversations(chunks)):
+        conversation_id = conversation.get("id") or conversation.get("conversation_id") or str(position)
+        texts = conversation_texts(conversation)
+        yield str(conversation_id), conversation_time(conversation), chain.from_iterable(
+            (text, "\n\n") for text in texts)
+
+
+def iter_document_texts(folders, days=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the text of every document in the folders, for tools that need whole texts.
+
+    Plain files are yielded one chunk of at most chunk_size characters at a time and
+    chat exports one conversation at a time, so no text is larger than a chunk or a
+    conversation. Conversations older than 'days' days are skipped.
+    """
+    cutoff = time.time() - days * 86400 if days else None
+    for path, _ in iter_text_files(folders, days=days, extensions=SOURCE_EXTENSIONS):
+        try:
+            yield from iter_file_texts(path, chunk_size, cutoff)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading {path}: {e}")
+
+
+def iter_file_texts(path, chunk_size=DEFAULT_CHUNK_SIZE, cutoff=None):
+    """
+    Yield the document texts of one source file, as iter_document_texts does: chunks of
+    a plain file, or the conversations of a chat export that were active at or after
+    the cutoff timestamp (all of them without one).
+
+    Raises OSError or ValueError if the file cannot be read or parsed.
+    """
+    if not is_chat_export(path):
+        yield from iter_file_chunks(path, chunk_size)
+        return
+    for _, timestamp, texts in iter_chat_documents(iter_decoded_chunks(path, chunk_size)):
+        if cutoff is None or timestamp is None or timestamp >= cutoff:
+            yield "".join(texts)
@@ -0,0 +1,55 @@
+import random
+
+from dedup import SignatureExtractor, find_duplicates
+
+
+def _text(seed, words=400):
+    rng = random.Random(seed)
+    return " ".join(f"w{rng.randrange(5000)}" for _ in range(words))
+
+
+def _records(documents):
+    extractor = SignatureExtractor()
+    return [(path, {SignatureExtractor.name: extractor([text])}) for path, text in documents]
+
+
+def _near_copy(text, changes):
+    words = text.split()
+    for i in range(changes):
+        words[len(words) * i // changes] = f"changed{i}"
+    return " ".join(words)
+
+
+def test_exact_copies_are_found_at_any_threshold():
+    original = _text(1)
+    records = _records([("a", original), ("b", _text(2)), ("c", original)])
+    for threshold in (1.0, 0.85, 0.5):
+        assert find_duplicates(records, threshold) == {"c": "a"}
+
+
+def test_near_copies_depend_on_the_threshold():
+    original = _text(1)
+    # Four changed words out of 400 leave about 97% of the shingles shared
+    records = _records([("a", original), ("b", _near_copy(original, 4)), ("c", _text(2))])
+    assert find_duplicates(records, 0.85) == {"b": "a"}
+    assert find_duplicates(records, 1.0) == {}
+
+
+def test_loosely_related_documents_are_kept():
+    original = _text(1)
+    # Changing every fifth word leaves few of the 3-word shingles intact
+    records = _records([("a", original), ("b", _near_copy(original, 80))])
+    assert find_duplicates(records, 0.85) == {}
+
+
+def test_the_earlier_document_is_kept():
+    original = _text(1)
+    records = _records([("z", _near_copy(original, 2)), ("a", original), ("m", _near_copy(original, 3))])
+    assert find_duplicates(records, 0.85) == {"a": "z", "m": "z"}
+
+
+def test_chunking_does_not_change_the_signature():
+    text = _text(3)
+    extractor = SignatureExtractor()
+    whole = extractor([text])
+    assert extractor([text[i:i + 7] for i in range(0, len(text), 7)]) == whole
@@ -0,0 +1,142 @@
+import pytest
+
+import http_cache
+from http_cache import HTTPCache, OfflineCacheMiss
+
+URL = "https://api.example.org/search"
+
+
+class FakeResponse:
+    def __init__(self, url, status_code, body=b"", headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = body
+        self.headers = headers or {}
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """Answers with a body and ETag, and with 304 to a matching If-None-Match."""
+
+    def __init__(self, body=b'{"items": [1, 2]}', etag='"v1"'):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        self.requests.append(dict(headers or {}))
+        if headers and headers.get("If-None-Match") == self.etag:
+            return FakeResponse(url, 304, headers={"ETag": self.etag})
+        return FakeResponse(url, 200, self.body, {"ETag": self.etag, "Content-Type": "application/json"})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(http_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_fresh_responses_are_served_from_the_cache(clock):
+    cache = HTTPCache(None, ttls={"github": 60})
+    session = FakeSession()
+    first = cache.get(session, URL, params={"q": "python"}, source="github")
+    clock[0] += 59
+    second = cache.get(session, URL, params={"q": "python"}, source="github")
+    assert len(session.requests) == 1
+    assert not first.from_cache and second.from_cache
+    assert second.json() == {"items": [1, 2]}
+    assert second.headers["etag"] == '"v1"'
+
+
+def test_stale_responses_are_revalidated_with_their_etag(clock):
+    cache = HTTPCache(None, ttls={"github": 60})
+    session = FakeSession()
+    cache.get(session, URL, params={"q": "python"}, source="github")
+    clock[0] += 61
+    revalidated = cache.get(session, URL, params={"q": "python"}, source="github")
+    assert session.requests[-1]["If-None-Match"] == '"v1"'
+    assert revalidated.status_code == 200 and revalidated.from_cache
+    assert revalidated.content == session.body
+    # The 304 made the entry fresh again
+    clock[0] += 30
+    cache.get(session, URL, params={"q": "python"}, source="github")
+    assert len(session.requests) == 2
+
+    session.etag = '"v2"'
+    session.body = b'{"items": []}'
+    clock[0] += 61
+    changed = cache.get(session, URL, params={"q": "python"}, source="github")
+    assert not changed.from_cache and changed.json() == {"items": []}
+
+
+def test_keys_ignore_parameter_order():
+    cache = HTTPCache(None)
+    session = FakeSession()
+    cache.get(session, URL, params={"q": "python", "page": 1})
+    cache.get(session, URL + "?page=1", params={"q": "python"})
+    assert len(session.requests) == 1
+
+
+def test_errors_are_not_stored():
+    class Failing(FakeSession):
+        def get(self, url, **kwargs):
+            self.requests.append({})
+            return FakeResponse(url, 503, b"busy")
+
+    cache = HTTPCache(None)
+    session = Failing()
+    assert cache.get(session, URL).status_code == 503
+    assert cache.get(session, URL).status_code == 503
+    assert len(session.requests) == 2
+
+
+def test_offline_mode_serves_stale_entries_and_raises_on_a_miss(clock, tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    HTTPCache(path, ttls={"github": 60}).get(FakeSession(), URL, params={"q": "python"}, source="github")
+    clock[0] += 3600
+    offline = HTTPCache(path, ttls={"github": 60}, offline=True)
+    session = FakeSession()
+    assert offline.get(session, URL, params={"q": "python"}, source="github").json() == {"items": [1, 2]}
+    with pytest.raises(OfflineCacheMiss):
+        offline.get(session, URL, params={"q": "rust"}, source="github")
+    assert session.requests == []
+
+
+def test_streamed_bodies_are_stored_once_read_to_the_end():
+    cache = HTTPCache(None)
+    session = FakeSession(body=b"<feed>" + b"x" * 200000 + b"</feed>")
+    response = cache.get(session, URL, stream=True)
+    raw = response.raw
+    assert raw.read(6) == b"<feed>"
+    # Not complete yet, so not stored
+    assert cache._lookup(http_cache.normalize_key(URL)) is None
+    assert len(raw.read()) == 200000 + len(b"</feed>")
+    assert response.content == session.body
+    cached = cache.get(session, URL, stream=True)
+    assert cached.from_cache and cached.raw.read() == session.body
+    assert len(session.requests) == 1
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = HTTPCache(None, max_bytes=50)
+    session = FakeSession(body=b"x" * 15)
+    for query in ("a", "b", "c"):
+        clock[0] += 1
+        cache.get(session, URL, params={"q": query})
+    clock[0] += 1
+    cache.get(session, URL, params={"q": "a"})
+    clock[0] += 1
+    cache.get(session, URL, params={"q": "d"})
+    assert len(session.requests) == 4
+    cache.get(session, URL, params={"q": "a"})
+    assert len(session.requests) == 4
+    cache.get(session, URL, params={"q": "b"})
+    assert len(session.requests) == 5
@@ -0,0 +1,111 @@
+from datetime import datetime
+
+import pytest
+
+from metadata_store import MetadataStore
+
+
+def _repo(name, interest="python", relevance=None, description="", pushed="2024-01-31T12:00:00Z"):
+    return {"interest": interest, "name": name, "html_url": f"https://github.com/{name}",
+            "description": description, "language": "Python", "last_pushed": pushed, "relevance": relevance}
+
+
+@pytest.fixture
+def store():
+    store = MetadataStore(None)
+    yield store
+    store.close()
+
+
+def _rows(store, table):
+    cursor = store._db.execute(f"SELECT * FROM {table} ORDER BY rowid")
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def test_upsert_inserts_and_updates_in_place(store):
+    assert store.upsert("github_repos", [_repo("a/one", relevance=0.5), _repo("a/two")], run_id=1) == 2
+    assert store.upsert("github_repos", [_repo("a/one", description="new")], run_id=2) == 1
+
+    one, two = _rows(store, "repos")
+    assert one["description"] == "new"
+    # A missing relevance keeps the stored one
+    assert one["relevance"] == 0.5
+    assert (one["first_run"], one["last_run"]) == (1, 2)
+    assert (two["first_run"], two["last_run"]) == (1, 1)
+    assert store.count("github_repos") == 2
+
+
+def test_upsert_keys_items_by_interest(store):
+    store.upsert("github_repos", [_repo("a/one"), _repo("a/one", interest="docker")], run_id=1)
+    assert store.count("github_repos") == 2
+    assert store.count("github_repos", interest="docker") == 1
+
+
+def test_upsert_skips_records_without_interest_or_key(store):
+    records = [_repo("a/one", interest=None), _repo(None), _repo("a/two", relevance=float("nan"))]
+    assert store.upsert("github_repos", records) == 1
+    assert _rows(store, "repos")[0]["relevance"] is None
+
+
+def test_upsert_normalizes_dates(store):
+    store.upsert("arxiv_papers", [{"interest": "nlp", "arxiv_id": "2401.00001", "title": "T",
+                                   "published": datetime(2024, 1, 2, 3, 4, 5)}])
+    assert _rows(store, "papers")[0]["published"] == "2024-01-02T03:04:05Z"
+    assert store.count("arxiv_papers", since="2024-01-02T00:00:00Z") == 1
+    assert store.count("arxiv_papers", since=datetime(2024, 1, 3)) == 0
+
+
+def test_mark_fetched_and_last_fetched(store):
+    assert store.last_fetched("github", ["python"]) == {}
+    store.record_interests([("python", 2.0)], run_id=1)
+    store.mark_fetched("github", ["python", "docker"], datetime(2024, 1, 31, 12, 0, 0))
+
+    assert store.last_fetched("github", ["python", "docker", "rust"]) == {
+        "python": datetime(2024, 1, 31, 12, 0, 0), "docker": datetime(2024, 1, 31, 12, 0, 0)}
+    assert store.last_fetched("github", ["docker"]) == {"docker": datetime(2024, 1, 31, 12, 0, 0)}
+    # Sources are tracked separately, and marking keeps the interest's weight
+    assert store.last_fetched("arxiv", ["python"]) == {}
+    assert _rows(store, "interests")[0]["weight"] == 2.0
+
+    store.mark_fetched("github", ["python"], datetime(2024, 2, 1))
+    assert store.last_fetched("github", ["python"]) == {"python": datetime(2024, 2, 1)}
+
+
+def test_unknown_source(store):
+    with pytest.raises(ValueError):
+        store.mark_fetched("gitlab", ["python"], datetime(2024, 1, 1))
+
+
+def test_snapshot_is_not_changed_by_later_writes(tmp_path):
+    store = MetadataStore(str(tmp_path / "metadata.sqlite"))
+    store.upsert("github_repos", [_repo("a/one"), _repo("a/two")], run_id=1)
+    snapshot = store.snapshot("github_repos")
+    store.upsert("github_repos", [_repo("a/one", description="new"), _repo("a/three")], run_id=2)
+    rows = snapshot.read("github_repos")
+    assert list(rows["name"]) == ["a/one", "a/two"]
+    assert list(rows["description"]) == ["", ""]
+    assert store.count("github_repos") == 3
+    store.close()
+
+
+def test_set_relevance_only_updates_the_scores(store):
+    store.upsert("github_repos", [_repo("a/one", description="stored"), _repo("a/two")], run_id=1)
+    assert store.set_relevance("github_repos", [_repo("a/one", relevance=0.75, description="other"),
+                                                _repo("a/two")]) == 1
+    one, two = _rows(store, "repos")
+    assert (one["relevance"], one["description"]) == (0.75, "stored")
+    assert two["relevance"] is None
+
+
+def test_reads_can_be_limited_to_the_latest_run(store):
+    first = store.start_run(datetime(2024, 1, 1))
+    store.upsert("github_repos", [_repo("a/one"), _repo("a/two")], run_id=first)
+    store.finish_run(first)
+    second = store.start_run(datetime(2024, 1, 2))
+    store.upsert("github_repos", [_repo("a/two"), _repo("a/three")], run_id=second)
+    assert store.last_run_id() == first
+    store.finish_run(second)
+    assert store.last_run_id() == second
+    assert list(store.read("github_repos", run=second)["name"]) == ["a/two", "a/three"]
+    assert store.count("github_repos", run=first) == 1
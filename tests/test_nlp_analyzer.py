@@ -0,0 +1,32 @@
+from nlp_analyzer import KeywordMatcher
+
+KEYWORDS = ["machine learning", "machine", "learning", "go", "data"]
+TEXT = ("Machine learning with Go and C; machine learning data, more data. "
+        "Going to the machine-learning meetup; ago, go.")
+
+
+def test_count_chunks_matches_count_at_every_split():
+    matcher = KeywordMatcher(KEYWORDS)
+    expected = matcher.count(TEXT)
+    for split in range(len(TEXT) + 1):
+        assert matcher.count_chunks([TEXT[:split], TEXT[split:]]) == expected, split
+
+
+def test_count_chunks_with_chunks_shorter_than_the_overlap():
+    matcher = KeywordMatcher(KEYWORDS)
+    expected = matcher.count(TEXT)
+    for size in (1, 2, 3, 7):
+        chunks = [TEXT[i:i + size] for i in range(0, len(TEXT), size)]
+        assert matcher.count_chunks(chunks) == expected, size
+
+
+def test_count_chunks_does_not_match_inside_words_across_a_boundary():
+    matcher = KeywordMatcher(["go"])
+    assert matcher.count_chunks(["al", "go", "rithm ago"]) == {}
+    assert matcher.count_chunks(["let's g", "o"]) == {"go": 1}
+
+
+def test_count_chunks_empty():
+    matcher = KeywordMatcher(KEYWORDS)
+    assert matcher.count_chunks([]) == {}
+    assert KeywordMatcher([]).count_chunks(["machine learning"]) == {}
@@ -0,0 +1,86 @@
+import re
+
+import pytest
+
+import papers_fetcher
+from http_cache import HTTPCache
+from papers_fetcher import iter_papers
+
+FEED = '<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom">{}</feed>'
+ENTRY = ('<entry><id>http://arxiv.org/abs/{id}v1</id><title>{title}</title>'
+         '<published>2024-01-{day:02d}T00:00:00Z</published><summary>{summary}</summary>'
+         '<link type="application/pdf" href="http://arxiv.org/pdf/{id}"/></entry>')
+
+
+class FakeResponse:
+    def __init__(self, url, body):
+        self.url = url
+        self.status_code = 200
+        self.headers = {"Content-Type": "application/atom+xml"}
+        self.content = body
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class FakeArxiv:
+    """Answers all:"term" queries (OR'd or not) from a list of papers per term, in order."""
+
+    def __init__(self, papers):
+        self.papers = papers
+        self.queries = []
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        self.queries.append((params["search_query"], params["start"], params["max_results"]))
+        terms = re.findall(r'all:"([^"]+)"', params["search_query"])
+        matches = [paper for term in terms for paper in self.papers[term]]
+        page = matches[params["start"]:params["start"] + params["max_results"]]
+        entries = "".join(ENTRY.format(**paper) for paper in page)
+        return FakeResponse(url, FEED.format(entries).encode("utf-8"))
+
+
+def _papers(term, count, prefix):
+    return [{"id": f"{prefix}.{i:05d}", "title": f"{term} paper {i}", "summary": f"About {term}.", "day": 1 + i % 28}
+            for i in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def no_spacing(monkeypatch):
+    monkeypatch.setattr(papers_fetcher, "_spacer", papers_fetcher.RequestSpacer(0))
+
+
+def test_interests_crowded_out_of_a_batch_are_queried_on_their_own():
+    arxiv = FakeArxiv({"python": _papers("python", 1000, "2401"), "rust": _papers("rust", 4, "2402")})
+    papers = list(iter_papers(["python", "rust"], max_results_per_interest=3, session=arxiv, api_url="http://arxiv.test",
+                              cache=HTTPCache(None)))
+    by_interest = {}
+    for paper in papers:
+        by_interest.setdefault(paper["interest"], []).append(paper["arxiv_id"])
+    assert len(by_interest["python"]) == 3
+    assert by_interest["rust"] == ["2402.00000", "2402.00001", "2402.00002"]
+    batch_queries = [query for query in arxiv.queries if " OR " in query[0]]
+    assert len(batch_queries) == papers_fetcher.MAX_PAGES
+    assert [query for query in arxiv.queries if " OR " not in query[0]] == [('all:"rust"', 0, 3)]
+
+
+def test_papers_already_found_are_not_repeated_by_the_single_query():
+    # rust papers also mention python, so the batch finds one of them before its budget runs out
+    rust = _papers("rust", 3, "2402")
+    arxiv = FakeArxiv({"python": _papers("python", 29, "2401") + [rust[0]] + _papers("python", 1000, "2403"),
+                       "rust": rust})
+    papers = list(iter_papers(["python", "rust"], max_results_per_interest={"python": 30, "rust": 3},
+                              session=arxiv, api_url="http://arxiv.test", cache=HTTPCache(None)))
+    rust_ids = [paper["arxiv_id"] for paper in papers if paper["interest"] == "rust"]
+    assert rust_ids == ["2402.00000", "2402.00001", "2402.00002"]
+
+
+def test_no_single_queries_when_the_batch_results_run_out():
+    arxiv = FakeArxiv({"python": _papers("python", 5, "2401"), "rust": _papers("rust", 1, "2402")})
+    papers = list(iter_papers(["python", "rust"], max_results_per_interest=3, session=arxiv, api_url="http://arxiv.test",
+                              cache=HTTPCache(None)))
+    assert len(papers) == 4
+    assert all(" OR " in query[0] for query in arxiv.queries)
@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+
+import pipeline as pipeline_module
+from instrumentation import stage as instrumented_stage
+from pipeline import Pipeline, PipelineError
+
+
+class Recorder:
+    """Stage functions that record when they start and finish."""
+
+    def __init__(self):
+        self.events = []
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def stage(self, name, output=None, delay=0.0, fail=False):
+        def run(context):
+            with self._lock:
+                self.events.append(("start", name))
+                self.calls.append(name)
+            time.sleep(delay)
+            with self._lock:
+                self.events.append(("end", name))
+            if fail:
+                raise RuntimeError(f"{name} failed")
+            return output if output is not None else {dep: value for dep, value in context.inputs.items()}
+        return run
+
+    def index(self, event, name):
+        return self.events.index((event, name))
+
+
+def _graph(recorder, pipeline, fail=None):
+    pipeline.add("analyze", recorder.stage("analyze", ["python", "rust"]))
+    pipeline.add("github", recorder.stage("github", delay=0.05, fail=fail == "github"), deps=["analyze"])
+    pipeline.add("arxiv", recorder.stage("arxiv", delay=0.05), deps=["analyze"])
+    pipeline.add("store", recorder.stage("store"), deps=["github", "arxiv"])
+
+
+def test_stages_start_once_their_dependencies_finish():
+    recorder = Recorder()
+    pipeline = Pipeline()
+    _graph(recorder, pipeline)
+    results = pipeline.run()
+    assert results["store"] == {"github": {"analyze": ["python", "rust"]}, "arxiv": {"analyze": ["python", "rust"]}}
+    assert recorder.index("end", "analyze") < recorder.index("start", "github")
+    assert max(recorder.index("end", "github"), recorder.index("end", "arxiv")) < recorder.index("start", "store")
+    # Independent stages overlap
+    assert max(recorder.index("start", "github"), recorder.index("start", "arxiv")) \
+        < min(recorder.index("end", "github"), recorder.index("end", "arxiv"))
+
+
+def test_only_the_targets_and_their_dependencies_run():
+    recorder = Recorder()
+    pipeline = Pipeline()
+    _graph(recorder, pipeline)
+    assert set(pipeline.run(["arxiv"])) == {"analyze", "arxiv"}
+    pipeline.run()
+    assert sorted(recorder.calls) == ["analyze", "arxiv", "github", "store"]
+
+
+def test_a_failed_stage_blocks_its_dependents_and_resume_skips_completed_stages(tmp_path):
+    cache_dir = str(tmp_path / "pipeline")
+    recorder = Recorder()
+    failing = Pipeline(cache_dir=cache_dir)
+    _graph(recorder, failing, fail="github")
+    with pytest.raises(PipelineError) as error:
+        failing.run()
+    assert set(error.value.failures) == {"github"}
+    assert "store" not in recorder.calls
+    assert "arxiv" in failing.results
+
+    recorder = Recorder()
+    resumed = Pipeline(cache_dir=cache_dir, resume=True)
+    _graph(recorder, resumed)
+    results = resumed.run()
+    assert sorted(recorder.calls) == ["github", "store"]
+    assert results["arxiv"] == {"analyze": ["python", "rust"]}
+
+    # Without resume the saved outputs are discarded
+    recorder = Recorder()
+    fresh = Pipeline(cache_dir=cache_dir)
+    _graph(recorder, fresh)
+    fresh.run()
+    assert sorted(recorder.calls) == ["analyze", "arxiv", "github", "store"]
+
+
+def test_streamed_items_reach_the_consumer_and_are_replayed_on_resume(tmp_path):
+    cache_dir = str(tmp_path / "pipeline")
+    received = []
+
+    def produce(context):
+        for item in range(5):
+            context.emit(item)
+        return list(range(5))
+
+    def consume(context):
+        received.append(list(context.stream()))
+        return len(received[-1])
+
+    for resume in (False, True):
+        pipeline = Pipeline(cache_dir=cache_dir, resume=resume)
+        pipeline.add("produce", produce, streams=True)
+        pipeline.add("consume", consume, stream_from="produce")
+        if resume:
+            # Only the consumer is missing from the cache
+            (tmp_path / "pipeline" / "consume.json").unlink()
+        pipeline.run()
+    assert received == [[0, 1, 2, 3, 4], [0, 1, 2, 3, 4]]
+
+
+def test_profiled_pipelines_run_one_stage_at_a_time(tmp_path, monkeypatch):
+    # Profile reports go to tmp_path
+    monkeypatch.setattr(pipeline_module, "instrumented_stage",
+                        lambda name, profile: instrumented_stage(name, profile, output_dir=str(tmp_path)))
+    recorder = Recorder()
+    pipeline = Pipeline(profiles={"arxiv": "memory"})
+    _graph(recorder, pipeline)
+    received = []
+    pipeline.add("papers", lambda context: context.emit("paper") or ["paper"], deps=["analyze"], streams=True)
+    pipeline.add("downloads", lambda context: received.extend(context.stream()) or len(received),
+                 deps=["analyze"], stream_from="papers")
+    results = pipeline.run()
+    assert results["downloads"] == 1
+    starts = [name for event, name in recorder.events if event == "start"]
+    assert recorder.events == [event for name in starts for event in (("start", name), ("end", name))]
+    assert (tmp_path / "profile_arxiv_memory.txt").exists()
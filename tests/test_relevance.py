@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+import pytest
+
+import relevance
+from relevance import RelevanceIndex, load_relevance_index, rank_by_relevance
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "notes"
+    folder.mkdir()
+    (folder / "a.txt").write_text("kubernetes operators and helm charts for clusters", encoding="utf-8")
+    (folder / "b.md").write_text("rust borrow checker lifetimes and async runtimes", encoding="utf-8")
+    (folder / "c.txt").write_text("python pandas dataframes and numpy arrays", encoding="utf-8")
+    return folder
+
+
+@pytest.fixture
+def read(monkeypatch):
+    """Paths whose texts the relevance index read."""
+    paths = []
+    iter_file_texts = relevance.iter_file_texts
+
+    def counting(path, *args, **kwargs):
+        paths.append(os.path.basename(path))
+        return iter_file_texts(path, *args, **kwargs)
+
+    monkeypatch.setattr(relevance, "iter_file_texts", counting)
+    return paths
+
+
+def _write(path, text):
+    stat = os.stat(path) if os.path.exists(path) else None
+    path.write_text(text, encoding="utf-8")
+    if stat is not None:
+        # Make sure the change is visible even on file systems with coarse mtimes
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def _assert_same_index(index, other):
+    # Rows may be in another order; compare them sorted by content
+    def rows(matrix):
+        return sorted(tuple(zip(row.indices.tolist(), np.round(row.data, 5).tolist())) for row in matrix)
+
+    assert index.rows.shape == other.rows.shape
+    np.testing.assert_array_equal(index.doc_freq, other.doc_freq)
+    np.testing.assert_allclose(index.idf, other.idf)
+    assert rows(index.matrix) == rows(other.matrix)
+
+
+def test_items_are_ranked_by_similarity_to_the_documents(folder, tmp_path):
+    index = load_relevance_index([str(folder)], str(tmp_path / "index.npz"))
+    items = [{"name": "cooking/recipes", "description": "soup"},
+             {"name": "rust-lang/async", "description": "async runtimes for rust"},
+             {"name": "helm/charts", "description": "helm charts for kubernetes clusters"}]
+    ranked = rank_by_relevance(index, items)
+    assert [item["name"] for item in ranked][2] == "cooking/recipes"
+    assert ranked[2]["relevance"] == 0
+    assert all(item["relevance"] > 0.3 for item in ranked[:2])
+
+
+def test_unchanged_corpus_reads_no_files(folder, tmp_path, read):
+    path = str(tmp_path / "index.npz")
+    first = load_relevance_index([str(folder)], path)
+    assert sorted(read) == ["a.txt", "b.md", "c.txt"]
+    del read[:]
+    mtime = os.path.getmtime(path)
+    second = load_relevance_index([str(folder)], path)
+    assert read == []
+    assert os.path.getmtime(path) == mtime
+    _assert_same_index(first, second)
+
+
+def test_only_changed_files_are_read_and_match_a_rebuild(folder, tmp_path, read):
+    path = str(tmp_path / "index.npz")
+    load_relevance_index([str(folder)], path)
+    del read[:]
+
+    _write(folder / "b.md", "rust embedded firmware and rust traits")
+    (folder / "c.txt").unlink()
+    _write(folder / "d.txt", "kubernetes networking with python scripts")
+    updated = load_relevance_index([str(folder)], path)
+    assert sorted(read) == ["b.md", "d.txt"]
+    assert [file[0] for file in updated.files] == [str(folder / "a.txt"), str(folder / "b.md"), str(folder / "d.txt")]
+
+    rebuilt = load_relevance_index([str(folder)], None)
+    _assert_same_index(updated, rebuilt)
+    _assert_same_index(RelevanceIndex.load(path), rebuilt)
+
+
+def test_other_settings_rebuild_the_index(folder, tmp_path, read):
+    path = str(tmp_path / "index.npz")
+    load_relevance_index([str(folder)], path)
+    del read[:]
+    index = load_relevance_index([str(folder)], path, chunk_size=16)
+    assert sorted(read) == ["a.txt", "b.md", "c.txt"]
+    # Every file is cut into several documents
+    assert index.rows.shape[0] > 3
+    assert index.doc_freq.sum() == index.rows.nnz
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from source_adapters import iter_json_array
+
+
+def test_iter_json_array_number_split_across_chunks():
+    assert list(iter_json_array(["[1", "23", "45, 6", "7.", "5e", "1]"])) == [12345, 67.5e1]
+
+
+def test_iter_json_array_number_at_the_end_of_the_stream():
+    # Digits are only final once the closing bracket has been seen
+    assert list(iter_json_array(["[ 4", "2 ", "]"])) == [42]
+
+
+def test_iter_json_array_at_every_split():
+    data = [{"id": "a", "text": "x" * 50}, 1024, -3.25, "s", [1, [2]], None, True]
+    text = json.dumps(data)
+    for split in range(len(text) + 1):
+        assert list(iter_json_array([text[:split], text[split:]])) == data, split
+
+
+def test_iter_json_array_one_character_chunks():
+    text = json.dumps([123456789, {"k": [1.5, 2]}, "tail"])
+    assert list(iter_json_array(text)) == [123456789, {"k": [1.5, 2]}, "tail"]
+
+
+def test_iter_json_array_empty():
+    assert list(iter_json_array(["[", " ", "]"])) == []
+
+
+@pytest.mark.parametrize("text", ['{"a": 1}', "[1, 2", "[1 2]", "[1,]"])
+def test_iter_json_array_malformed(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array([text]))
+
+
+def test_iter_json_array_many_elements_in_one_chunk():
+    data = [{"id": i, "text": "x" * (i % 7)} for i in range(5000)]
+    text = json.dumps(data).replace(", {", ",\n  {")
+    assert list(iter_json_array([text[:100], text[100:], "\n"])) == data
@@ -0,0 +1,39 @@
+import re
+
+import pytest
+
+import topic_modeling
+from topic_modeling import TokenExtractor, iter_chunk_tokens, read_tokens
+
+TEXT = "Graph neural networks\nfor molecules and proteins.\nTransformers\tbeat recurrent models " * 5
+
+
+@pytest.fixture(autouse=True)
+def tokenizer(monkeypatch):
+    # Stands in for the NLTK tokenizer, whose data may not be installed
+    monkeypatch.setattr(topic_modeling, "preprocess_text",
+                        lambda text: [word for word in re.findall(r"[a-z]+", text.lower()) if word != "and"])
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_chunk_boundaries_do_not_split_words():
+    expected = topic_modeling.preprocess_text(TEXT)
+    for size in (1, 2, 5, 13, 64, len(TEXT)):
+        assert [token for tokens in iter_chunk_tokens(_chunks(TEXT, size)) for token in tokens] == expected, size
+
+
+def test_text_without_whitespace_is_carried_whole():
+    assert [token for tokens in iter_chunk_tokens(["trans", "form", "ers"]) for token in tokens] == ["transformers"]
+
+
+def test_token_files_do_not_depend_on_chunking(tmp_path):
+    extractor = TokenExtractor(str(tmp_path))
+    key = extractor([TEXT])
+    assert extractor(_chunks(TEXT, 7)) == key
+    assert read_tokens(str(tmp_path), key) == topic_modeling.preprocess_text(TEXT)
+    assert extractor(["and"]) != key
+    assert read_tokens(str(tmp_path), extractor(["and"])) == []
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,158 @@
+import os
+
+import pytest
+
+import corpus_index
+from time_analysis import load_series
+from watcher import PollingMonitor, WatchState
+
+KEYWORDS = ["python", "docker", "rust", "kubernetes"]
+TEXT = "python and docker " * 20
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "notes"
+    folder.mkdir()
+    (folder / "a.txt").write_text(TEXT + "one", encoding="utf-8")
+    (folder / "b.txt").write_text("rust " * 30 + "kubernetes", encoding="utf-8")
+    (folder / "c.txt").write_text("kubernetes and docker notes " * 10, encoding="utf-8")
+    return folder
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    """Paths read and extracted by the corpus index."""
+    paths = []
+    index_file = corpus_index.index_file
+
+    def counting(path, *args, **kwargs):
+        paths.append(path)
+        return index_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(corpus_index, "index_file", counting)
+    return paths
+
+
+def _state(folder, tmp_path, **kwargs):
+    return WatchState([str(folder)], keywords=KEYWORDS, index_path=str(tmp_path / "index.json"),
+                      output_dir=str(tmp_path / "output"), series_path=str(tmp_path / "series.csv"), **kwargs)
+
+
+def _series(state):
+    series = load_series(state.series_path)
+    return sorted(zip(series["path"], series["topic"].astype(str)))
+
+
+def _write(path, text):
+    stat = os.stat(path) if os.path.exists(path) else None
+    path.write_text(text, encoding="utf-8")
+    if stat is not None:
+        # Make sure the change is visible even on file systems with coarse mtimes
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_only_the_changed_file_is_re_extracted(folder, tmp_path, extracted):
+    state = _state(folder, tmp_path)
+    assert state.refresh() == 3
+    assert len(extracted) == 3
+    del extracted[:]
+
+    _write(folder / "b.txt", "rust " * 30 + "python")
+    assert state.refresh({str(folder / "b.txt")}) == 1
+    assert extracted == [str(folder / "b.txt")]
+    assert set(state.documents[str(folder / "b.txt")]["topics"]) == {"rust", "python"}
+    assert state.doc_freq["kubernetes"] == 1
+    assert state.pairs[("python", "rust")] == 1
+
+
+def test_unchanged_paths_are_not_read(folder, tmp_path, extracted):
+    state = _state(folder, tmp_path)
+    state.refresh()
+    del extracted[:]
+    assert state.refresh({str(folder / "a.txt"), str(folder / "missing.txt")}) == 0
+    assert extracted == []
+
+
+def test_incremental_updates_match_a_full_scan(folder, tmp_path):
+    state = _state(folder, tmp_path)
+    state.refresh()
+    _write(folder / "b.txt", "rust " * 30 + "python")
+    (folder / "c.txt").unlink()
+    (folder / "sub").mkdir()
+    _write(folder / "sub" / "d.txt", "docker " * 40)
+    state.refresh({str(folder / "b.txt"), str(folder / "c.txt"), str(folder / "sub")})
+
+    fresh = _state(folder, tmp_path / "fresh")
+    os.makedirs(tmp_path / "fresh")
+    fresh.refresh()
+    assert state.documents == fresh.documents
+    assert state.pairs == fresh.pairs
+    # The recency decay is computed at slightly different times
+    assert [interest for interest, _ in state.ranked] == [interest for interest, _ in fresh.ranked]
+    assert dict(state.ranked) == pytest.approx(dict(fresh.ranked))
+    assert _series(state) == _series(fresh)
+
+
+def test_a_copy_is_counted_once_its_original_is_deleted(folder, tmp_path, extracted):
+    _write(folder / "d.txt", TEXT + "one")
+    state = _state(folder, tmp_path)
+    state.refresh()
+    assert str(folder / "d.txt") not in state.documents
+    assert state.doc_freq["python"] == 1
+    del extracted[:]
+
+    (folder / "a.txt").unlink()
+    assert state.refresh({str(folder / "a.txt")}) == 2
+    assert extracted == []
+    assert set(state.documents) == {str(folder / "b.txt"), str(folder / "c.txt"), str(folder / "d.txt")}
+    assert state.doc_freq["python"] == 1
+    assert ("docker", "python") in state.pairs
+    assert [path for path, _ in _series(state) if path.endswith("a.txt")] == []
+    assert (str(folder / "d.txt"), "python") in _series(state)
+
+
+def test_deleted_directory_drops_its_files(folder, tmp_path):
+    (folder / "sub").mkdir()
+    _write(folder / "sub" / "d.txt", "docker " * 40)
+    state = _state(folder, tmp_path)
+    state.refresh()
+    (folder / "sub" / "d.txt").unlink()
+    (folder / "sub").rmdir()
+    assert state.refresh({str(folder / "sub")}) == 1
+    assert str(folder / "sub" / "d.txt") not in state.documents
+
+
+def test_the_index_is_saved_when_asked(folder, tmp_path):
+    state = _state(folder, tmp_path)
+    state.refresh()
+    _write(folder / "a.txt", "rust")
+    state.refresh({str(folder / "a.txt")})
+    assert corpus_index.CorpusIndex(state.index.path, state.index.extractor).entries[str(folder / "a.txt")] \
+        != state.index.entries[str(folder / "a.txt")]
+    state.save()
+    assert corpus_index.CorpusIndex(state.index.path, state.index.extractor).entries == state.index.entries
+
+
+def test_polling_monitor_reports_changed_paths(folder):
+    monitor = PollingMonitor([str(folder)], interval=0.01)
+    assert monitor.wait(0) == set()
+    _write(folder / "a.txt", "changed")
+    (folder / "b.txt").unlink()
+    _write(folder / "e.md", "new")
+    assert monitor.wait(1) == {str(folder / "a.txt"), str(folder / "b.txt"), str(folder / "e.md")}
+
+
+def test_replaced_series_rows_are_compacted(folder, tmp_path, monkeypatch):
+    monkeypatch.setattr("watcher.MIN_COMPACT_ROWS", 1)
+    state = _state(folder, tmp_path)
+    state.refresh()
+    # Compacted once the replaced rows outnumber the 3 documents, on the fourth change
+    for text in ("rust python", "rust docker", "docker", "python", "rust"):
+        _write(folder / "a.txt", text)
+        state.refresh({str(folder / "a.txt")})
+    assert (str(folder / "a.txt"), "rust") in _series(state)
+    with open(state.series_path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    # The fifth change appended a marker and a row replacing the fourth change's row
+    assert len(lines) == 1 + len(load_series(state.series_path)) + 2
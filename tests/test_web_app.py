@@ -0,0 +1,78 @@
+import gzip
+import os
+
+import pytest
+
+import web_app
+from metadata_store import MetadataStore
+
+
+def _repos(count, start=0):
+    return [{"interest": "python", "name": f"owner/repo{i:03d}", "html_url": f"https://github.com/owner/repo{i:03d}",
+             "description": "A repository " * 10, "language": "Python", "last_pushed": f"2024-01-{1 + i % 28:02d}T00:00:00Z"}
+            for i in range(start, start + count)]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = MetadataStore(str(tmp_path / "metadata.sqlite"))
+    store.upsert("github_repos", _repos(120), run_id=1)
+    monkeypatch.setattr(web_app, "repo_cache", web_app.RepoCache(store.path))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def client(store):
+    return web_app.app.test_client()
+
+
+def _touch(path):
+    # Make the write visible even on file systems with coarse mtimes
+    mtime = os.path.getmtime(path) + 1
+    os.utime(path, (mtime, mtime))
+
+
+def test_pages_are_sorted_and_clamped(client):
+    data = client.get("/api/repos?per_page=50&sort=name&order=desc").get_json()
+    assert data["total"] == 120
+    assert [repo["name"] for repo in data["repos"][:2]] == ["owner/repo119", "owner/repo118"]
+    last = client.get("/api/repos?per_page=50&page=9").get_json()
+    assert last["page"] == 3 and len(last["repos"]) == 20
+
+
+def test_unchanged_pages_are_revalidated_with_their_etag(client, store):
+    response = client.get("/api/repos?page=2")
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert client.get("/api/repos?page=2", headers={"If-None-Match": etag}).status_code == 304
+    # Another slice has another validator
+    assert client.get("/api/repos?page=1", headers={"If-None-Match": etag}).status_code == 200
+
+    store.upsert("github_repos", _repos(1, start=120), run_id=2)
+    _touch(store.path)
+    response = client.get("/api/repos?page=2", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+    assert response.get_json()["total"] == 121
+
+
+def test_gzip_and_identity_bodies_share_a_weak_etag(client):
+    plain = client.get("/api/repos")
+    compressed = client.get("/api/repos", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers["ETag"] == plain.headers["ETag"]
+    assert client.get("/api/repos", headers={"If-None-Match": compressed.headers["ETag"]}).status_code == 304
+
+
+def test_pages_do_not_see_rows_written_after_the_snapshot(client, store):
+    first = client.get("/api/repos?per_page=100").get_json()
+    # A write that the cache has not noticed yet (same mtime) must not show up
+    mtime = os.path.getmtime(store.path)
+    store.upsert("github_repos", _repos(30, start=200), run_id=2)
+    os.utime(store.path, (mtime, mtime))
+    second = client.get("/api/repos?per_page=100&page=2").get_json()
+    assert second["total"] == first["total"] == 120
+    assert [repo["name"] for repo in second["repos"]] == [f"owner/repo{i:03d}" for i in range(100, 120)]
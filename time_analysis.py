@@ -1,66 +1,269 @@
 #!/usr/bin/env python
-import argparse
+"""
+Time Analysis Module
+
+Tracks how often each interest topic appears in files over time, using the files'
+modification dates.
+
+Records are gathered as compact columns (day numbers and categorical topic codes) and
+aggregated with a vectorized groupby into day, week or month buckets, optionally
+smoothed with a rolling window. In incremental mode the per-file records are kept in a
+stored time series, and only files that are new or changed since the last run are added.
+
+The watcher appends the records of changed documents to the stored series, each after
+a marker row holding only the document's path; load_series keeps the rows written after
+a path's last marker, and compact_series drops the replaced rows.
+"""
 import os
-import time
+import argparse
 import datetime
 import logging
-import itertools
+from array import array
 
-import matplotlib.pyplot as plt
-import pandas as pd
-
-from nlp_analyzer import extract_interests_from_text
+# numpy, pandas and matplotlib are imported by the functions that use them, so
+# importing this module (e.g. from cli.py) stays fast.
+from corpus_index import DEFAULT_INDEX_PATH
+from dedup import DEFAULT_DEDUP_THRESHOLD
+from nlp_analyzer import scan_folders
+from utils import safe_mkdir
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def analyze_time_and_topics(folders):
-    records = []
-    for folder in folders:
-        if not os.path.isdir(folder):
-            logger.warning(f"Folder not found: {folder}")
+SERIES_PATH = os.path.join("output", "time_series.csv")
+
+# Resampling rule per bucket size
+FREQUENCIES = {
+    "day": "D",
+    "week": "W",
+    "month": "MS",
+}
+
+# Above this many buckets the chart switches from bars to a stacked area plot
+MAX_BARS = 60
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+def _records_frame(scanned):
+    """
+    Turn (path, entry) tuples into a DataFrame with one row per (file, topic):
+    path, mtime, date (the local modification day) and topic (categorical).
+    """
+    import numpy as np
+    import pandas as pd
+
+    file_index = array("q")
+    days = array("q")
+    codes = array("q")
+    paths = []
+    mtimes = array("d")
+    topics = {}
+    for path, entry in scanned:
+        if not entry["topics"]:
             continue
-        for root, dirs, files in os.walk(folder):
-            for file in files:
-                if file.endswith(".txt") or file.endswith(".md"):
-                    file_path = os.path.join(root, file)
-                    try:
-                        mod_time = os.path.getmtime(file_path)
-                        mod_date = datetime.datetime.fromtimestamp(mod_time).date()
-                        with open(file_path, "r", encoding="utf-8") as f:
-                            text = f.read()
-                        topics = extract_interests_from_text(text)
-                        for topic in topics:
-                            records.append({"date": mod_date, "topic": topic})
-                    except Exception as e:
-                        logger.error(f"Error processing file {file_path}: {e}")
-    return records
-
-def generate_report(records):
+        day = datetime.date.fromtimestamp(entry["mtime"]).toordinal() - EPOCH_ORDINAL
+        for topic in entry["topics"]:
+            file_index.append(len(paths))
+            days.append(day)
+            codes.append(topics.setdefault(topic, len(topics)))
+        paths.append(path)
+        mtimes.append(entry["mtime"])
+
+    file_index = np.frombuffer(file_index, dtype=np.int64)
+    return pd.DataFrame({
+        "path": np.array(paths, dtype=object)[file_index],
+        "mtime": np.frombuffer(mtimes, dtype=np.float64)[file_index],
+        "date": pd.to_datetime(np.frombuffer(days, dtype=np.int64), unit="D"),
+        "topic": pd.Categorical.from_codes(np.frombuffer(codes, dtype=np.int64), categories=list(topics)),
+    })
+
+def load_series(series_path):
+    """
+    Read a stored time series, or return an empty one if it does not exist. Rows
+    replaced by a later marker row of their path (see append_series) are left out.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if not os.path.exists(series_path):
+        return _records_frame([])
+    # round_trip: mtimes are compared for equality with the scanned ones
+    df = pd.read_csv(series_path, parse_dates=["date"], dtype={"path": object, "mtime": np.float64},
+                     float_precision="round_trip")
+    marker = df["topic"].isna().to_numpy()
+    if marker.any():
+        # Each path's rows run from a marker or a change of path to the next one; the
+        # last run of a path is current
+        paths = df["path"].to_numpy()
+        starts = marker.copy()
+        starts[0] = True
+        starts[1:] |= paths[1:] != paths[:-1]
+        runs = pd.Series(np.cumsum(starts))
+        current = runs == runs.groupby(paths).transform("max")
+        df = df[current.to_numpy() & ~marker].reset_index(drop=True)
+    df["topic"] = df["topic"].astype("category")
+    return df
+
+def update_series(scanned, folders, series_path):
+    """
+    Bring the stored time series up to date with the scanned files and return it.
+
+    Rows of files that changed or disappeared under the scanned folders are dropped, and
+    records are built only for files whose modification time is not stored yet. When
+    nothing was dropped the new records are appended to the file instead of rewriting it.
+    """
+    import pandas as pd
+
+    stored = load_series(series_path)
+    current = {path: entry["mtime"] for path, entry in scanned}
+    prefixes = tuple(os.path.join(os.path.abspath(folder), "") for folder in folders)
+
+    in_scope = stored["path"].str.startswith(prefixes)
+    keep = ~in_scope | (stored["path"].map(current) == stored["mtime"])
+    known = set(stored.loc[keep & in_scope, "path"])
+    added = _records_frame((path, entry) for path, entry in scanned if path not in known)
+
+    removed = int((~keep).sum())
+    series = pd.concat([stored[keep], added], ignore_index=True)
+    safe_mkdir(os.path.dirname(series_path) or ".")
+    if not removed and os.path.exists(series_path):
+        if not added.empty:
+            added.to_csv(series_path, mode="a", header=False, index=False, date_format="%Y-%m-%d")
+    else:
+        series.to_csv(series_path, index=False, date_format="%Y-%m-%d")
+    logger.info(f"Time series: {len(added)} records added, {removed} removed.")
+
+    series["topic"] = series["topic"].astype("category")
+    # Only report on the folders that were scanned
+    return series[series["path"].isin(current)].reset_index(drop=True)
+
+def append_series(changed, removed, series_path):
+    """
+    Record changed and removed documents in a stored time series without reading it.
+
+    A marker row with only the path is appended for every document, followed by the
+    records of the changed ones, so load_series leaves out their earlier rows.
+
+    Parameters:
+      - changed (list): (path, entry) tuples of new or changed documents.
+      - removed (list): Paths of documents that are gone.
+      - series_path (str): Stored time series.
+
+    Returns the number of marker rows appended.
+    """
+    import numpy as np
+    import pandas as pd
+
+    paths = [path for path, _ in changed] + list(removed)
+    if not paths:
+        return 0
+    markers = pd.DataFrame({"path": paths, "mtime": np.nan, "date": pd.NaT, "topic": np.nan})
+    rows = pd.concat([markers, _records_frame(changed).astype({"topic": object})], ignore_index=True)
+    safe_mkdir(os.path.dirname(series_path) or ".")
+    exists = os.path.exists(series_path)
+    rows.to_csv(series_path, mode="a" if exists else "w", header=not exists, index=False, date_format="%Y-%m-%d")
+    return len(paths)
+
+def compact_series(series_path):
+    """Rewrite a stored time series without the rows replaced since it was last written."""
+    series = load_series(series_path)
+    series.to_csv(series_path, index=False, date_format="%Y-%m-%d")
+    logger.info(f"Time series compacted: {len(series)} records.")
+
+def analyze_time_and_topics(folders, index_path=None, workers=1, series_path=None,
+                            dedup_threshold=DEFAULT_DEDUP_THRESHOLD):
+    """
+    Collect one record per (file, topic) with the file's modification date.
+
+    Parameters:
+      - index_path (str): (Optional) Corpus index file used to skip unchanged files.
+      - workers (int): Number of processes used to analyze files.
+      - series_path (str): (Optional) Stored time series to update incrementally.
+      - dedup_threshold (float): Leave out copies and near-copies of earlier documents
+        (see nlp_analyzer.scan_folders); 0 keeps them.
+
+    Returns a DataFrame with path, mtime, date and topic columns.
+    """
+    scanned = scan_folders(folders, index_path=index_path, workers=workers, dedup_threshold=dedup_threshold)
+    if series_path is None:
+        return _records_frame(scanned)
+    return update_series(scanned, folders, series_path)
+
+def aggregate_topics(records, freq="day", rolling=None):
+    """
+    Count files per topic and time bucket.
+
+    Parameters:
+      - records (DataFrame): Records from analyze_time_and_topics.
+      - freq (str): Bucket size, "day", "week" or "month".
+      - rolling (int): (Optional) Sum counts over a rolling window of this many buckets.
+
+    Returns a DataFrame indexed by bucket start with one column per topic. Buckets
+    without any files are included with zero counts.
+    """
+    counts = records.groupby(["date", "topic"], observed=True).size().unstack(fill_value=0)
+    counts = counts.resample(FREQUENCIES[freq]).sum()
+    if rolling:
+        counts = counts.rolling(rolling, min_periods=1).sum()
+    counts.columns = counts.columns.astype(str)
+    return counts
+
+def generate_report(records, freq="day", rolling=None, headless=False, output_dir="output"):
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
     df = pd.DataFrame(records)
     if df.empty:
         logger.info("No records found.")
         return
-    pivot = df.groupby(["date", "topic"]).size().unstack(fill_value=0)
-    ax = pivot.plot(kind="bar", stacked=True, figsize=(12,6))
-    plt.xlabel("Date")
+    if headless:
+        plt.switch_backend("Agg")
+    counts = aggregate_topics(df, freq=freq, rolling=rolling)
+    safe_mkdir(output_dir)
+    output_csv = os.path.join(output_dir, "time_analysis.csv")
+    df[["date", "topic"]].to_csv(output_csv, index=False, date_format="%Y-%m-%d")
+    output_counts = os.path.join(output_dir, f"time_analysis_{freq}.csv")
+    counts.to_csv(output_counts, date_format="%Y-%m-%d")
+
+    if len(counts) > MAX_BARS:
+        ax = counts.plot(kind="area", stacked=True, figsize=(12,6), linewidth=0)
+    else:
+        ax = counts.plot(kind="bar", stacked=True, figsize=(12,6))
+        ax.set_xticklabels(counts.index.strftime("%Y-%m-%d"))
+    plt.xlabel(freq.capitalize())
     plt.ylabel("Number of Files")
-    plt.title("Files by Topic and Date")
+    title = f"Files by Topic and {freq.capitalize()}"
+    if rolling:
+        title += f" (rolling {rolling})"
+    plt.title(title)
     plt.tight_layout()
-    output_chart = "output/time_analysis.png"
+    output_chart = os.path.join(output_dir, "time_analysis.png")
     plt.savefig(output_chart)
-    plt.show()
-    output_csv = "output/time_analysis.csv"
-    df.to_csv(output_csv, index=False)
-    print(f"Report generated: {output_chart} and {output_csv}")
+    if not headless:
+        plt.show()
+    plt.close()
+    print(f"Report generated: {output_chart}, {output_csv} and {output_counts}")
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Time Analysis and Topic Tracking from Text Files")
     parser.add_argument("-f", "--folders", nargs="+", required=True, help="Folders to analyze")
-    args = parser.parse_args()
-    
-    records = analyze_time_and_topics(args.folders)
-    generate_report(records)
+    parser.add_argument("--index", type=str, default=DEFAULT_INDEX_PATH, help="Corpus index file used to skip unchanged files")
+    parser.add_argument("--no_index", action="store_true", help="Do not use the corpus index; re-read every file")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to analyze files")
+    parser.add_argument("--dedup_threshold", type=float, default=DEFAULT_DEDUP_THRESHOLD,
+                        help="Leave out documents at least this similar to an earlier one (0 disables)")
+    parser.add_argument("--freq", choices=list(FREQUENCIES), default="day", help="Time bucket size")
+    parser.add_argument("--rolling", type=int, default=None, help="Sum counts over a rolling window of N buckets")
+    parser.add_argument("--incremental", action="store_true", help="Only add new or changed files to the stored time series")
+    parser.add_argument("--series", type=str, default=SERIES_PATH, help="Time series file used by --incremental")
+    parser.add_argument("--headless", action="store_true", help="Write the chart and CSV files without opening a window")
+    args = parser.parse_args(argv)
+
+    index_path = None if args.no_index else args.index
+    series_path = args.series if args.incremental else None
+    records = analyze_time_and_topics(args.folders, index_path=index_path, workers=args.workers,
+                                      series_path=series_path, dedup_threshold=args.dedup_threshold)
+    generate_report(records, freq=args.freq, rolling=args.rolling, headless=args.headless)
 
 if __name__ == "__main__":
     main()
@@ -1,69 +1,318 @@
 #!/usr/bin/env python
+"""
+Topic Modeling Module
+
+Trains an LDA topic model on the documents of the given folders (text files and
+ChatGPT export conversations, see source_adapters).
+
+Documents are never held in memory together:
+  - Each document is tokenized once and its tokens are kept in a file of their own
+    under output/topic_model/tokens, named by their hash. A token index (a CorpusIndex,
+    see corpus_index.py) maps every file to its token files, so later runs only
+    tokenize new or changed files, in a process pool.
+  - The dedup signature (see dedup.py) is computed in the same read, and copies or
+    near-copies of an earlier document are left out of the corpus, so they do not pull
+    the topics towards repeated text.
+  - The cached tokens are streamed one document at a time into bag-of-words, with a
+    dictionary that grows as new tokens appear, and written to a Matrix Market corpus.
+    The corpus and dictionary are kept with a fingerprint of the token files they were
+    built from, so later runs on an unchanged corpus go straight to training.
+Training uses gensim's LdaMulticore, which also streams the corpus from disk in chunks.
+
+NLTK resources (punkt, stopwords) are only looked up locally; install them once with
+"python -m nltk.downloader punkt punkt_tab stopwords".
+"""
 import argparse
 import os
+import json
+import hashlib
 import logging
-import time
+import tempfile
+import threading
+from contextlib import nullcontext
+from functools import lru_cache
 
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-
-import gensim
-from gensim import corpora
+# nltk and gensim are imported by the functions that use them, so importing this
+# module (e.g. from cli.py) stays fast.
+from corpus_index import CorpusIndex
+from dedup import DEFAULT_DEDUP_THRESHOLD, SignedExtractor, find_duplicates
+from utils import safe_mkdir
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Make sure NLTK resources are available
-nltk.download('punkt')
-nltk.download('stopwords')
-
-def load_text_from_folders(folders):
-    aggregated_texts = []
-    for folder in folders:
-        if os.path.isdir(folder):
-            for root, dirs, files in os.walk(folder):
-                for file in files:
-                    if file.endswith('.txt') or file.endswith('.md'):
-                        file_path = os.path.join(root, file)
-                        try:
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                aggregated_texts.append(f.read())
-                        except Exception as e:
-                            logger.error(f"Error reading {file_path}: {e}")
-    return aggregated_texts
-
-def preprocess_texts(texts):
-    stop_words = set(stopwords.words('english'))
-    processed_texts = []
-    for text in texts:
-        tokens = word_tokenize(text.lower())
-        tokens = [token for token in tokens if token.isalpha() and token not in stop_words]
-        processed_texts.append(tokens)
-    return processed_texts
-
-def perform_topic_modeling(texts, num_topics=5, passes=10):
-    processed_texts = preprocess_texts(texts)
+MODEL_DIR = os.path.join("output", "topic_model")
+CORPUS_NAME = "corpus.mm"
+DICTIONARY_NAME = "dictionary.gensim"
+META_NAME = "corpus.json"
+TOKEN_INDEX_NAME = "token_index.json"
+TOKEN_DIR_NAME = "tokens"
+
+# Identifies the preprocessing; cached corpora built differently are rebuilt
+TOKENIZER_FINGERPRINT = "word_tokenize:alpha:english-stopwords"
+
+DEFAULT_CHUNKSIZE = 2000
+
+# Resource name -> locations that satisfy it (newer NLTK releases use punkt_tab)
+NLTK_RESOURCES = {
+    "punkt": ("tokenizers/punkt_tab", "tokenizers/punkt"),
+    "stopwords": ("corpora/stopwords",),
+}
+
+def ensure_nltk_data():
+    """
+    Check that the NLTK resources used for tokenizing are installed, without
+    downloading anything. Raises LookupError naming the missing resources.
+    """
+    import nltk
+
+    missing = []
+    for name, locations in NLTK_RESOURCES.items():
+        for location in locations:
+            try:
+                nltk.data.find(location)
+                break
+            except LookupError:
+                continue
+        else:
+            missing.append(name)
+    if missing:
+        raise LookupError(f"Missing NLTK data: {', '.join(missing)}. "
+                          f"Install it with: python -m nltk.downloader punkt punkt_tab stopwords")
+
+def preprocess_text(text):
+    from nltk.tokenize import word_tokenize
+
+    stop_words = _stop_words()
+    tokens = word_tokenize(text.lower())
+    return [token for token in tokens if token.isalpha() and token not in stop_words]
+
+@lru_cache(maxsize=1)
+def _stop_words():
+    from nltk.corpus import stopwords
+
+    return frozenset(stopwords.words('english'))
+
+def iter_chunk_tokens(chunks):
+    """
+    Yield the tokens of a text read in chunks, as one list per chunk.
+
+    Each chunk is tokenized up to its last line break (or else its last whitespace), and
+    the rest is carried over to the next chunk, so no word is cut by a chunk boundary.
+    Sentences split by the boundary tokenize the same, since words never span whitespace.
+    """
+    carry = ""
+    for chunk in chunks:
+        buffer = carry + chunk
+        cut = buffer.rfind("\n") + 1 or max(buffer.rfind(" "), buffer.rfind("\t")) + 1
+        carry = buffer[cut:]
+        if cut:
+            yield preprocess_text(buffer[:cut])
+    if carry:
+        yield preprocess_text(carry)
+
+def token_file(token_dir, key):
+    """Path of the token file with the given hash."""
+    return os.path.join(token_dir, key[:2], key + ".txt")
+
+def read_tokens(token_dir, key):
+    with open(token_file(token_dir, key), "r", encoding="utf-8") as f:
+        return f.read().split()
+
+class TokenExtractor:
+    """
+    Corpus index extractor that tokenizes each document and writes its tokens to a token
+    file under token_dir. The entry stores the file's hash under "tokens"; documents with
+    the same tokens share one file.
+
+    Parameters:
+      - token_dir (str): Folder the token files are written to.
+    """
+
+    name = "tokens"
+
+    def __init__(self, token_dir):
+        self.token_dir = token_dir
+        self.fingerprint = f"{TOKENIZER_FINGERPRINT}:{os.path.abspath(token_dir)}"
+
+    def __call__(self, chunks):
+        # Tokens are written and hashed as each chunk is tokenized, and the file is named
+        # by the hash once it is complete
+        sha = hashlib.sha1()
+        safe_mkdir(self.token_dir)
+        tmp_path = os.path.join(self.token_dir, f"{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            separator = ""
+            for tokens in iter_chunk_tokens(chunks):
+                if tokens:
+                    # Tokens are alphabetic, so a space separates them unambiguously
+                    text = separator + " ".join(tokens)
+                    sha.update(text.encode("utf-8"))
+                    f.write(text)
+                    separator = " "
+        key = sha.hexdigest()
+        path = token_file(self.token_dir, key)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            safe_mkdir(os.path.dirname(path))
+            os.replace(tmp_path, path)
+        return key
+
+def _token_keys(entries):
+    """Token file hashes referenced by corpus index entries, chat exports included."""
+    for entry in entries:
+        for document in entry.get("documents", [entry]):
+            yield document[TokenExtractor.name]
+
+def prune_token_files(token_dir, keys):
+    """Delete the token files whose hash is not in keys. Returns how many were deleted."""
+    removed = 0
+    for root, _, files in os.walk(token_dir):
+        for name in files:
+            if name.endswith(".txt") and name[:-len(".txt")] not in keys:
+                os.remove(os.path.join(root, name))
+                removed += 1
+    return removed
+
+def corpus_fingerprint(records):
+    """Hash of the tokenizer settings and the token file of every document, in order."""
+    sha = hashlib.sha1(TOKENIZER_FINGERPRINT.encode("utf-8"))
+    for path, entry in records:
+        sha.update(f"{path}\0{entry[TokenExtractor.name]}\n".encode("utf-8", "surrogateescape"))
+    return sha.hexdigest()
+
+def build_corpus(folders, model_dir=MODEL_DIR, workers=1, rebuild=False, dedup_threshold=DEFAULT_DEDUP_THRESHOLD,
+                 index_path=None):
+    """
+    Build (or load from cache) the dictionary and on-disk bag-of-words corpus.
+
+    Parameters:
+      - folders (list): Folders whose documents form the corpus.
+      - model_dir (str): Folder the corpus, dictionary, fingerprint and token files are
+        cached in.
+      - workers (int): Number of tokenizer processes.
+      - rebuild (bool): Ignore the cached corpus and rebuild it from the token files.
+      - dedup_threshold (float): Leave out documents at least this similar to an earlier
+        document; None or 0 keeps every document.
+      - index_path (str): (Optional) Token index file, so only new or changed files are
+        tokenized. If None, every file is tokenized into a temporary folder.
+
+    Returns (Dictionary, MmCorpus).
+    """
+    from gensim import corpora
+
+    ensure_nltk_data()
+    folders = [os.path.abspath(folder) for folder in folders]
+    corpus_path = os.path.join(model_dir, CORPUS_NAME)
+    dictionary_path = os.path.join(model_dir, DICTIONARY_NAME)
+    meta_path = os.path.join(model_dir, META_NAME)
+    token_dir = os.path.join(model_dir, TOKEN_DIR_NAME) if index_path else None
+
+    with nullcontext(token_dir) if token_dir else tempfile.TemporaryDirectory() as token_dir:
+        extractor = TokenExtractor(token_dir)
+        index = CorpusIndex(index_path, SignedExtractor(extractor) if dedup_threshold else extractor)
+        records = index.scan(folders, workers=workers)
+        if any(not os.path.exists(token_file(token_dir, key)) for key in _token_keys(entry for _, entry in records)):
+            logger.warning(f"Token files are missing from {token_dir}; re-tokenizing every file.")
+            index.entries = {}
+            records = index.scan(folders, workers=workers)
+        if index_path:
+            removed = prune_token_files(token_dir, set(_token_keys(index.entries.values())))
+            if removed:
+                logger.info(f"Removed {removed} unused token files.")
+        if dedup_threshold:
+            duplicates = find_duplicates(records, dedup_threshold)
+            if duplicates:
+                logger.info(f"Skipping {len(duplicates)} duplicate documents out of {len(records)}.")
+            records = [(path, entry) for path, entry in records if path not in duplicates]
+        fingerprint = corpus_fingerprint(records)
+
+        if not rebuild and os.path.exists(meta_path):
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                if meta.get("fingerprint") == fingerprint:
+                    logger.info(f"Reusing cached topic corpus in {model_dir}")
+                    return corpora.Dictionary.load(dictionary_path), corpora.MmCorpus(corpus_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable topic corpus cache in {model_dir}: {e}")
+
+        safe_mkdir(model_dir)
+        dictionary = corpora.Dictionary()
+        documents = (read_tokens(token_dir, entry[TokenExtractor.name]) for _, entry in records)
+        # Token ids are assigned as tokens are first seen and never change afterwards, so
+        # the corpus can be written in the same pass that builds the dictionary.
+        bow_stream = (dictionary.doc2bow(tokens, allow_update=True) for tokens in documents)
+        corpora.MmCorpus.serialize(corpus_path, bow_stream, id2word=dictionary)
+    dictionary.save(dictionary_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "documents": dictionary.num_docs}, f)
+    logger.info(f"Topic corpus built: {dictionary.num_docs} documents, {len(dictionary)} terms")
+    return dictionary, corpora.MmCorpus(corpus_path)
+
+def train_topic_model(corpus, dictionary, num_topics=5, passes=10, workers=1, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Train LDA with LdaMulticore.
+
+    Parameters:
+      - corpus: Bag-of-words corpus, e.g. an MmCorpus streamed from disk.
+      - dictionary (Dictionary): Token id mapping of the corpus.
+      - workers (int): Number of training worker processes.
+      - chunksize (int): Documents per training chunk; bounds memory per worker.
+
+    Returns the trained model.
+    """
+    from gensim.models import LdaMulticore
+
+    return LdaMulticore(corpus, num_topics=num_topics, id2word=dictionary, passes=passes,
+                        workers=max(1, workers), chunksize=chunksize)
+
+def perform_topic_modeling(texts, num_topics=5, passes=10, tokenized=False, workers=1,
+                           chunksize=DEFAULT_CHUNKSIZE):
+    from gensim import corpora
+
+    processed_texts = texts if tokenized else [preprocess_text(text) for text in texts]
     dictionary = corpora.Dictionary(processed_texts)
     corpus = [dictionary.doc2bow(text) for text in processed_texts]
-    lda_model = gensim.models.LdaModel(corpus, num_topics=num_topics, id2word=dictionary, passes=passes)
+    lda_model = train_topic_model(corpus, dictionary, num_topics=num_topics, passes=passes, workers=workers,
+                                  chunksize=chunksize)
     topics = lda_model.print_topics(num_words=5)
     return topics
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Topic Modeling on Aggregated Text Files")
     parser.add_argument("-f", "--folders", nargs="+", required=True, help="Folders to aggregate text from")
     parser.add_argument("--num_topics", type=int, default=5, help="Number of topics to extract")
-    args = parser.parse_args()
-    
-    texts = load_text_from_folders(args.folders)
-    if not texts:
+    parser.add_argument("--passes", type=int, default=10, help="Number of training passes over the corpus")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="Number of processes used for tokenizing and training")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Documents per training chunk")
+    parser.add_argument("--model_dir", type=str, default=MODEL_DIR, help="Folder the corpus and dictionary are cached in")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the cached corpus and dictionary")
+    parser.add_argument("--dedup_threshold", type=float, default=DEFAULT_DEDUP_THRESHOLD,
+                        help="Leave out files at least this similar to an earlier file (0 disables)")
+    parser.add_argument("--index", type=str, default=None,
+                        help="Token index file used to skip unchanged files (default: <model_dir>/token_index.json)")
+    parser.add_argument("--no_index", action="store_true", help="Do not use the token index; re-tokenize every file")
+    args = parser.parse_args(argv)
+
+    index_path = None if args.no_index else args.index or os.path.join(args.model_dir, TOKEN_INDEX_NAME)
+    try:
+        dictionary, corpus = build_corpus(args.folders, model_dir=args.model_dir, workers=args.workers,
+                                          rebuild=args.rebuild, dedup_threshold=args.dedup_threshold,
+                                          index_path=index_path)
+    except LookupError as e:
+        logger.error(str(e))
+        return
+    if len(corpus) == 0 or len(dictionary) == 0:
         logger.error("No text files found in the provided folders.")
         return
-    
-    topics = perform_topic_modeling(texts, num_topics=args.num_topics)
+
+    lda_model = train_topic_model(corpus, dictionary, num_topics=args.num_topics, passes=args.passes,
+                                  workers=args.workers, chunksize=args.chunksize)
     print("Extracted Topics:")
-    for topic in topics:
+    for topic in lda_model.print_topics(num_words=5):
         print(topic)
 
 if __name__ == "__main__":
@@ -3,8 +3,70 @@ Utility functions used across the project.
 """
 
 import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# File types treated as text documents by the analysis tools
+TEXT_EXTENSIONS = (".txt", ".md")
+
+# Number of characters read per chunk when streaming a file
+DEFAULT_CHUNK_SIZE = 1 << 20
 
 def safe_mkdir(directory):
     """Create a directory if it does not already exist."""
     if not os.path.exists(directory):
         os.makedirs(directory)
+
+
+def iter_text_files(folders, days=None, extensions=TEXT_EXTENSIONS):
+    """
+    Walk the given folders and yield (path, stat_result) for every matching file.
+
+    Directories are read with os.scandir so each file is stat'ed once, and the 'days'
+    filter is applied from that same stat. Entries are visited in sorted order so every
+    run walks the tree identically.
+
+    Parameters:
+      - folders (list): Folder paths to walk recursively.
+      - days (int): (Optional) Only yield files modified within the last 'days' days.
+      - extensions (tuple): File name suffixes to include.
+    """
+    cutoff = time.time() - days * 86400 if days else None
+    for folder in folders:
+        if not os.path.isdir(folder):
+            logger.warning(f"Folder not found: {folder}")
+            continue
+        stack = [folder]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError as e:
+                logger.error(f"Error reading directory {directory}: {e}")
+                continue
+            subdirs = []
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    elif entry.name.endswith(extensions):
+                        stat = entry.stat()
+                        if cutoff is None or stat.st_mtime >= cutoff:
+                            yield entry.path, stat
+                except OSError as e:
+                    logger.error(f"Error reading {entry.path}: {e}")
+            # Pushed in reverse so subdirectories are visited in sorted order
+            stack.extend(reversed(subdirs))
+
+
+def iter_file_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the text of a UTF-8 file in chunks of at most chunk_size characters."""
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+"""
+Watcher Module
+
+Long-running watch mode: keeps the interests, topic co-occurrence counts and timeline
+of a set of folders up to date as files are saved, instead of rerunning the batch
+tools.
+
+  - Changes are detected by polling file sizes and modification times every few
+    seconds, or from file system events when the optional watchdog package is
+    installed. A burst of changes (an editor saving several files, a sync client
+    unpacking an export) is debounced into a single update of the paths it touched.
+  - Each update only goes over the changed paths: their corpus index entries are
+    brought up to date (so only files that changed are read again), their signatures
+    are checked against the LSH buckets of the others (dedup.DuplicateIndex), and the
+    co-occurrence counts are adjusted by the documents that changed. The index is saved
+    at most every SAVE_INTERVAL seconds, and when the watcher stops.
+  - The interest ranking is recomputed from the indexed values kept in memory. The
+    records of changed documents are appended to the stored time series (see
+    time_analysis.append_series), which is compacted once the replaced rows outnumber
+    the documents. Results are written to output/interests.tsv, output/cooccurrence.tsv
+    and output/time_series.csv.
+  - Interests that enter the top ranks for the first time are fetched from GitHub and
+    arXiv and appended to the stored results. The interests already handled are kept in
+    output/watch_state.json; on the first start the current interests are taken as
+    handled, since main.py fetches those.
+
+Example:
+    python watcher.py -f ~/Documents ~/chatgpt-export --interval 2 --debounce 1
+"""
+
+import os
+import json
+import time
+import argparse
+import logging
+import threading
+from collections import Counter
+from functools import partial
+from itertools import combinations
+
+from corpus_index import DEFAULT_INDEX_PATH, CorpusIndex
+from dedup import DEFAULT_DEDUP_THRESHOLD, DuplicateIndex, SignatureExtractor, SignedExtractor
+from metadata_store import METADATA_STORE_PATH, MetadataStore
+from nlp_analyzer import DEFAULT_HALF_LIFE_DAYS, KeywordExtractor, load_keywords, rank_interests
+from source_adapters import DOCUMENT_SEPARATOR, SOURCE_EXTENSIONS
+from time_analysis import SERIES_PATH, append_series, compact_series, update_series
+from utils import iter_text_files, safe_mkdir
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OUTPUT_DIR = "output"
+STATE_PATH = os.path.join(OUTPUT_DIR, "watch_state.json")
+DEFAULT_INTERVAL = 2.0
+DEFAULT_DEBOUNCE = 1.0
+# A continuous stream of changes is processed at least this often (in debounce periods)
+MAX_DEBOUNCE_PERIODS = 10
+DEFAULT_MAX_INTERESTS = 20
+BACKENDS = ("auto", "poll", "watchdog")
+# Seconds between saves of the corpus index while watching
+SAVE_INTERVAL = 60.0
+# Replaced rows the stored time series may hold before it is compacted, at least
+MIN_COMPACT_ROWS = 1000
+
+
+def snapshot(folders, ignore=()):
+    """Return {path: (size, mtime_ns)} of the source files in the folders, skipping the ignored prefixes."""
+    files = {}
+    for path, stat in iter_text_files(folders, extensions=SOURCE_EXTENSIONS):
+        if not path.startswith(ignore):
+            files[path] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+class PollingMonitor:
+    """Detects changes by comparing snapshots of the folders every 'interval' seconds."""
+
+    def __init__(self, folders, interval=DEFAULT_INTERVAL, ignore=()):
+        self.folders = folders
+        self.interval = interval
+        self.ignore = ignore
+        self._files = snapshot(folders, ignore)
+
+    def wait(self, timeout=None):
+        """
+        Block for up to timeout seconds (None: until a change). Returns the set of files
+        added, changed or deleted, empty if nothing changed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            files = snapshot(self.folders, self.ignore)
+            if files != self._files:
+                changed = {path for path in files.keys() | self._files.keys()
+                           if files.get(path) != self._files.get(path)}
+                self._files = files
+                return changed
+            remaining = self.interval if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return set()
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class WatchdogMonitor:
+    """Detects changes from file system events (inotify, FSEvents...) through watchdog."""
+
+    def __init__(self, folders, ignore=()):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        changed = threading.Event()
+        lock = threading.Lock()
+        self._changed = changed
+        self._lock = lock
+        self._paths = set()
+        paths = self._paths
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                # Directories stand for the files under them (see CorpusIndex.update)
+                touched = [path for path in (event.src_path, getattr(event, "dest_path", ""))
+                           if path and not path.startswith(ignore)
+                           and (event.is_directory or path.endswith(SOURCE_EXTENSIONS))]
+                if touched:
+                    with lock:
+                        paths.update(touched)
+                    changed.set()
+
+        self._observer = Observer()
+        for folder in folders:
+            if os.path.isdir(folder):
+                self._observer.schedule(Handler(), folder, recursive=True)
+        self._observer.start()
+
+    def wait(self, timeout=None):
+        """Like PollingMonitor.wait: the set of paths of the events received, or an empty set."""
+        if not self._changed.wait(timeout):
+            return set()
+        with self._lock:
+            self._changed.clear()
+            paths = set(self._paths)
+            self._paths.clear()
+        return paths
+
+    def close(self):
+        self._observer.stop()
+        self._observer.join()
+
+
+def open_monitor(folders, backend="auto", interval=DEFAULT_INTERVAL, ignore=()):
+    """Return a change monitor; "auto" uses watchdog when it is installed and polling otherwise."""
+    if backend in ("auto", "watchdog"):
+        try:
+            monitor = WatchdogMonitor(folders, ignore)
+            logger.info("Watching for file system events with watchdog")
+            return monitor
+        except ImportError:
+            if backend == "watchdog":
+                raise
+    logger.info(f"Polling for changes every {interval:g}s")
+    return PollingMonitor(folders, interval, ignore)
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(path)
+    if directory:
+        safe_mkdir(directory)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class WatchState:
+    """
+    Interests, co-occurrence counts and timeline of the watched folders.
+
+    Parameters:
+      - folders (list): Folders to watch.
+      - keywords (list): (Optional) Vocabulary to use instead of CANDIDATE_KEYWORDS.
+      - index_path (str): (Optional) Corpus index file, which also holds the dedup
+        signatures. If None, the index only lives in memory.
+      - workers (int): Number of processes used to read changed files.
+      - half_life_days (float): Recency half-life of the interest ranking.
+      - dedup_threshold (float): Count near-copies once, see dedup.py (0 disables).
+      - output_dir (str): Folder the results are written to.
+      - series_path (str): Stored time series updated on every change.
+    """
+
+    def __init__(self, folders, keywords=None, index_path=DEFAULT_INDEX_PATH, workers=1,
+                 half_life_days=DEFAULT_HALF_LIFE_DAYS, dedup_threshold=DEFAULT_DEDUP_THRESHOLD,
+                 output_dir=OUTPUT_DIR, series_path=SERIES_PATH):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.workers = workers
+        self.half_life_days = half_life_days
+        self.dedup_threshold = dedup_threshold
+        self.output_dir = output_dir
+        self.series_path = series_path
+        # Loaded once; each update then only reads the files whose size or mtime changed,
+        # once for both the keywords and the dedup signature
+        extractor = KeywordExtractor(keywords)
+        self.index = CorpusIndex(index_path, SignedExtractor(extractor) if dedup_threshold else extractor)
+        self.duplicates = DuplicateIndex(dedup_threshold) if dedup_threshold else None
+        # File -> paths of its documents (several for a chat export)
+        self.files = {}
+        # Every indexed document, and the ones counted (duplicates left out)
+        self.records = {}
+        self.documents = {}
+        self.doc_freq = Counter()
+        self.pairs = Counter()
+        self.ranked = []
+        self._scanned = False
+        self._saved = time.monotonic()
+        self._replaced_rows = 0
+
+    def _changes(self, paths):
+        """{file: records} of the changed files; every file when paths is None."""
+        if paths is not None and self._scanned:
+            return self.index.update(paths, self.folders, workers=self.workers)
+        self._scanned = True
+        changes = {file: [] for file in self.files}
+        for path, entry in self.index.scan(self.folders, workers=self.workers):
+            changes.setdefault(path.split(DOCUMENT_SEPARATOR, 1)[0], []).append((path, entry))
+        return changes
+
+    def _apply(self, changes):
+        """Update the indexed documents and duplicates; returns the paths that may have changed."""
+        affected = set()
+        for file in changes:
+            for path in self.files.pop(file, ()):
+                del self.records[path]
+                affected.add(path)
+                if self.duplicates is not None:
+                    # Copies of the document may be kept now
+                    affected.update(self.duplicates.remove(path))
+        for file, records in changes.items():
+            if records:
+                self.files[file] = [path for path, _ in records]
+            for path, entry in records:
+                self.records[path] = entry
+                affected.add(path)
+                if self.duplicates is not None:
+                    self.duplicates.add(path, entry[SignatureExtractor.name])
+        return affected
+
+    def _count(self, topics, sign):
+        topics = sorted(topics)
+        for topic in topics:
+            self.doc_freq[topic] += sign
+        for pair in combinations(topics, 2):
+            self.pairs[pair] += sign
+
+    def refresh(self, paths=None):
+        """
+        Bring everything up to date with the folders and write the results.
+
+        Parameters:
+          - paths (set): (Optional) Files and directories that changed since the last
+            refresh. The first refresh, and one without paths, walks the folders.
+
+        Returns the number of documents that were added, changed or removed.
+        """
+        full = paths is None or not self._scanned
+        changes = self._changes(paths)
+        changed = []
+        removed = []
+        for path in self._apply(changes):
+            old = self.documents.get(path)
+            new = self.records.get(path)
+            if new is not None and self.duplicates is not None and path in self.duplicates.duplicates:
+                new = None
+            if old == new:
+                continue
+            if old is not None:
+                self._count(old["topics"], -1)
+                del self.documents[path]
+            if new is not None:
+                self._count(new["topics"], +1)
+                self.documents[path] = new
+                changed.append((path, new))
+            else:
+                removed.append(path)
+        self.doc_freq = +self.doc_freq
+        self.pairs = +self.pairs
+
+        if full or time.monotonic() - self._saved >= SAVE_INTERVAL:
+            self.save()
+        self.ranked = rank_interests(list(self.documents.items()), half_life_days=self.half_life_days)
+        if full:
+            if changed or removed:
+                update_series(list(self.documents.items()), self.folders, self.series_path)
+        elif changed or removed:
+            self._replaced_rows += append_series(sorted(changed), sorted(removed), self.series_path)
+            if self._replaced_rows > max(MIN_COMPACT_ROWS, len(self.documents)):
+                compact_series(self.series_path)
+                self._replaced_rows = 0
+        self.write_outputs()
+        return len(changed) + len(removed)
+
+    def save(self):
+        """Save the corpus index if it changed."""
+        self.index.save()
+        self._saved = time.monotonic()
+
+    def write_outputs(self):
+        lines = [f"{interest}\t{weight:.4f}" for interest, weight in self.ranked]
+        _write_atomic(os.path.join(self.output_dir, "interests.tsv"), "interest\tweight\n" + "".join(
+            line + "\n" for line in lines))
+        edges = sorted(self.pairs.items(), key=lambda item: (-item[1], item[0]))
+        _write_atomic(os.path.join(self.output_dir, "cooccurrence.tsv"), "source\ttarget\tweight\n" + "".join(
+            f"{a}\t{b}\t{count}\n" for (a, b), count in edges))
+
+    def top_interests(self, max_interests=DEFAULT_MAX_INTERESTS):
+        return [interest for interest, _ in self.ranked[:max_interests]]
+
+
+def load_known_interests(state_path=STATE_PATH):
+    """Interests handled by earlier watch runs, or None on the first run."""
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return set(json.load(f).get("interests", []))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable watch state {state_path}: {e}")
+        return None
+
+
+def save_known_interests(interests, state_path=STATE_PATH):
+    _write_atomic(state_path, json.dumps({"interests": sorted(interests)}))
+
+
+def fetch_interests(interests, cache, store_format, store=None):
+    """
+    Fetch repos and papers for the given interests and append them to the stored results,
+    and to the metadata store if one is given (recorded as a run of its own).
+    """
+    from datetime import datetime
+
+    from github_fetcher import fetch_github_repos
+    from main import ARXIV_RESULTS_PER_INTEREST, GITHUB_RESULTS_PER_INTEREST
+    from papers_fetcher import iter_papers
+    from result_store import write_results
+
+    started = datetime.utcnow().replace(microsecond=0)
+    run_id = store.start_run(started, {"watch": interests}) if store is not None else None
+    failed = {"github": set(), "arxiv": set()}
+    repos = fetch_github_repos(interests, max_results_per_interest=GITHUB_RESULTS_PER_INTEREST, cache=cache,
+                               failed=failed["github"])
+    papers = list(iter_papers(interests, max_results_per_interest=ARXIV_RESULTS_PER_INTEREST, cache=cache,
+                              failed=failed["arxiv"]))
+    if repos:
+        write_results(repos, "github_repos", fmt=store_format, append=True)
+    if papers:
+        write_results(papers, "arxiv_papers", fmt=store_format, append=True)
+    if store is not None:
+        store.upsert("github_repos", repos, run_id)
+        store.upsert("arxiv_papers", papers, run_id)
+        for source, source_failed in failed.items():
+            store.mark_fetched(source, [interest for interest in interests if interest not in source_failed], started)
+        store.finish_run(run_id)
+    logger.info(f"Fetched {len(repos)} repositories and {len(papers)} papers for {interests}")
+
+
+def watch(state, monitor, debounce=DEFAULT_DEBOUNCE, fetch=None, max_interests=DEFAULT_MAX_INTERESTS,
+          state_path=STATE_PATH, once=False):
+    """
+    Run the watch loop until interrupted.
+
+    Parameters:
+      - state (WatchState): State to keep up to date.
+      - monitor: PollingMonitor or WatchdogMonitor of the folders.
+      - debounce (float): Seconds without further changes before an update runs.
+      - fetch (callable): (Optional) Called with the list of newly ranked interests.
+      - max_interests (int): Only the top ranked interests are fetched.
+      - once (bool): Run a single update and return.
+    """
+    known = load_known_interests(state_path)
+    paths = None
+    while True:
+        started = time.perf_counter()
+        changed = state.refresh(paths)
+        top = state.top_interests(max_interests)
+        logger.info(f"Updated in {time.perf_counter() - started:.2f}s: {changed} documents changed, "
+                    f"{len(state.documents)} documents, top interests {top[:5]}")
+        if known is None:
+            logger.info(f"Recording {len(top)} current interests; only interests added from now on are fetched.")
+            known = set(top)
+            save_known_interests(known, state_path)
+        new = [interest for interest in top if interest not in known]
+        if new:
+            logger.info(f"New interests: {new}")
+            if fetch is not None:
+                try:
+                    fetch(new)
+                except Exception as e:
+                    # Retried on the next update, since they are not recorded as known
+                    logger.error(f"Fetching {new} failed: {e}")
+                    new = []
+            known.update(new)
+            save_known_interests(known, state_path)
+        if once:
+            return
+
+        paths = set(monitor.wait())
+        # Wait for the burst of changes to settle, but not forever
+        deadline = time.monotonic() + debounce * MAX_DEBOUNCE_PERIODS
+        while time.monotonic() < deadline:
+            more = monitor.wait(debounce)
+            if not more:
+                break
+            paths |= more
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep interests, co-occurrences and timelines updated as files change")
+    parser.add_argument("-f", "--folders", nargs="+", required=True, help="Folders to watch")
+    parser.add_argument("-k", "--keywords_file", type=str, default="", help="(Optional) File with one candidate keyword per line")
+    parser.add_argument("--index", type=str, default=DEFAULT_INDEX_PATH, help="Corpus index file shared with the other tools")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to read changed files")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Seconds between polls of the folders")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, help="Seconds without changes before updating")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto", help="Change detection: watchdog events or polling")
+    parser.add_argument("--half_life_days", type=float, default=DEFAULT_HALF_LIFE_DAYS, help="Recency half-life of the interest ranking")
+    parser.add_argument("--dedup_threshold", type=float, default=DEFAULT_DEDUP_THRESHOLD, help="Count near-copies once (0 disables)")
+    parser.add_argument("--max_interests", type=int, default=DEFAULT_MAX_INTERESTS, help="Top interests watched for new entries")
+    parser.add_argument("--no_fetch", action="store_true", help="Only report new interests; do not fetch repos and papers")
+    parser.add_argument("--store_format", choices=["parquet", "jsonl"], default="parquet", help="Format of the stored results")
+    parser.add_argument("--metadata_store", type=str, default=METADATA_STORE_PATH, help="SQLite store the fetched results are upserted into")
+    parser.add_argument("--no_metadata_store", action="store_true", help="Do not write the metadata store")
+    parser.add_argument("--once", action="store_true", help="Run a single update and exit")
+    args = parser.parse_args(argv)
+
+    keywords = load_keywords(args.keywords_file) if args.keywords_file else None
+    state = WatchState(args.folders, keywords=keywords, index_path=args.index, workers=args.workers,
+                       half_life_days=args.half_life_days, dedup_threshold=args.dedup_threshold)
+    fetch = None
+    if not args.no_fetch:
+        from http_cache import DEFAULT_CACHE_PATH, HTTPCache
+
+        store = None if args.no_metadata_store else MetadataStore(args.metadata_store)
+        fetch = partial(fetch_interests, cache=HTTPCache(DEFAULT_CACHE_PATH), store_format=args.store_format,
+                        store=store)
+
+    # Files this process writes must not wake it up again
+    ignore = (os.path.join(os.path.abspath(OUTPUT_DIR), ""),)
+    monitor = None if args.once else open_monitor(state.folders, args.backend, args.interval, ignore)
+    try:
+        watch(state, monitor, debounce=args.debounce, fetch=fetch, max_interests=args.max_interests, once=args.once)
+    except KeyboardInterrupt:
+        logger.info("Stopped watching.")
+    finally:
+        if monitor is not None:
+            monitor.close()
+        state.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,218 @@
 Web Application Module
 
 A minimal Flask web app to display the fetched GitHub repository data.
-Make sure you have run the main script at least once so that 'output/github_repos.xlsx' exists.
+Make sure you have run the main script at least once so that the github_repos results exist.
+
+When the metadata store (see metadata_store.py) exists, its repos table is copied into
+an in-memory store when it changes on disk, and each page is read from that copy as a
+sorted slice through its indexes, so a page never mixes in rows written by a later run.
+Otherwise the result files are loaded once and kept in memory until the stored dataset
+changes on disk (detected by its modification time). The HTML table is paginated and
+sorted on the server, and the same data is available as JSON from /api/repos with
+ETag/Last-Modified validation and gzip compression.
 """
 
-from flask import Flask, render_template
-import pandas as pd
 import os
+import gzip
+import argparse
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from flask import Flask, Response, render_template, request
+
+from metadata_store import METADATA_STORE_PATH, MetadataStore
+from result_store import find_results, read_results
 
 app = Flask(__name__)
 
+# Columns shown in the repository table
+REPO_COLUMNS = ["interest", "name", "description", "language", "last_pushed", "html_url"]
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+# Responses smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+
+class RepoSnapshot:
+    """
+    One version of the github_repos dataset, as returned by RepoCache.load(). A request
+    pages through a single snapshot, so a reload in another thread cannot give it rows
+    of one version under the ETag of another.
+
+    Parameters:
+      - etag (str), last_modified (datetime): Validators of this version.
+      - total (int): Number of rows.
+      - df (DataFrame): (Optional) The rows, when they are held in memory.
+      - store (MetadataStore): (Optional) Snapshot of the metadata store the rows are
+        queried from otherwise (see MetadataStore.snapshot).
+    """
+
+    def __init__(self, etag, last_modified, total, df=None, store=None):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.total = total
+        self.df = df
+        self.store = store
+        # Sorted row orders, computed once per column and direction
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def pages(self, per_page):
+        """Number of pages of per_page rows (at least 1)."""
+        return max(1, -(-self.total // per_page))
+
+    def page(self, sort=None, order="asc", page=1, per_page=DEFAULT_PER_PAGE):
+        """
+        Return (rows DataFrame, page number) for one page of the sorted data. A page past
+        the last one gives the last page.
+        """
+        page = min(page, self.pages(per_page))
+        start = (page - 1) * per_page
+        if self.df is None:
+            rows = self.store.read("github_repos", columns=REPO_COLUMNS, sort=sort, descending=(order == "desc"),
+                                   limit=per_page, offset=start)
+            return rows, page
+        if sort in REPO_COLUMNS:
+            with self._lock:
+                positions = self._orders.get((sort, order))
+                if positions is None:
+                    positions = self.df.sort_values(sort, ascending=(order != "desc"), kind="stable",
+                                                    na_position="last").index.to_numpy()
+                    self._orders[(sort, order)] = positions
+            return self.df.iloc[positions[start:start + per_page]], page
+        return self.df.iloc[start:start + per_page], page
+
+
+class RepoCache:
+    """
+    In-process cache of the github_repos dataset, reloaded when its files change.
+
+    With a metadata store, a snapshot of its repos table is cached instead, and pages are
+    queried from it through the indexes on the sortable columns.
+    """
+
+    def __init__(self, store_path=METADATA_STORE_PATH):
+        self._lock = threading.Lock()
+        self._key = None
+        self._snapshot = None
+        self.store_path = store_path
+
+    def load(self):
+        """Return a RepoSnapshot of fresh data, reading the dataset only if it changed on disk."""
+        if self.store_path and os.path.exists(self.store_path):
+            return self._load_store()
+        path, _ = find_results("github_repos")
+        mtime = _dataset_mtime(path) if path else None
+        key = (path, mtime)
+        with self._lock:
+            if key != self._key or self._snapshot is None:
+                df = read_results("github_repos", columns=REPO_COLUMNS).reset_index(drop=True)
+                self._snapshot = RepoSnapshot(hashlib.sha1(repr(key).encode("utf-8")).hexdigest(),
+                                              datetime.fromtimestamp(mtime or 0, tz=timezone.utc), len(df), df=df)
+                self._key = key
+            return self._snapshot
+
+    def _load_store(self):
+        mtime = os.path.getmtime(self.store_path)
+        key = (self.store_path, mtime)
+        with self._lock:
+            if key != self._key or self._snapshot is None:
+                store = MetadataStore(self.store_path)
+                try:
+                    copy = store.snapshot("github_repos")
+                finally:
+                    store.close()
+                self._snapshot = RepoSnapshot(hashlib.sha1(repr(key).encode("utf-8")).hexdigest(),
+                                              datetime.fromtimestamp(mtime, tz=timezone.utc),
+                                              copy.count("github_repos"), store=copy)
+                self._key = key
+            return self._snapshot
+
+
+def _dataset_mtime(path):
+    """Latest modification time of a dataset file, or of a Parquet directory and its parts."""
+    mtime = os.path.getmtime(path)
+    if os.path.isdir(path):
+        with os.scandir(path) as it:
+            for entry in it:
+                mtime = max(mtime, entry.stat().st_mtime)
+    return mtime
+
+
+def _page_args():
+    """Read page/per_page/sort/order from the query string, with bounds applied."""
+    page = max(1, request.args.get("page", 1, type=int))
+    per_page = min(MAX_PER_PAGE, max(1, request.args.get("per_page", DEFAULT_PER_PAGE, type=int)))
+    sort = request.args.get("sort")
+    if sort not in REPO_COLUMNS:
+        sort = None
+    order = "desc" if request.args.get("order") == "desc" else "asc"
+    return page, per_page, sort, order
+
+
+def _records(rows, missing=""):
+    """Convert DataFrame rows to plain dicts, with dates as ISO strings."""
+    rows = rows.copy()
+    for column in rows.select_dtypes(include=["datetimetz", "datetime"]).columns:
+        rows[column] = rows[column].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return rows.astype(object).where(rows.notna(), missing).to_dict(orient="records")
+
+
+repo_cache = RepoCache()
+
 
 @app.route("/")
 def index():
-    excel_path = os.path.join("output", "github_repos.xlsx")
-    repos = []
-    if os.path.exists(excel_path):
-        df = pd.read_excel(excel_path)
-        repos = df.to_dict(orient="records")
-    return render_template("index.html", repos=repos)
+    page, per_page, sort, order = _page_args()
+    data = repo_cache.load()
+    rows, page = data.page(sort, order, page, per_page)
+    return render_template("index.html", repos=_records(rows), page=page, pages=data.pages(per_page),
+                           per_page=per_page, sort=sort, order=order, total=data.total, columns=REPO_COLUMNS)
+
+
+@app.route("/api/repos")
+def api_repos():
+    page, per_page, sort, order = _page_args()
+    data = repo_cache.load()
+    page = min(page, data.pages(per_page))
+    # The ETag covers the data version and the slice requested. It is weak because the
+    # gzip and identity bodies of a slice share it.
+    etag = hashlib.sha1(f"{data.etag}:{page}:{per_page}:{sort}:{order}".encode("utf-8")).hexdigest()
+    if request.if_none_match.contains_weak(etag) or (
+            not request.if_none_match and request.if_modified_since
+            and data.last_modified.replace(microsecond=0) <= request.if_modified_since):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    rows, page = data.page(sort, order, page, per_page)
+    body = json.dumps({"page": page, "per_page": per_page, "total": data.total, "sort": sort, "order": order,
+                       "repos": _records(rows, missing=None)}).encode("utf-8")
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag, weak=True)
+    response.last_modified = data.last_modified
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    if "gzip" in request.accept_encodings and len(body) >= GZIP_MIN_BYTES:
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the fetched GitHub repositories")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=5000, help="Port to listen on")
+    parser.add_argument("--debug", action="store_true", help="Run Flask in debug mode with the reloader")
+    parser.add_argument("--metadata_store", type=str, default=METADATA_STORE_PATH,
+                        help="Read the repositories from this metadata store when it exists, instead of the result files")
+    args = parser.parse_args(argv)
+    repo_cache.store_path = args.metadata_store
+    app.run(host=args.host, port=args.port, debug=args.debug)
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    main()